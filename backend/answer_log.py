@@ -0,0 +1,491 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, single worker only
+    fcntl = None
+
+from periodic import PeriodicThread
+
+#------------------------------------------------------------------------------
+
+#                              ANSWER EVENT LOG
+
+#------------------------------------------------------------------------------
+
+# Append-only log of quiz events (quiz started, question answered, quiz
+# completed), aggregated for the admin dashboard by AnswerStats.
+#
+# Binary records, all starting with a kind byte and an 8-byte session hash:
+#   S                                  quiz started
+#   A  step:u8  answer code:u8         question answered (0 = no option matched)
+#   C  type:4s  n:u8  n answer codes   quiz completed, answer code per position
+HEADER = struct.Struct('<c8s')
+
+# Flush and checkpoint errors go to the structured server log (see quiz_logging.py)
+LOG = logging.getLogger('quiz.answers')
+ANSWER_BODY = struct.Struct('<BB')
+COMPLETE_BODY = struct.Struct('<4sB')
+
+START = b'S'
+ANSWER = b'A'
+COMPLETE = b'C'
+
+# Events waiting for the background flush; beyond this they are dropped
+# rather than letting memory grow if the disk stalls
+MAX_BUFFER_BYTES = 4 * 1024 * 1024
+
+# Session hash for events logged without a session ID or label
+ANONYMOUS = bytes(8)
+
+
+def session_hash(session_id):
+    """
+    Returns:
+        8-byte digest identifying a session in the log without storing its ID
+    """
+    if not session_id:
+        return ANONYMOUS
+    return hashlib.blake2b(session_id.encode('utf-8'), digest_size=8).digest()
+
+
+def log_files(path, backups):
+    """
+    Returns:
+        Existing log files, oldest rotated file first and the live log last
+    """
+    names = [f'{path}.{n}' for n in range(backups, 0, -1)] + [path]
+    return [name for name in names if os.path.exists(name)]
+
+
+class AnswerLog:
+    """
+    Records quiz events without doing disk I/O on the request path.
+
+    Events are packed into an in-memory buffer and written by a background
+    thread every flush_interval seconds, as one append under an exclusive
+    lock so several worker processes can share the log. When the log grows
+    past max_bytes it is rotated to answers.log.1 (older files shift up and
+    at most `backups` are kept).
+    """
+
+    def __init__(self, path='answers.log', max_bytes=64 * 1024 * 1024, backups=5,
+                 flush_interval=1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer = bytearray()
+        self._buffer_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._fd = None
+        self._flusher = None
+
+    def _append(self, record):
+        with self._buffer_lock:
+            if len(self._buffer) + len(record) > MAX_BUFFER_BYTES:
+                self.dropped += 1
+                return
+            self._buffer += record
+
+    def record_start(self, session_id):
+        """Records that a quiz was started (or restarted) by a session."""
+        self._append(HEADER.pack(START, session_hash(session_id)))
+
+    def record_answer(self, session_id, step, code):
+        """
+        Records one answered question.
+
+        Args:
+            session_id: Session ID, or a label for quizzes without one
+            step: Position of the answered question
+            code: Answer code (0 = no option matched, n = option n - 1)
+        """
+        self._append(HEADER.pack(ANSWER, session_hash(session_id))
+                     + ANSWER_BODY.pack(step, code))
+
+    def record_complete(self, session_id, personality_type, answers):
+        """
+        Records a completed quiz.
+
+        Args:
+            session_id: Session ID, or a label for quizzes without one
+            personality_type: 4-letter result type
+            answers: Answer code per question position (QuizSession.answers)
+        """
+        answers = bytes(answers)
+        self._append(HEADER.pack(COMPLETE, session_hash(session_id))
+                     + COMPLETE_BODY.pack(personality_type.encode('ascii')[:4], len(answers))
+                     + answers)
+
+    def _open(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _lock_current(self):
+        """Locks the live log file, reopening it if another process rotated it."""
+        while True:
+            fd = self._open()
+            if fcntl is None:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+            self._fd = None
+
+    def _unlock(self, fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        """Shifts answers.log -> .1 -> .2 ...; called with the live log locked."""
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{n}'):
+                os.replace(f'{self.path}.{n}', f'{self.path}.{n + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+    def flush(self):
+        """
+        Writes the buffered events to the log.
+        """
+        with self._buffer_lock:
+            if not self._buffer:
+                return
+            data = bytes(self._buffer)
+            self._buffer.clear()
+
+        with self._file_lock:
+            try:
+                fd = self._lock_current()
+                try:
+                    size = os.fstat(fd).st_size
+                    if size and size + len(data) > self.max_bytes:
+                        self._rotate()
+                        old_fd = fd
+                        self._fd = None
+                        fd = self._lock_current()
+                        self._unlock(old_fd)
+                        os.close(old_fd)
+                    os.write(fd, data)
+                finally:
+                    self._unlock(fd)
+            except OSError:
+                # Keep the events for the next flush (up to the buffer limit)
+                with self._buffer_lock:
+                    if len(self._buffer) + len(data) <= MAX_BUFFER_BYTES:
+                        self._buffer[:0] = data
+                    else:
+                        self.dropped += 1
+
+    def start_flushing(self):
+        """
+        Starts the daemon thread that flushes every flush_interval seconds,
+        and flushes once more at interpreter exit.
+        """
+        if self._flusher is not None:
+            return
+        self._flusher = PeriodicThread('answer-log-flush', self.flush_interval, self.flush, LOG,
+                                       'answer_log_flush_failed')
+        self._flusher.start()
+        atexit.register(self.flush)
+
+
+class AnswerStats:
+    """
+    Streaming aggregate of the answer log: quizzes started and completed,
+    result type counts, and per question how many people answered it (the
+    completion funnel) and which options they chose.
+
+    Like RatingStore, every process keeps the aggregate in memory and only
+    reads the bytes appended since its last read, following the log across
+    rotations. The aggregate is checkpointed to answer_stats.json with the
+    position it covers, so startup only replays what was logged after the
+    last checkpoint. The replay happens when the aggregate is first used.
+    """
+
+    def __init__(self, path='answers.log', stats_path='answer_stats.json', backups=5):
+        self.path = path
+        self.stats_path = stats_path
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._fd = None
+        self._inode = None
+        self._offset = 0
+        self._pending = b''
+        self._checkpointer = None
+        self._loaded = False
+        self._reset()
+
+    def _load(self):
+        """Replays the checkpoint and the log, on first use (lock held)."""
+        if not self._loaded:
+            self._replay()
+            self._loaded = True
+
+    def _reset(self):
+        self.starts = 0
+        self.completions = 0
+        self.corrupt_bytes = 0
+        self.types = {}
+        # Per position: number of answers, and counts per answer code
+        self.answered = []
+        self.options = []
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.stats_path, 'r') as f:
+                data = json.load(f)
+            self.starts = int(data['starts'])
+            self.completions = int(data['completions'])
+            self.types = {str(k): int(v) for k, v in data['types'].items()}
+            self.answered = [int(n) for n in data['answered']]
+            self.options = [[int(n) for n in counts] for counts in data['options']]
+            return int(data['inode']), int(data['offset'])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+            self._reset()
+            return None, 0
+
+    def _replay(self):
+        """Rebuilds the aggregate from the checkpoint plus the log written after it."""
+        inode, offset = self._load_checkpoint()
+        for name, file_inode in self._files():
+            if file_inode == inode and self._open_file(name, inode):
+                self._offset = offset
+                self._read_available()
+                break
+        else:
+            # No checkpoint, or its file has been rotated away: start over
+            # from the files that are still there
+            self._reset()
+        self._catch_up()
+
+    def _files(self):
+        files = []
+        for name in log_files(self.path, self.backups):
+            try:
+                files.append((name, os.stat(name).st_ino))
+            except FileNotFoundError:
+                pass
+        return files
+
+    def _open_file(self, name, inode):
+        """Switches to another log file, unless it was renamed in the meantime."""
+        try:
+            fd = os.open(name, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        if os.fstat(fd).st_ino != inode:
+            os.close(fd)
+            return False
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd, self._inode = fd, inode
+        self._offset, self._pending = 0, b''
+        return True
+
+    def _read_available(self):
+        size = os.fstat(self._fd).st_size
+        position = self._offset + len(self._pending)
+        if size <= position:
+            return
+        data = self._pending + os.pread(self._fd, size - position, position)
+        consumed = self._apply(data)
+        self._offset += consumed
+        self._pending = data[consumed:]
+
+    def _catch_up(self):
+        """
+        Reads events appended by any process since the last read, following
+        the log through any rotations since then (the file being read is
+        finished first, then every newer file in order).
+        """
+        while True:
+            if self._fd is not None:
+                self._read_available()
+            files = self._files()
+            inodes = [inode for name, inode in files]
+            if self._inode in inodes:
+                newer = files[inodes.index(self._inode) + 1:]
+            else:
+                newer = files
+            if not newer:
+                return
+            name, inode = newer[0]
+            # If the file was renamed before it could be opened, list again
+            self._open_file(name, inode)
+
+    def _apply(self, data):
+        """
+        Adds complete records to the aggregate.
+
+        Returns:
+            Number of bytes consumed (a trailing partial record is left)
+        """
+        view = memoryview(data)
+        position = 0
+        end = len(data)
+        while position + HEADER.size <= end:
+            kind = data[position:position + 1]
+            body = position + HEADER.size
+            if kind == START:
+                self.starts += 1
+                position = body
+            elif kind == ANSWER:
+                if body + ANSWER_BODY.size > end:
+                    break
+                step, code = ANSWER_BODY.unpack_from(view, body)
+                self._count_answer(step, code)
+                position = body + ANSWER_BODY.size
+            elif kind == COMPLETE:
+                if body + COMPLETE_BODY.size > end:
+                    break
+                personality_type, length = COMPLETE_BODY.unpack_from(view, body)
+                if body + COMPLETE_BODY.size + length > end:
+                    break
+                personality_type = personality_type.decode('ascii', 'replace')
+                self.types[personality_type] = self.types.get(personality_type, 0) + 1
+                self.completions += 1
+                position = body + COMPLETE_BODY.size + length
+            else:
+                # Unknown record: the rest of this chunk can't be framed
+                self.corrupt_bytes += end - position
+                return end
+        return position
+
+    def _count_answer(self, step, code):
+        answered, options = self.answered, self.options
+        while len(answered) <= step:
+            answered.append(0)
+            options.append([])
+        answered[step] += 1
+        counts = options[step]
+        if len(counts) <= code:
+            counts.extend([0] * (code + 1 - len(counts)))
+        counts[code] += 1
+
+    def snapshot(self, question_ids=()):
+        """
+        Returns the current aggregate, including events from other processes.
+
+        Args:
+            question_ids: Question id per position, to label the funnel
+
+        Returns:
+            Dictionary with starts, completions, completion_rate, types and
+            questions (per position: id, answered, option counts, unmatched)
+        """
+        with self._lock:
+            self._load()
+            self._catch_up()
+            questions = []
+            for step, answered in enumerate(self.answered):
+                counts = self.options[step]
+                questions.append({
+                    'step': step,
+                    'id': question_ids[step] if step < len(question_ids) else None,
+                    'answered': answered,
+                    'options': counts[1:],
+                    'unmatched': counts[0] if counts else 0
+                })
+            return {
+                'starts': self.starts,
+                'completions': self.completions,
+                'completion_rate': round(self.completions / self.starts, 4) if self.starts else 0,
+                'types': dict(sorted(self.types.items())),
+                'questions': questions
+            }
+
+    def checkpoint(self):
+        """
+        Writes the aggregate and the log position it covers to
+        answer_stats.json atomically (temp file + rename).
+        """
+        with self._lock:
+            self._load()
+            self._catch_up()
+            if self._inode is None:
+                return
+            data = {
+                'inode': self._inode,
+                'offset': self._offset,
+                'starts': self.starts,
+                'completions': self.completions,
+                'types': self.types,
+                'answered': self.answered,
+                'options': self.options
+            }
+        tmp_path = f'{self.stats_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.stats_path)
+
+    def start_checkpointing(self, interval=60):
+        """
+        Starts a daemon thread that checkpoints every interval seconds. A
+        failed checkpoint is logged and retried by the next one.
+        """
+        if self._checkpointer is not None:
+            return
+        self._checkpointer = PeriodicThread('answer-stats-checkpoint', interval, self.checkpoint,
+                                            LOG, 'answer_stats_checkpoint_failed')
+        self._checkpointer.start()
+
+
+def read_completions(path='answers.log', backups=5):
+    """
+    Yields (session hash, personality type, answer codes) for every completed
+    quiz in the log files, oldest first.
+    """
+    for name in log_files(path, backups):
+        with open(name, 'rb') as f:
+            data = f.read()
+        position = 0
+        while position + HEADER.size <= len(data):
+            kind, digest = HEADER.unpack_from(data, position)
+            position += HEADER.size
+            if kind == START:
+                continue
+            if kind == ANSWER:
+                position += ANSWER_BODY.size
+            elif kind == COMPLETE:
+                personality_type, length = COMPLETE_BODY.unpack_from(data, position)
+                position += COMPLETE_BODY.size
+                answers = data[position:position + length]
+                position += length
+                if len(answers) == length:
+                    yield digest, personality_type.decode('ascii', 'replace'), answers
+            else:
+                break
+
+
+if __name__ == '__main__':
+    # Export completed quizzes for batch_scoring.py:
+    #   python answer_log.py export [answers.log] > answers.jsonl
+    if len(sys.argv) < 2 or sys.argv[1] != 'export':
+        sys.exit('usage: python answer_log.py export [answers.log]')
+    for digest, personality_type, answers in read_completions(
+            sys.argv[2] if len(sys.argv) > 2 else 'answers.log'):
+        # Codes per question position as recorded (0 = not shown or no option
+        # matched), so quizzes with unmatched answers export intact
+        print(json.dumps({
+            'session': digest.hex(),
+            'type': personality_type,
+            'codes': list(answers)
+        }))
@@ -0,0 +1,173 @@
+import json
+
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_date, parse_etags, parse_range_header, unquote_etag
+
+from payload_cache import encode_json
+
+#------------------------------------------------------------------------------
+
+#                    FRAMEWORK-NEUTRAL REQUESTS AND RESPONSES
+
+#------------------------------------------------------------------------------
+
+# The quiz API handlers only see these two classes, so the same handler code
+# runs under Flask (app.py, WSGI) and under the asyncio server (asgi.py).
+
+class ApiRequest:
+    """
+    The parts of an HTTP request the quiz API handlers use.
+
+    Attributes:
+        method: HTTP method, upper case
+        path: Request path
+        args: MultiDict of query string arguments
+        headers: werkzeug Headers (case-insensitive lookups)
+        body: Raw request body bytes
+        url_root: Scheme, host and script root, ending with a slash
+    """
+
+    __slots__ = ('method', 'path', 'args', 'headers', 'body', 'url_root')
+
+    def __init__(self, method, path, args=None, headers=None, body=b'', url_root='/'):
+        self.method = method
+        self.path = path
+        self.args = args if args is not None else MultiDict()
+        self.headers = headers if headers is not None else Headers()
+        self.body = body
+        self.url_root = url_root
+
+    @property
+    def is_json(self):
+        """Whether the request says its body is JSON (like Flask's request.is_json)."""
+        mimetype = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        return mimetype == 'application/json' or (
+            mimetype.startswith('application/') and mimetype.endswith('+json')
+        )
+
+    def get_json(self):
+        """
+        Returns:
+            The parsed JSON body, or None if the body isn't JSON or can't be parsed
+        """
+        if not self.is_json or not self.body:
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class ApiResponse:
+    """
+    A response from a quiz API handler.
+
+    Attributes:
+        status: HTTP status code
+        body: Response body bytes
+        headers: Dictionary of response headers (including Content-Type)
+    """
+
+    __slots__ = ('status', 'body', 'headers')
+
+    def __init__(self, body=b'', status=200, headers=None, mimetype='application/json'):
+        self.status = status
+        self.body = body
+        self.headers = {'Content-Type': mimetype}
+        if headers:
+            self.headers.update(headers)
+
+
+def json_response(obj, status=200):
+    """
+    Encodes an object as JSON, the same way Flask's jsonify does.
+
+    Args:
+        obj: JSON-serializable object
+        status: HTTP status code
+
+    Returns:
+        ApiResponse
+    """
+    return ApiResponse(encode_json(obj), status)
+
+
+def json_bytes_response(body, etag=None):
+    """
+    Wraps an already encoded JSON body in a response.
+
+    Args:
+        body: Encoded JSON bytes
+        etag: Optional precomputed ETag for static bodies
+
+    Returns:
+        ApiResponse
+    """
+    response = ApiResponse(body)
+    if etag:
+        response.headers['ETag'] = etag
+    return response
+
+
+def make_conditional(request, response, accept_ranges=False):
+    """
+    Turns a full 200 response into a 304 Not Modified when the client's copy
+    is current (If-None-Match / If-Modified-Since), or into a 206 Partial
+    Content / 416 when a byte range is requested.
+
+    Args:
+        request: ApiRequest
+        response: ApiResponse with ETag and/or Last-Modified headers set
+        accept_ranges: Whether Range requests are supported for this response
+
+    Returns:
+        The same ApiResponse, modified in place
+    """
+    if request.method not in ('GET', 'HEAD') or response.status != 200:
+        return response
+
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        not_modified = etag is not None and parse_etags(if_none_match).contains_weak(
+            unquote_etag(etag)[0]
+        )
+    else:
+        since = parse_date(request.headers.get('If-Modified-Since'))
+        modified = parse_date(last_modified)
+        not_modified = since is not None and modified is not None and modified <= since
+    if not_modified:
+        response.status = 304
+        response.body = b''
+        response.headers.pop('Content-Type', None)
+        return response
+
+    if not accept_ranges:
+        return response
+    response.headers['Accept-Ranges'] = 'bytes'
+
+    byte_range = parse_range_header(request.headers.get('Range'))
+    if byte_range is None:
+        return response
+
+    # If-Range: only honour the range if the client's copy is still current
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range not in (etag, last_modified):
+        return response
+
+    length = len(response.body)
+    bounds = byte_range.range_for_length(length)
+    if bounds is None:
+        response.status = 416
+        response.body = b''
+        response.headers['Content-Range'] = f'bytes */{length}'
+        return response
+
+    start, stop = bounds
+    response.status = 206
+    response.body = response.body[start:stop]
+    response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+    return response
+
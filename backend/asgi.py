@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import re
+import sys
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import Headers, MultiDict
+
+from api_http import ApiRequest, ApiResponse, json_response
+from cors import asgi_preflight_origin
+from quiz_api import (CORS_ORIGINS, PREFLIGHT, RATING_STORE, ROLLUPS, ROUTES, WARM_UP, handle_request,
+                      start)
+
+try:
+    import uvicorn
+except ImportError:  # Only needed to run this file directly
+    uvicorn = None
+
+#------------------------------------------------------------------------------
+
+#                          ASYNCIO (ASGI) ENTRY POINT
+
+#------------------------------------------------------------------------------
+
+# Serves the same routes as the Flask app from a single event loop:
+#
+#     uvicorn asgi:app --host 0.0.0.0 --port 5000
+#
+# Handlers marked blocking in the route table (anything that can read or
+# write a file or database, including data loaded on first use) run in the
+# default thread pool, so a slow disk never holds up the other connections.
+# The rest would run directly on the loop; at the moment every quiz route
+# touches such data.
+
+# Handler errors go to the structured server log (see quiz_logging.py)
+LOG = logging.getLogger('quiz.asgi')
+
+RULE_PARAM = re.compile(r'<(?:(\w+):)?(\w+)>')
+
+# Flask URL converters used by the quiz routes
+CONVERTERS = {
+    'string': r'[^/]+',
+    'path': r'[^/].*?',
+}
+
+
+def compile_rule(rule):
+    """
+    Turns a Flask URL rule such as '/images/<path:filename>' into a regex
+    whose named groups are the handler's keyword arguments.
+
+    Args:
+        rule: URL rule in Flask syntax
+
+    Returns:
+        Compiled regular expression matching the whole path
+    """
+    pattern = ''
+    position = 0
+    for match in RULE_PARAM.finditer(rule):
+        pattern += re.escape(rule[position:match.start()])
+        pattern += f'(?P<{match[2]}>{CONVERTERS[match[1] or "string"]})'
+        position = match.end()
+    return re.compile(pattern + re.escape(rule[position:]) + r'\Z')
+
+
+async def read_body(receive):
+    """
+    Returns:
+        The complete request body
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def build_request(scope, body):
+    """
+    Builds an ApiRequest from an ASGI HTTP scope.
+
+    Args:
+        scope: ASGI connection scope
+        body: Request body bytes
+
+    Returns:
+        ApiRequest
+    """
+    headers = Headers([
+        (name.decode('latin-1'), value.decode('latin-1'))
+        for name, value in scope['headers']
+    ])
+    host = headers.get('Host')
+    if host is None:
+        server_host, server_port = scope.get('server') or ('localhost', 80)
+        host = f'{server_host}:{server_port}'
+    url_root = f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}/"
+    args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+    return ApiRequest(scope['method'], scope['path'], args, headers, body, url_root)
+
+
+class QuizASGIApp:
+    """
+    ASGI application serving the quiz API routes from quiz_api.ROUTES.
+
+    Routing, method checks, HEAD/OPTIONS handling and CORS headers follow
+    what Flask and flask-cors do for app.py, so clients can't tell the two
+    modes apart.
+    """
+
+    def __init__(self, routes=ROUTES, cors_origins=CORS_ORIGINS, preflight=PREFLIGHT):
+        self.routes = [(compile_rule(route.rule), route) for route in routes]
+        self.cors_origins = frozenset(cors_origins)
+        self.preflight = preflight
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            is_preflight, origin = asgi_preflight_origin(scope)
+            if is_preflight:
+                # Answered from precomputed headers, no body or routing needed
+                await send({'type': 'http.response.start', 'status': 204,
+                            'headers': self.preflight.asgi_headers(origin)})
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            body = await read_body(receive)
+            request = build_request(scope, body)
+            response = await self.dispatch(request)
+            await self.send_response(send, request, response)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Write the rating aggregate so the next start has little log
+                # to replay, and this worker's rollups so its counts are kept
+                for checkpoint in (RATING_STORE.checkpoint, ROLLUPS.checkpoint):
+                    try:
+                        await asyncio.to_thread(checkpoint)
+                    except OSError:
+                        pass
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, request):
+        """
+        Finds the route for a request and runs its handler.
+
+        Args:
+            request: ApiRequest
+
+        Returns:
+            ApiResponse
+        """
+        for pattern, route in self.routes:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+
+            method = 'GET' if request.method == 'HEAD' else request.method
+            if method == 'OPTIONS':
+                # Automatic OPTIONS answer, like Flask's (preflights never get here)
+                return ApiResponse(headers={'Allow': allowed_methods(route)}, mimetype='text/html')
+            if method not in route.methods:
+                response = json_response({'error': 'Method not allowed'}, 405)
+                response.headers['Allow'] = allowed_methods(route)
+                return response
+
+            try:
+                if route.blocking:
+                    return await asyncio.to_thread(handle_request, route, request, match.groupdict())
+                return handle_request(route, request, match.groupdict())
+            except Exception:
+                LOG.exception('request_failed', extra={'fields': {
+                    'method': request.method, 'path': request.path
+                }})
+                return json_response({'error': 'Internal server error'}, 500)
+
+        return json_response({'error': 'Not found'}, 404)
+
+    async def send_response(self, send, request, response):
+        headers = dict(response.headers)
+        origin = request.headers.get('Origin')
+        if origin in self.cors_origins and 'Access-Control-Allow-Origin' not in headers:
+            headers['Access-Control-Allow-Origin'] = origin
+            headers['Vary'] = f"{headers['Vary']}, Origin" if 'Vary' in headers else 'Origin'
+        headers['Content-Length'] = str(len(response.body))
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in headers.items()],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'' if request.method == 'HEAD' else response.body,
+        })
+
+
+def allowed_methods(route):
+    methods = set(route.methods) | {'OPTIONS'}
+    if 'GET' in methods:
+        methods.add('HEAD')
+    return ', '.join(sorted(methods))
+
+
+def create_app(warm_up=WARM_UP):
+    """
+    Application factory: builds the ASGI app and starts the quiz API's
+    background threads (see quiz_api.start).
+
+    Args:
+        warm_up: 'background', 'eager' or 'lazy' (see quiz_api.WARM_UP)
+
+    Returns:
+        QuizASGIApp
+    """
+    app = QuizASGIApp()
+    start(warm_up)
+    return app
+
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    # python asgi.py [port]
+    if uvicorn is None:
+        sys.exit('uvicorn is required to run the async server (pip install uvicorn)')
+    uvicorn.run('asgi:app', host='0.0.0.0', port=int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
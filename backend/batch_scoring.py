@@ -0,0 +1,373 @@
+"""
+Vectorized scoring of many quizzes at once, for re-scoring historical
+answers after the trait mappings in questions.json change and for
+simulating result distributions.
+
+Answers are a NumPy matrix with one row per quiz and one column per
+question position, using the same codes as QuizSession.answers
+(0 = not answered, n = option n - 1 chosen).
+
+NumPy is not a web worker dependency; install it with
+    pip install -r requirements-dev.txt
+
+Usage (from the backend directory):
+    python batch_scoring.py answers.jsonl
+    python batch_scoring.py answers.jsonl --questions old_questions.json --compare questions.json
+    python batch_scoring.py --simulate 1000000
+"""
+import argparse
+import json
+import sys
+import time
+from itertools import product
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for offline batch scoring
+    np = None
+
+from question_index import QuestionIndex
+from quiz_session import TRAITS, TRAIT_SLOTS
+
+#------------------------------------------------------------------------------
+
+#                          VECTORIZED BATCH SCORING
+
+#------------------------------------------------------------------------------
+
+# Trait pairs in personality type letter order; the first letter wins only
+# when its score is strictly higher (same rule as calculate_personality_type)
+DIMENSIONS = (('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P'))
+
+# Personality type for each 4-bit code (bit 3 = E, bit 2 = S, bit 1 = T, bit 0 = J)
+TYPE_NAMES = tuple(
+    ''.join(pair[0] if first else pair[1] for pair, first in zip(DIMENSIONS, bits))
+    for bits in product((0, 1), repeat=4)
+)
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('NumPy is required for batch scoring (pip install -r requirements-dev.txt)')
+
+
+def build_trait_matrix(question_index):
+    """
+    Compiles the question x option -> trait mapping into a lookup array.
+
+    Args:
+        question_index: QuestionIndex of the questions to score against
+
+    Returns:
+        uint8 array of shape (questions, max options + 1, traits); entry
+        [position, code] is the one-hot trait vector added by answer code
+        `code` at that position (all zeros for code 0 and non-scoring
+        questions)
+    """
+    _require_numpy()
+    max_options = max((len(options) for options in question_index.option_lists), default=0)
+    matrix = np.zeros((len(question_index), max_options + 1, len(TRAITS)), dtype=np.uint8)
+    for position, options in enumerate(question_index.option_lists):
+        if not question_index.scoring[position]:
+            continue
+        for option in options:
+            if option.trait in TRAIT_SLOTS:
+                matrix[position, option.index + 1, TRAIT_SLOTS[option.trait]] = 1
+    return matrix
+
+
+def score_answers(answers, trait_matrix):
+    """
+    Adds up the trait scores of every quiz.
+
+    Args:
+        answers: Integer array (quizzes, questions) of answer codes
+        trait_matrix: Array from build_trait_matrix()
+
+    Returns:
+        uint16 array (quizzes, traits) of scores, in TRAITS order
+    """
+    _require_numpy()
+    answers = np.asarray(answers)
+    if answers.ndim != 2 or answers.shape[1] != trait_matrix.shape[0]:
+        raise ValueError(f'Expected an answer matrix with {trait_matrix.shape[0]} columns')
+    if answers.size and (answers.min() < 0 or answers.max() >= trait_matrix.shape[1]):
+        raise ValueError('Answer codes out of range for these questions')
+
+    # One gather per question keeps memory at quizzes x traits
+    scores = np.zeros((answers.shape[0], len(TRAITS)), dtype=np.uint16)
+    for position in range(answers.shape[1]):
+        scores += trait_matrix[position][answers[:, position]]
+    return scores
+
+
+def personality_codes(scores):
+    """
+    Args:
+        scores: Array (quizzes, traits) from score_answers()
+
+    Returns:
+        uint8 array of 4-bit type codes, indexes into TYPE_NAMES
+    """
+    _require_numpy()
+    codes = np.zeros(scores.shape[0], dtype=np.uint8)
+    for first, second in DIMENSIONS:
+        codes = (codes << 1) | (scores[:, TRAIT_SLOTS[first]] > scores[:, TRAIT_SLOTS[second]])
+    return codes
+
+
+def score_types(answers, question_index):
+    """
+    Personality type codes for a matrix of answer codes.
+
+    Args:
+        answers: Integer array (quizzes, questions) of answer codes
+        question_index: QuestionIndex to score against
+
+    Returns:
+        uint8 array of type codes, indexes into TYPE_NAMES
+    """
+    return personality_codes(score_answers(answers, build_trait_matrix(question_index)))
+
+
+def type_counts(codes):
+    """
+    Returns:
+        Dictionary personality type -> number of quizzes, for all 16 types
+    """
+    return dict(zip(TYPE_NAMES, np.bincount(codes, minlength=len(TYPE_NAMES)).tolist()))
+
+
+def transition_table(question_index):
+    """
+    Compiles the quiz flow into an array for walking many quizzes at once.
+
+    Returns:
+        intp array of shape (questions + 1, max options + 1); entry
+        [position, code] is the position answer code `code` leads to (code 0
+        = no matching option). The extra last row keeps finished quizzes on
+        the end position.
+    """
+    _require_numpy()
+    total = len(question_index)
+    max_options = max((len(options) for options in question_index.option_lists), default=0)
+    table = np.full((total + 1, max_options + 1), total, dtype=np.intp)
+    for position, steps in enumerate(question_index.transitions):
+        table[position, 0] = steps[-1]
+        table[position, 1:len(steps)] = steps[:-1]
+    return table
+
+
+def answer_path(question_index, start_step=0):
+    """
+    Returns:
+        List of the positions a quiz started at start_step visits when it
+        follows the default next question everywhere, in order
+    """
+    path = []
+    step = start_step
+    while step < len(question_index):
+        path.append(step)
+        step = question_index.next_steps[step]
+    return path
+
+
+def simulate_answers(question_index, quizzes, seed=None):
+    """
+    Random answers (uniform over each question's options) along the quiz
+    flow, for simulating the result distribution. In a branching quiz each
+    quiz follows its own choices, all quizzes advancing one question per
+    round.
+
+    Args:
+        question_index: QuestionIndex to simulate
+        quizzes: Number of quizzes
+        seed: Optional random seed
+
+    Returns:
+        uint8 array (quizzes, questions) of answer codes
+    """
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    total = len(question_index)
+    if not question_index.branching:
+        # Every quiz takes the same path: fill one column per question
+        answers = np.zeros((quizzes, total), dtype=np.uint8)
+        for position in answer_path(question_index):
+            option_count = len(question_index.option_lists[position])
+            if option_count:
+                answers[:, position] = rng.integers(1, option_count + 1, size=quizzes, dtype=np.uint8)
+        return answers
+
+    table = transition_table(question_index)
+    # Option count per position, 0 for the end position
+    option_counts = np.array([len(options) for options in question_index.option_lists] + [0])
+
+    answers = np.zeros((quizzes, total), dtype=np.uint8)
+    positions = np.zeros(quizzes, dtype=np.intp)
+    rows = np.arange(quizzes)
+    while True:
+        active = positions < total
+        if not active.any():
+            break
+        rows_active = rows[active]
+        at = positions[active]
+        counts = option_counts[at]
+        codes = np.where(counts > 0, rng.integers(1, np.maximum(counts, 1) + 1), 0).astype(np.uint8)
+        answers[rows_active, at] = codes
+        positions[active] = table[at, codes]
+    return answers
+
+
+def load_answer_log(path, question_index):
+    """
+    Reads answer vectors, one JSON value per line: either a list of option
+    indices in the order the questions were shown, an object with "answers"
+    and optional "start_step" (the /api/result request format), or an object
+    with "codes", answer codes per question position (the format written by
+    `python answer_log.py export`). Incomplete, malformed or out-of-range
+    lines are skipped.
+
+    Args:
+        path: Log file path
+        question_index: QuestionIndex the answers are placed against
+
+    Returns:
+        (uint8 answer code array, number of skipped lines)
+    """
+    _require_numpy()
+    option_counts = np.array([len(options) for options in question_index.option_lists])
+    paths = {}
+    rows = []
+    skipped = 0
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if isinstance(entry, dict) and 'codes' in entry:
+                    row = _position_codes(option_counts, entry['codes'])
+                    if row is None:
+                        skipped += 1
+                    else:
+                        rows.append(row)
+                    continue
+                if isinstance(entry, dict):
+                    vector, start_step = entry['answers'], entry.get('start_step', 0)
+                else:
+                    vector, start_step = entry, 0
+                if question_index.branching:
+                    row = _walk_answers(question_index, vector, start_step)
+                    if row is None:
+                        skipped += 1
+                    else:
+                        rows.append(row)
+                    continue
+                if start_step not in paths:
+                    paths[start_step] = np.array(answer_path(question_index, start_step), dtype=np.intp)
+                positions = paths[start_step]
+                vector = np.asarray(vector, dtype=np.int64)
+            except (ValueError, KeyError, TypeError):
+                skipped += 1
+                continue
+            if (vector.ndim != 1 or len(vector) != len(positions)
+                    or (vector < 0).any() or (vector >= option_counts[positions]).any()):
+                skipped += 1
+                continue
+            row = np.zeros(len(question_index), dtype=np.uint8)
+            row[positions] = vector + 1
+            rows.append(row)
+    answers = np.vstack(rows) if rows else np.zeros((0, len(question_index)), dtype=np.uint8)
+    return answers, skipped
+
+
+def _position_codes(option_counts, codes):
+    """
+    Checks answer codes given per question position (0 = not answered,
+    n = option n - 1).
+
+    Returns:
+        uint8 row of answer codes, or None if a code is out of range
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    if (codes.ndim != 1 or len(codes) > len(option_counts) or (codes < 0).any()
+            or (codes > option_counts[:len(codes)]).any()):
+        return None
+    row = np.zeros(len(option_counts), dtype=np.uint8)
+    row[:len(codes)] = codes
+    return row
+
+
+def _walk_answers(question_index, vector, start_step):
+    """
+    Places one answer vector along the path its own choices take through a
+    branching quiz.
+
+    Returns:
+        uint8 row of answer codes, or None if the vector doesn't fit the flow
+    """
+    if not isinstance(start_step, int) or not 0 <= start_step < len(question_index):
+        return None
+    row = np.zeros(len(question_index), dtype=np.uint8)
+    step = start_step
+    for choice in vector:
+        if (step >= len(question_index) or not isinstance(choice, int)
+                or not 0 <= choice < len(question_index.option_lists[step])):
+            return None
+        row[step] = choice + 1
+        step = question_index.transitions[step][choice]
+    return row if step >= len(question_index) else None
+
+
+def load_question_index(path):
+    with open(path, 'r') as f:
+        return QuestionIndex(json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score many quizzes at once.')
+    parser.add_argument('log', nargs='?', help='answer log (JSON lines)')
+    parser.add_argument('--questions', default='questions.json',
+                        help='questions.json to score with')
+    parser.add_argument('--compare', metavar='QUESTIONS',
+                        help='also score with this questions.json and count changed types')
+    parser.add_argument('--simulate', type=int, metavar='N',
+                        help='score N random quizzes instead of a log')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit('NumPy is required for batch scoring (pip install -r requirements-dev.txt)')
+    if not args.log and not args.simulate:
+        parser.error('give an answer log or --simulate N')
+
+    question_index = load_question_index(args.questions)
+    started = time.perf_counter()
+    if args.simulate:
+        answers, skipped = simulate_answers(question_index, args.simulate, args.seed), 0
+    else:
+        answers, skipped = load_answer_log(args.log, question_index)
+    loaded = time.perf_counter()
+    codes = score_types(answers, question_index)
+    scored = time.perf_counter()
+
+    total = len(codes)
+    print(f'{total} quizzes scored in {scored - loaded:.3f}s '
+          f'(loaded in {loaded - started:.3f}s, {skipped} lines skipped)')
+    for personality_type, count in sorted(type_counts(codes).items(), key=lambda item: -item[1]):
+        share = count / total if total else 0
+        print(f'{personality_type}  {count:>10}  {share:7.2%}')
+
+    if args.compare:
+        other_index = load_question_index(args.compare)
+        if len(other_index) != len(question_index):
+            sys.exit('--compare questions have a different number of questions')
+        other_codes = score_types(answers, other_index)
+        changed = int((codes != other_codes).sum())
+        share = changed / total if total else 0
+        print(f'{changed} quizzes ({share:.2%}) get a different type with {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
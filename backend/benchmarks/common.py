@@ -0,0 +1,61 @@
+"""
+Helpers shared by the benchmark scripts: scratch workspaces, so runs never
+write ratings, logs, rollups or image variants into the real backend
+directory, and local ports for the servers they launch.
+"""
+import atexit
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Resized images are built into images/variants, so the workspace gets its own
+# images tree with only the source image files linked in (os.walk, used by
+# the image cache and variant build, doesn't follow directory links)
+GENERATED_IMAGES = 'variants'
+
+
+def make_workspace(directory):
+    """Links the read-only data files the app loads into a scratch directory."""
+    os.symlink(os.path.join(BACKEND_DIR, 'questions.json'), os.path.join(directory, 'questions.json'))
+    image_root = os.path.join(BACKEND_DIR, 'images')
+    for source_dir, subdirs, files in os.walk(image_root):
+        if source_dir == image_root and GENERATED_IMAGES in subdirs:
+            subdirs.remove(GENERATED_IMAGES)
+        target_dir = os.path.join(directory, 'images', os.path.relpath(source_dir, image_root))
+        os.makedirs(target_dir, exist_ok=True)
+        for name in files:
+            os.symlink(os.path.join(source_dir, name), os.path.join(target_dir, name))
+    return directory
+
+
+def scratch_workspace():
+    """
+    Workspace in a new temporary directory, for benchmarks that import the
+    app in-process. It is removed at interpreter exit, after the app's own
+    exit handlers (answer log flush, rating and rollup checkpoints) have
+    written into it, so call this before importing the app and stay in it.
+    """
+    directory = tempfile.mkdtemp(prefix='quiz-benchmark-')
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    return make_workspace(directory)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
@@ -0,0 +1,79 @@
+"""
+Compares image serving throughput of the in-memory image cache with the
+previous handler (send_from_directory on every request).
+
+Runs entirely in-process with the Flask test client, cycling through every
+creature image, and reports requests/sec and MB/sec for full downloads and
+for conditional requests answered with 304. The app runs in a scratch
+directory (images linked in), so its runtime files stay out of the backend
+directory.
+
+Usage (from the backend directory):
+    python benchmarks/image_throughput.py --requests 3000
+"""
+import argparse
+import os
+import sys
+import time
+
+from common import BACKEND_DIR, scratch_workspace
+
+sys.path.insert(0, BACKEND_DIR)
+
+from flask import Flask, send_from_directory  # noqa: E402
+
+
+def legacy_app():
+    legacy = Flask('legacy_images')
+
+    @legacy.route('/images/<path:filename>')
+    def serve_image(filename):
+        return send_from_directory(os.path.join(BACKEND_DIR, 'images'), filename)
+
+    return legacy
+
+
+def run(client, paths, count, conditional):
+    # Last-Modified rather than ETag, the old handler didn't always send one
+    validators = {}
+    if conditional:
+        for path in paths:
+            validators[path] = client.get(path).headers['Last-Modified']
+    transferred = 0
+    started = time.perf_counter()
+    for i in range(count):
+        path = paths[i % len(paths)]
+        headers = {'If-Modified-Since': validators[path]} if conditional else {}
+        response = client.get(path, headers=headers)
+        transferred += len(response.get_data())
+        expected = 304 if conditional else 200
+        if response.status_code != expected:
+            raise RuntimeError(f'{path}: got {response.status_code}, expected {expected}')
+    elapsed = time.perf_counter() - started
+    return count / elapsed, transferred / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=3000)
+    args = parser.parse_args()
+
+    # Importing the app starts it, so only once the arguments are valid
+    os.chdir(scratch_workspace())
+    import app as quiz_app
+
+    paths = sorted(
+        '/images/creatures/' + name for name in os.listdir(os.path.join(BACKEND_DIR, 'images', 'creatures'))
+    )
+    handlers = [('send_from_directory', legacy_app().test_client()),
+                ('memory cache', quiz_app.app.test_client())]
+
+    print(f'{"handler":<20} {"mode":<12} {"req/s":>9} {"MB/s":>8}')
+    for mode, conditional in (('full', False), ('304', True)):
+        for name, client in handlers:
+            requests_per_sec, mb_per_sec = run(client, paths, args.requests, conditional)
+            print(f'{name:<20} {mode:<12} {requests_per_sec:>9.0f} {mb_per_sec:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Measures CORS preflight (OPTIONS) throughput of the Flask app and the ASGI
+app, calling the WSGI/ASGI callables in-process so server overhead doesn't
+hide the cost of the preflight path itself.
+
+Preflights cycle through the API routes a browser preflights (JSON POSTs
+and GETs), from an allowed origin, and every reply is checked for the
+Access-Control-Allow-* headers. --legacy runs the previous setup for
+comparison: flask-cors plus an OPTIONS branch in every route's view.
+The app runs in a scratch directory, so its runtime files stay out of the
+backend directory.
+
+Usage (from the backend directory):
+    python benchmarks/preflight.py --requests 20000
+    python benchmarks/preflight.py --target asgi
+    python benchmarks/preflight.py --legacy
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+from common import BACKEND_DIR, scratch_workspace
+
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(scratch_workspace())
+# Preflights need none of the data the warm-up loads
+os.environ.setdefault('QUIZ_WARM_UP', 'lazy')
+
+from flask import Flask, request  # noqa: E402
+from flask_cors import CORS  # noqa: E402
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import quiz_api  # noqa: E402
+
+PATHS = ('/api/start_quiz', '/api/answer', '/api/answers/batch', '/api/result',
+         '/api/restart', '/api/submit_rating', '/api/ratings', '/api/answer_stats')
+
+ORIGIN = quiz_api.CORS_ORIGINS[0]
+
+
+def preflight_headers(path):
+    method = 'GET' if path in ('/api/ratings', '/api/answer_stats') else 'POST'
+    return {
+        'Origin': ORIGIN,
+        'Access-Control-Request-Method': method,
+        'Access-Control-Request-Headers': 'content-type',
+    }
+
+
+def legacy_app():
+    """The previous preflight path: routed to each view, answered with JSON."""
+    legacy = Flask('legacy_preflight')
+    CORS(legacy, resources={r"/*": {
+        "origins": quiz_api.CORS_ORIGINS,
+        "methods": quiz_api.CORS_METHODS,
+        "allow_headers": "*"
+    }})
+
+    def make_view(path):
+        def view():
+            if request.method == 'OPTIONS':
+                response = legacy.response_class(b'{"status":"ok"}', 200,
+                                                 {'Content-Type': 'application/json'})
+                response.headers['Access-Control-Allow-Origin'] = '*'
+                response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
+                response.headers['Access-Control-Allow-Methods'] = 'POST,OPTIONS'
+                return response
+            return legacy.response_class(b'{}', 200)
+        view.__name__ = path
+        return view
+
+    for path in PATHS:
+        legacy.add_url_rule(path, view_func=make_view(path), methods=['GET', 'POST', 'OPTIONS'])
+    return legacy.wsgi_app
+
+
+def run_wsgi(wsgi_app, count):
+    environs = [
+        EnvironBuilder(path=path, method='OPTIONS', headers=preflight_headers(path)).get_environ()
+        for path in PATHS
+    ]
+    replies = []
+
+    def start_response(status, headers, exc_info=None):
+        replies.append((status, headers))
+
+    started = time.perf_counter()
+    for number in range(count):
+        result = wsgi_app(dict(environs[number % len(environs)]), start_response)
+        b''.join(result)
+        if hasattr(result, 'close'):
+            result.close()
+    elapsed = time.perf_counter() - started
+
+    for status, headers in replies[:len(PATHS)]:
+        check(int(status.split()[0]), {name.lower(): value for name, value in headers})
+    return elapsed
+
+
+def run_asgi(asgi_app, count):
+    scopes = [{
+        'type': 'http', 'method': 'OPTIONS', 'path': path, 'root_path': '',
+        'query_string': b'', 'scheme': 'http', 'server': ('localhost', 5000),
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in preflight_headers(path).items()],
+    } for path in PATHS]
+    replies = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            replies.append(message)
+
+    async def requests():
+        for number in range(count):
+            await asgi_app(scopes[number % len(scopes)], receive, send)
+
+    started = time.perf_counter()
+    asyncio.run(requests())
+    elapsed = time.perf_counter() - started
+
+    for message in replies[:len(PATHS)]:
+        check(message['status'], {name.decode(): value.decode()
+                                  for name, value in message['headers']})
+    return elapsed
+
+
+def check(status, headers):
+    if status not in (200, 204) or 'access-control-allow-origin' not in headers \
+            or 'access-control-allow-methods' not in headers:
+        raise RuntimeError(f'not a preflight answer: {status} {headers}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', choices=('flask', 'asgi'), default='flask')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--legacy', action='store_true',
+                        help='use the previous per-route preflight (flask only)')
+    args = parser.parse_args()
+
+    if args.target == 'asgi':
+        if args.legacy:
+            parser.error('--legacy is only available for the flask target')
+        import asgi
+        run = lambda count: run_asgi(asgi.app, count)  # noqa: E731
+    else:
+        if args.legacy:
+            wsgi_app = legacy_app()
+        else:
+            import app as quiz_app
+            wsgi_app = quiz_app.app.wsgi_app
+        run = lambda count: run_wsgi(wsgi_app, count)  # noqa: E731
+
+    run(min(args.requests, 1000))  # warm up
+    elapsed = run(args.requests)
+    label = f'{args.target}{" (legacy)" if args.legacy else ""}'
+    print(f'{label}: {args.requests} preflights in {elapsed:.2f}s, '
+          f'{args.requests / elapsed:,.0f} req/s, {elapsed / args.requests * 1e6:.1f} us each')
+
+
+if __name__ == '__main__':
+    main()
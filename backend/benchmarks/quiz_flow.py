@@ -0,0 +1,328 @@
+"""
+End-to-end benchmark of complete quiz flows.
+
+Every simulated user starts a quiz, answers all questions (picking options
+at random from a fixed seed) and submits a rating. Runs against the Flask
+test client in-process, or against a locally launched gunicorn (or uvicorn
+for the ASGI app) with several client processes. Reports throughput,
+p50/p95/p99 latency per endpoint and the memory held per quiz session.
+
+Everything runs offline in a scratch directory (questions.json and images
+are linked in, ratings and sessions are written there), so the real
+ratings files are never touched.
+
+Results can be saved and compared with a previous run to catch regressions
+in the hot paths (answer and rating handling):
+
+    python benchmarks/quiz_flow.py --save before.json
+    python benchmarks/quiz_flow.py --compare before.json --tolerance 0.25
+
+Usage (from the backend directory):
+    python benchmarks/quiz_flow.py --target testclient --duration 10
+    python benchmarks/quiz_flow.py --target gunicorn --workers 2 --clients 8
+    python benchmarks/quiz_flow.py --target uvicorn --clients 8
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from common import BACKEND_DIR, free_port, make_workspace, scratch_workspace, wait_for_port
+
+sys.path.insert(0, BACKEND_DIR)
+
+ENDPOINTS = ('/api/start_quiz', '/api/answer', '/api/submit_rating')
+PERCENTILES = (50, 95, 99)
+
+
+def play_quiz(post, timings, rng):
+    """
+    Plays one quiz: start, answer every question, rate the result.
+
+    Args:
+        post: Function (path, payload) -> parsed JSON reply
+        timings: Dictionary endpoint -> list of latencies, appended to
+        rng: random.Random picking the options and the rating
+
+    Returns:
+        Number of requests made
+    """
+    def timed(path, payload):
+        started = time.perf_counter()
+        data = post(path, payload)
+        timings[path].append(time.perf_counter() - started)
+        return data
+
+    data = timed('/api/start_quiz', {})
+    session_id = data['session_id']
+    question = data['question']
+    requests = 1
+    while True:
+        choice = rng.choice(question['options'])['text']
+        data = timed('/api/answer', {'session_id': session_id, 'choice': choice})
+        requests += 1
+        if data.get('session_replaced'):
+            raise RuntimeError('Session was lost between requests')
+        if data.get('quiz_complete'):
+            break
+        question = data['next_question']
+    timed('/api/submit_rating', {'rating': rng.randint(1, 5)})
+    return requests + 1
+
+
+def run_flows(post, deadline, seed):
+    """Plays quizzes until the deadline. Returns (quizzes, requests, timings)."""
+    rng = random.Random(seed)
+    timings = {endpoint: [] for endpoint in ENDPOINTS}
+    quizzes = requests = 0
+    while time.monotonic() < deadline:
+        requests += play_quiz(post, timings, rng)
+        quizzes += 1
+    return quizzes, requests, timings
+
+
+#------------------------------------------------------------------------------
+# In-process Flask test client
+#------------------------------------------------------------------------------
+
+def measure_testclient(args, workspace):
+    os.chdir(workspace)
+    # The app's JSON log (a personality_assessment line per finished quiz) goes
+    # to the stdout it finds at import, so import it while stdout is redirected
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as quiz_app
+
+        client = quiz_app.app.test_client()
+
+        def post(path, payload):
+            response = client.post(path, json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} returned {response.status_code}: {response.data!r}')
+            return response.get_json()
+
+        # Warm up (first-request setup, lazily built caches)
+        run_flows(post, time.monotonic() + 0.5, args.seed)
+
+        started = time.monotonic()
+        quizzes, requests, timings = run_flows(post, started + args.duration, args.seed)
+        elapsed = time.monotonic() - started
+
+        session_bytes = session_memory(post, args.memory_sessions)
+    return quizzes, requests, timings, elapsed, session_bytes
+
+
+def session_memory(post, sessions):
+    """
+    Memory retained per live session, measured with tracemalloc: starts
+    sessions and answers half of each quiz, so every session holds state.
+    """
+    rng = random.Random(0)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(sessions):
+        data = post('/api/start_quiz', {})
+        session_id = data['session_id']
+        question = data['question']
+        for _ in range(11):
+            data = post('/api/answer', {'session_id': session_id,
+                                        'choice': rng.choice(question['options'])['text']})
+            question = data['next_question']
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return retained / sessions if sessions else None
+
+
+#------------------------------------------------------------------------------
+# Local gunicorn / uvicorn server
+#------------------------------------------------------------------------------
+
+def http_post(port, path, payload):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    data = json.loads(response.read())
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f'{path} returned {response.status}: {data}')
+    return data
+
+
+def client(port, deadline, seed, results):
+    results.put(run_flows(lambda path, payload: http_post(port, path, payload), deadline, seed))
+
+
+def process_tree_rss(pid):
+    """Resident memory of a process and its children in bytes (Linux only)."""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = [int(child) for child in f.read().split()]
+        with open(f'/proc/{pid}/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+    for child in children:
+        child_rss = process_tree_rss(child)
+        if child_rss is None:
+            return None
+        rss += child_rss
+    return rss
+
+
+def measure_server(args, workspace):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    # Several workers only see each other's sessions through a shared store
+    if args.workers > 1:
+        env['QUIZ_SESSION_STORE'] = f"sqlite:{os.path.join(workspace, 'sessions.db')}"
+    if args.target == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-w', str(args.workers),
+                   '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers),
+                   '--port', str(port), '--log-level', 'warning', '--no-access-log', 'asgi:app']
+    server = subprocess.Popen(command, cwd=workspace, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        # Warm up every worker
+        run_flows(lambda path, payload: http_post(port, path, payload),
+                  time.monotonic() + 0.5, args.seed)
+        rss_before = process_tree_rss(server.pid)
+
+        results = multiprocessing.Queue()
+        deadline = time.monotonic() + args.duration
+        processes = [multiprocessing.Process(target=client,
+                                             args=(port, deadline, args.seed + n, results))
+                     for n in range(args.clients)]
+        started = time.monotonic()
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.monotonic() - started
+        rss_after = process_tree_rss(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    quizzes = sum(total[0] for total in totals)
+    requests = sum(total[1] for total in totals)
+    timings = {endpoint: [t for total in totals for t in total[2][endpoint]]
+               for endpoint in ENDPOINTS}
+    # Only meaningful when sessions live in worker memory
+    session_bytes = None
+    if args.workers == 1 and rss_before is not None and rss_after is not None and quizzes:
+        session_bytes = max(rss_after - rss_before, 0) / quizzes
+    return quizzes, requests, timings, elapsed, session_bytes
+
+
+#------------------------------------------------------------------------------
+# Reporting
+#------------------------------------------------------------------------------
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(quizzes, requests, timings, elapsed, session_bytes):
+    endpoints = {}
+    for endpoint, values in timings.items():
+        values = sorted(values)
+        endpoints[endpoint] = {'count': len(values)}
+        for p in PERCENTILES:
+            value = percentile(values, p)
+            endpoints[endpoint][f'p{p}_ms'] = round(value * 1000, 3) if value is not None else None
+    return {
+        'quizzes': quizzes,
+        'requests': requests,
+        'quizzes_per_sec': round(quizzes / elapsed, 1),
+        'requests_per_sec': round(requests / elapsed, 1),
+        'session_bytes': round(session_bytes) if session_bytes is not None else None,
+        'endpoints': endpoints,
+    }
+
+
+def print_report(target, summary):
+    print(f"target: {target}  quizzes: {summary['quizzes']}  "
+          f"quizzes/s: {summary['quizzes_per_sec']}  requests/s: {summary['requests_per_sec']}")
+    print(f'{"endpoint":<20} {"count":>7} ' + ' '.join(f'{f"p{p} ms":>8}' for p in PERCENTILES))
+    for endpoint, stats in summary['endpoints'].items():
+        print(f"{endpoint:<20} {stats['count']:>7} "
+              + ' '.join(f"{stats[f'p{p}_ms']:>8.3f}" if stats[f'p{p}_ms'] is not None
+                         else f'{"-":>8}' for p in PERCENTILES))
+    if summary['session_bytes'] is not None:
+        print(f"memory per session: {summary['session_bytes']} bytes")
+
+
+def compare(summary, baseline, tolerance):
+    """
+    Lists regressions against a saved run: an endpoint's p50 or p95 slower,
+    or throughput lower, by more than the tolerance (0.25 = 25%). p99 is
+    reported but too noisy on short runs to fail on.
+    """
+    regressions = []
+    if summary['requests_per_sec'] < baseline['requests_per_sec'] * (1 - tolerance):
+        regressions.append(f"requests/s {baseline['requests_per_sec']} -> "
+                           f"{summary['requests_per_sec']}")
+    for endpoint, stats in summary['endpoints'].items():
+        before = baseline['endpoints'].get(endpoint, {})
+        for key in ('p50_ms', 'p95_ms'):
+            if before.get(key) and stats[key] and stats[key] > before[key] * (1 + tolerance):
+                regressions.append(f'{endpoint} {key} {before[key]} -> {stats[key]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', choices=('testclient', 'gunicorn', 'uvicorn'),
+                        default='testclient')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent client processes')
+    parser.add_argument('--memory-sessions', type=int, default=2000,
+                        help='sessions created to measure memory (testclient only)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier --save to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before a regression is reported')
+    args = parser.parse_args()
+
+    if args.target == 'testclient':
+        results = measure_testclient(args, scratch_workspace())
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = measure_server(args, make_workspace(tmp))
+
+    summary = summarize(*results)
+    print_report(args.target, summary)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(dict(summary, target=args.target), f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Concurrent stress test for rating aggregation.
+
+Several processes, each with several threads, submit votes at the same time
+against one pair of ratings.json/ratings.log files. At the end the totals
+are checked against the number of votes actually sent, so any lost update
+makes the run fail. The old read-modify-write approach can be run with
+--legacy for comparison.
+
+Usage (from the backend directory):
+    python benchmarks/rating_stress.py --processes 4 --threads 4 --votes 2000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from rating_store import RatingStore  # noqa: E402
+
+
+def legacy_add(stats_path, rating):
+    """The previous submit_rating: read the whole file, update, rewrite it."""
+    try:
+        with open(stats_path, 'r') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        data = {"ratings": [], "stats": {"avg": 0, "count": 0,
+                                         "distribution": {str(i): 0 for i in range(1, 6)}}}
+    stats = data['stats']
+    old_total = stats['avg'] * stats['count']
+    stats['count'] += 1
+    stats['avg'] = round((old_total + rating) / stats['count'], 2)
+    stats['distribution'][str(rating)] += 1
+    with open(stats_path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def worker(directory, threads, votes, legacy, seed):
+    stats_path = os.path.join(directory, 'ratings.json')
+    store = None if legacy else RatingStore(stats_path, os.path.join(directory, 'ratings.log'))
+
+    def vote(thread_number):
+        for i in range(votes):
+            rating = (seed + thread_number + i) % 5 + 1
+            if legacy:
+                legacy_add(stats_path, rating)
+            else:
+                store.add(rating)
+
+    pool = [threading.Thread(target=vote, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    if store is not None:
+        store.checkpoint()
+
+
+def expected_distribution(processes, threads, votes):
+    distribution = {str(i): 0 for i in range(1, 6)}
+    for seed in range(processes):
+        for thread_number in range(threads):
+            for i in range(votes):
+                distribution[str((seed + thread_number + i) % 5 + 1)] += 1
+    return distribution
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--votes', type=int, default=2000, help='votes per thread')
+    parser.add_argument('--legacy', action='store_true', help='use the old rewrite-the-file code')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        processes = [
+            multiprocessing.Process(target=worker, args=(directory, args.threads, args.votes,
+                                                         args.legacy, seed))
+            for seed in range(args.processes)
+        ]
+        started = time.monotonic()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.monotonic() - started
+
+        if args.legacy:
+            try:
+                with open(os.path.join(directory, 'ratings.json'), 'r') as f:
+                    stats = json.load(f)['stats']
+            except json.JSONDecodeError:
+                stats = {'count': 0, 'distribution': {}}
+        else:
+            # A fresh reader rebuilds the totals from checkpoint + log
+            stats = RatingStore(os.path.join(directory, 'ratings.json'),
+                                os.path.join(directory, 'ratings.log')).stats()
+
+    sent = args.processes * args.threads * args.votes
+    expected = expected_distribution(args.processes, args.threads, args.votes)
+    print(f'votes sent:     {sent}')
+    print(f'votes recorded: {stats["count"]}')
+    print(f'throughput:     {sent / elapsed:.0f} votes/s')
+    if stats['count'] != sent or stats['distribution'] != expected:
+        print(f'LOST UPDATES: {sent - stats["count"]} votes missing')
+        sys.exit(1)
+    print('no lost updates')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Measures the memory held per quiz session.
+
+Compares the previous nested-dict session layout (scores dict, responses
+dict keyed by step, trait_questions lists with copied question snippets)
+with the compact QuizSession used now, for sessions stopped at different
+points of the quiz.
+
+Usage (from the backend directory):
+    python benchmarks/session_memory.py --sessions 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from question_index import QuestionIndex  # noqa: E402
+from quiz_session import QuizSession  # noqa: E402
+
+
+def dict_session(index, steps):
+    """Builds a session the way process_answer used to store it."""
+    state = {
+        'current_step': 0,
+        'scores': {'E': 0, 'I': 0, 'S': 0, 'N': 0, 'T': 0, 'F': 0, 'J': 0, 'P': 0},
+        'responses': {},
+        'trait_questions': {'E': [], 'I': [], 'S': [], 'N': [], 'T': [], 'F': [], 'J': [], 'P': []},
+        'created_at': time.time()
+    }
+    for step in range(steps):
+        option = index.option_lists[step][step % len(index.option_lists[step])]
+        # Copies, as the texts would arrive in a fresh request body each time
+        choice = ''.join(option.text)
+        state['responses'][str(step)] = choice
+        if index.scoring[step] and option.trait:
+            state['scores'][option.trait] += 1
+            question = index.questions[step]
+            state['trait_questions'][option.trait].append({
+                'question_id': question['id'],
+                'question_text': question['text'][:30] + "...",
+                'choice': choice
+            })
+        state['current_step'] = step + 1
+    return state
+
+
+def compact_session(index, steps):
+    session = QuizSession()
+    for step in range(steps):
+        option = index.option_lists[step][step % len(index.option_lists[step])]
+        session.record_answer(step, option, index.scoring[step])
+        session.step = step + 1
+    return session
+
+
+def bytes_per_session(factory, index, steps, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = {str(i): factory(index, steps) for i in range(count)}
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Don't count the session IDs or the dict holding the sessions
+    keys = sum(sys.getsizeof(key) for key in sessions) + sys.getsizeof(sessions)
+    return (after - before - keys) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(os.path.join(BACKEND_DIR, 'questions.json'), 'r', encoding='utf-8') as f:
+        index = QuestionIndex(json.load(f))
+
+    print(f'{"answered":>9} {"dict bytes":>11} {"compact bytes":>14} {"reduction":>10}')
+    for steps in (0, len(index) // 2, len(index)):
+        old = bytes_per_session(dict_session, index, steps, args.sessions)
+        new = bytes_per_session(compact_session, index, steps, args.sessions)
+        print(f'{steps:>9} {old:>11.0f} {new:>14.0f} {old / new:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Load test for the shared session store.
+
+Starts gunicorn with an increasing number of workers, all sharing one
+SQLite session store, and drives complete quizzes against it from several
+client processes. Prints quizzes/sec and requests/sec for each worker count.
+
+The server runs in a scratch directory (questions.json and images are
+linked in, ratings, logs and rollups are written there), so the real data
+files are never touched.
+
+Usage (from the backend directory):
+    python benchmarks/session_scaling.py --workers 1 2 4 --duration 10
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, free_port, make_workspace, wait_for_port
+
+
+def post(port, path, payload=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    body = json.dumps(payload or {})
+    connection.request('POST', path, body, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    data = json.loads(response.read())
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f'{path} returned {response.status}: {data}')
+    return data
+
+
+def run_quiz(port):
+    """
+    Plays one full quiz and returns the number of requests it took.
+    Fails if any answer lands on a worker that doesn't know the session.
+    """
+    data = post(port, '/api/start_quiz')
+    session_id = data['session_id']
+    question = data['question']
+    requests = 1
+    while True:
+        data = post(port, '/api/answer', {'session_id': session_id,
+                                           'choice': question['options'][0]['text']})
+        requests += 1
+        if data.get('session_replaced'):
+            raise RuntimeError('Session was lost between workers')
+        if data.get('quiz_complete'):
+            return requests
+        question = data['next_question']
+
+
+def client(port, deadline, results):
+    quizzes = requests = 0
+    while time.monotonic() < deadline:
+        requests += run_quiz(port)
+        quizzes += 1
+    results.put((quizzes, requests))
+
+
+def measure(workers, clients, duration, workspace):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR,
+               QUIZ_SESSION_STORE=f"sqlite:{os.path.join(workspace, 'sessions.db')}")
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+         '--log-level', 'warning', 'app:app'],
+        cwd=workspace, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        results = multiprocessing.Queue()
+        deadline = time.monotonic() + duration
+        processes = [multiprocessing.Process(target=client, args=(port, deadline, results))
+                     for _ in range(clients)]
+        started = time.monotonic()
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    quizzes = sum(q for q, _ in totals)
+    requests = sum(r for _, r in totals)
+    return quizzes / elapsed, requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    args = parser.parse_args()
+
+    print(f'{"workers":>8} {"quizzes/s":>10} {"requests/s":>11} {"scaling":>8}')
+    baseline = None
+    for workers in args.workers:
+        # A fresh workspace (and session store) for every worker count
+        with tempfile.TemporaryDirectory() as tmp:
+            quizzes_per_sec, requests_per_sec = measure(
+                workers, args.clients, args.duration, make_workspace(tmp))
+        baseline = baseline or requests_per_sec
+        print(f'{workers:>8} {quizzes_per_sec:>10.1f} {requests_per_sec:>11.1f} '
+              f'{requests_per_sec / baseline:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
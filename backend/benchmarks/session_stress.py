@@ -0,0 +1,214 @@
+"""
+Multithreaded stress test for concurrent answers to the same quiz session.
+
+Many threads answer the same few sessions at once through the /api/answer
+handler, with a very short thread switch interval to force interleaving:
+
+  keyed:   every thread sends the same answers with the step they are for,
+           like double-clicked or retried submits. Each step must be applied
+           once, every thread must get the same reply, and each quiz must be
+           counted as completed once.
+  unkeyed: every thread sends its own answers without a step. Each accepted
+           reply must have moved the session exactly one step.
+
+Either way the stored trait scores must equal the scores recomputed from
+the stored answers, so a lost or double-counted increment fails the run.
+--legacy runs the old unsynchronized read-modify-write for comparison.
+
+Everything runs in a scratch directory (questions.json and images are
+linked in), so the real ratings and answer logs are never touched.
+
+Usage (from the backend directory):
+    python benchmarks/session_stress.py --threads 16 --sessions 50
+    python benchmarks/session_stress.py --mode unkeyed --store sqlite
+    python benchmarks/session_stress.py --legacy
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from common import BACKEND_DIR, scratch_workspace
+
+sys.path.insert(0, BACKEND_DIR)
+
+from werkzeug.datastructures import Headers  # noqa: E402
+
+from api_http import ApiRequest  # noqa: E402
+from quiz_session import TRAIT_SLOTS  # noqa: E402
+
+JSON_HEADERS = Headers({'Content-Type': 'application/json'})
+
+
+def legacy_answer(quiz_api, session_id, choice):
+    """The previous process_answer: change the stored session in place, then save it."""
+    quiz_state = quiz_api.quiz_sessions.get(session_id)
+    if quiz_state is None:
+        return {'session_replaced': True}
+    question_set = quiz_api.QUESTION_REGISTRY.current()
+    question_index = question_set.index
+    if quiz_state.step >= len(question_index):
+        return {'session_replaced': True}
+    current_step = quiz_state.step
+    quiz_api.advance_quiz(question_index, quiz_state, choice)
+    quiz_api.quiz_sessions.save(session_id, quiz_state)
+    if quiz_state.step >= len(question_index):
+        return {'quiz_complete': True}
+    return {'step': current_step}
+
+
+def expected_scores(question_index, quiz_state):
+    """Trait scores recomputed from the answers stored in a session."""
+    scores = [0] * len(TRAIT_SLOTS)
+    for step, code in enumerate(quiz_state.answers):
+        if code and question_index.scoring[step]:
+            trait = question_index.option_lists[step][code - 1].trait
+            if trait:
+                scores[TRAIT_SLOTS[trait]] += 1
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=('keyed', 'unkeyed'), default='keyed')
+    parser.add_argument('--threads', type=int, default=16, help='threads per session')
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--store', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--legacy', action='store_true',
+                        help='use the old unsynchronized read-modify-write')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.chdir(scratch_workspace())
+    os.environ['QUIZ_SESSION_STORE'] = 'sqlite:sessions.db' if args.store == 'sqlite' else 'memory'
+    os.environ['QUIZ_LOG_SAMPLE_RATE'] = '0'
+    with contextlib.redirect_stdout(io.StringIO()):
+        import quiz_api
+    failures = run(quiz_api, args)
+
+    if failures:
+        for failure in failures[:10]:
+            print(f'  {failure}')
+        print(f'FAILED: {len(failures)} problems')
+        sys.exit(1)
+    print('no lost or double-counted answers')
+
+
+def run(quiz_api, args):
+    route = next(route for route in quiz_api.ROUTES if route.rule == '/api/answer')
+    question_index = quiz_api.QUESTION_REGISTRY.current().index
+
+    def post(payload):
+        if args.legacy:
+            return 200, legacy_answer(quiz_api, payload['session_id'], payload['choice'])
+        request = ApiRequest('POST', route.rule, headers=JSON_HEADERS,
+                             body=json.dumps(payload).encode())
+        response = quiz_api.handle_request(route, request, {})
+        return response.status, json.loads(response.body)
+
+    # Fixed answers per session for keyed mode, following the quiz flow
+    rng = random.Random(args.seed)
+    session_ids = []
+    plans = {}
+    for _ in range(args.sessions):
+        response = quiz_api.start_quiz(ApiRequest('POST', '/api/start_quiz'))
+        session_id = json.loads(response.body)['session_id']
+        session_ids.append(session_id)
+        plan = []
+        step = 0
+        while step < len(question_index):
+            option = rng.choice(question_index.option_lists[step])
+            plan.append((step, option.text))
+            step = question_index.transitions[step][option.index]
+        plans[session_id] = plan
+
+    replies = {}
+    accepted = {session_id: 0 for session_id in session_ids}
+    lock = threading.Lock()
+
+    def keyed(session_id):
+        for step, choice in plans[session_id]:
+            payload = {'session_id': session_id, 'choice': choice, 'step': step}
+            if args.legacy:
+                del payload['step']
+            _, data = post(payload)
+            with lock:
+                replies.setdefault((session_id, step), set()).add(json.dumps(data, sort_keys=True))
+                if data.get('session_replaced'):
+                    return
+
+    def unkeyed(session_id, thread_number):
+        while True:
+            # Pick from the question the session is on right now; another
+            # thread may still answer it first
+            quiz_state = quiz_api.quiz_sessions.get(session_id)
+            if quiz_state is None or quiz_state.step >= len(question_index):
+                return
+            step_options = question_index.option_lists[quiz_state.step]
+            choice = step_options[thread_number % len(step_options)].text
+            status, data = post({'session_id': session_id, 'choice': choice})
+            if status == 409 or data.get('session_replaced'):
+                return
+            with lock:
+                accepted[session_id] += 1
+            if data.get('quiz_complete'):
+                return
+
+    threads = []
+    for session_id in session_ids:
+        for thread_number in range(args.threads):
+            target, target_args = ((keyed, (session_id,)) if args.mode == 'keyed'
+                                   else (unkeyed, (session_id, thread_number)))
+            threads.append(threading.Thread(target=target, args=target_args))
+
+    sys.setswitchinterval(1e-6)
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    sys.setswitchinterval(0.005)
+
+    failures = []
+    for session_id in session_ids:
+        quiz_state = quiz_api.quiz_sessions.get(session_id)
+        if quiz_state is None:
+            failures.append(f'{session_id}: session lost')
+            continue
+        if list(quiz_state.scores) != expected_scores(question_index, quiz_state):
+            failures.append(f'{session_id}: scores {list(quiz_state.scores)} do not match '
+                            f'the answers ({expected_scores(question_index, quiz_state)})')
+        if quiz_state.step < len(question_index):
+            failures.append(f'{session_id}: stopped at step {quiz_state.step}')
+        if args.mode == 'keyed':
+            for step, choice in plans[session_id]:
+                if len(replies.get((session_id, step), ())) > 1:
+                    failures.append(f'{session_id}: different replies for step {step}')
+                option = question_index.find_option(step, choice)
+                if quiz_state.answers[step] != option.index + 1:
+                    failures.append(f'{session_id}: wrong answer stored for step {step}')
+        else:
+            path = len(plans[session_id])
+            if accepted[session_id] != path:
+                failures.append(f'{session_id}: {accepted[session_id]} answers accepted '
+                                f'for {path} questions')
+
+    # Completions counted by build_quiz_result, repeats must not count again
+    if not args.legacy:
+        completions = sum(value for _, value in quiz_api.QUIZZES_COMPLETED.samples())
+        if completions != args.sessions:
+            failures.append(f'{completions} completions counted for {args.sessions} quizzes')
+
+    print(f'{args.mode} mode, {args.store} store{" (legacy)" if args.legacy else ""}: '
+          f'{len(threads)} threads on {args.sessions} sessions in {elapsed:.2f}s')
+    return failures
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Cold-start report: how long a fresh worker process takes to import the app,
+answer its first request and finish warming up, with a breakdown of the
+import time by package (from python -X importtime).
+
+Every run starts a new interpreter in a scratch directory (questions.json
+and images are linked in, ratings and logs are written there), so nothing
+is cached between runs and the real data files are never touched. Phases
+are the median over --runs.
+
+  import         importing the entry module, including create_app()
+  first request  POST /api/start_quiz right after the import
+  warmed up      from the start of the import until the warm-up is done
+                 (the 'warm-up' thread in background mode)
+  process        wall time of the whole process, interpreter start included
+
+Results can be saved and compared with a previous run, to track cold-start
+latency over time:
+
+    python benchmarks/startup.py --save before.json
+    python benchmarks/startup.py --compare before.json --tolerance 0.25
+
+Usage (from the backend directory):
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --warm-up eager --snapshot
+    python benchmarks/startup.py --target asgi --top 20
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, make_workspace
+
+sys.path.insert(0, BACKEND_DIR)
+
+PHASES = ('import_ms', 'first_request_ms', 'warmed_up_ms', 'process_ms')
+
+# Runs in the child process; prints its timings on one line after MARKER
+MARKER = 'STARTUP_REPORT '
+CHILD = r'''
+import asyncio, json, sys, threading, time
+sys.path.insert(0, {backend_dir!r})
+started = time.perf_counter()
+import {module} as entry
+imported = time.perf_counter()
+
+if {module!r} == 'app':
+    response = entry.app.test_client().post('/api/start_quiz')
+    status = response.status_code
+else:
+    replies = []
+    async def receive():
+        return {{'type': 'http.request', 'body': b'', 'more_body': False}}
+    async def send(message):
+        replies.append(message)
+    asyncio.run(entry.app({{
+        'type': 'http', 'method': 'POST', 'path': '/api/start_quiz', 'root_path': '',
+        'query_string': b'', 'scheme': 'http', 'server': ('localhost', 5000), 'headers': [],
+    }}, receive, send))
+    status = replies[0]['status']
+answered = time.perf_counter()
+
+for thread in threading.enumerate():
+    if thread.name == 'warm-up':
+        thread.join()
+warmed_up = time.perf_counter()
+
+print({marker!r} + json.dumps({{
+    'status': status,
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (answered - imported) * 1000,
+    'warmed_up_ms': (warmed_up - started) * 1000,
+}}), flush=True)
+'''
+
+# "import time:      1234 |       5678 |     package.module"
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def write_workspace_snapshot(directory):
+    """Compiles the workspace's questions.json into questions.snapshot."""
+    from question_index import QuestionRegistry, write_snapshot
+    question_set = QuestionRegistry(os.path.join(directory, 'questions.json')).current()
+    write_snapshot(question_set, os.path.join(directory, 'questions.snapshot'))
+
+
+def run_once(args, workspace):
+    """
+    Starts one fresh worker process.
+
+    Returns:
+        (phase timings in ms, {package: self import time in ms})
+    """
+    code = CHILD.format(backend_dir=BACKEND_DIR, module='app' if args.target == 'flask' else 'asgi',
+                        marker=MARKER)
+    env = dict(os.environ, QUIZ_WARM_UP=args.warm_up)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=workspace,
+                            env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+
+    report = None
+    for line in result.stdout.splitlines():
+        if line.startswith(MARKER):
+            report = json.loads(line[len(MARKER):])
+    if result.returncode != 0 or report is None:
+        raise RuntimeError(f'startup failed:\n{result.stderr[-2000:]}')
+    if report.pop('status') != 200:
+        raise RuntimeError('first request did not return 200')
+    report['process_ms'] = elapsed * 1000
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            package = match[4].split('.')[0]
+            packages[package] = packages.get(package, 0) + int(match[1]) / 1000
+    return report, packages
+
+
+def summarize(runs):
+    phases = {phase: round(statistics.median(report[phase] for report, _ in runs), 2)
+              for phase in PHASES}
+    packages = {}
+    for _, run_packages in runs:
+        for package, ms in run_packages.items():
+            packages[package] = packages.get(package, 0) + ms / len(runs)
+    packages = {package: round(ms, 2)
+                for package, ms in sorted(packages.items(), key=lambda item: -item[1])}
+    return {'runs': len(runs), 'phases': phases, 'packages': packages}
+
+
+def print_report(args, summary, top):
+    print(f"target: {args.target}  warm-up: {args.warm_up}  "
+          f"snapshot: {'yes' if args.snapshot else 'no'}  runs: {summary['runs']}")
+    for phase, ms in summary['phases'].items():
+        print(f"{phase[:-3].replace('_', ' '):<16} {ms:>9.1f} ms")
+    print(f'\n{"package (self import time)":<32} {"ms":>8}')
+    total = sum(summary['packages'].values())
+    for package, ms in list(summary['packages'].items())[:top]:
+        print(f'{package:<32} {ms:>8.1f}  {ms / total:6.1%}')
+    print(f'{"all imports":<32} {total:>8.1f}')
+
+
+def compare(summary, baseline, tolerance):
+    """
+    Lists the phases that got slower than in a saved run by more than the
+    tolerance (0.25 = 25%).
+    """
+    regressions = []
+    for phase, ms in summary['phases'].items():
+        before = baseline['phases'].get(phase)
+        if before and ms > before * (1 + tolerance):
+            regressions.append(f'{phase} {before} -> {ms}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', choices=('flask', 'asgi'), default='flask')
+    parser.add_argument('--warm-up', choices=('background', 'eager', 'lazy'), default='background')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='start with a compiled questions.snapshot')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='packages listed in the breakdown')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier --save to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before a regression is reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = make_workspace(tmp)
+        if args.snapshot:
+            write_workspace_snapshot(workspace)
+        runs = [run_once(args, workspace) for _ in range(args.runs)]
+
+    summary = summarize(runs)
+    print_report(args, summary, args.top)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(dict(summary, target=args.target, warm_up=args.warm_up,
+                           snapshot=args.snapshot), f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
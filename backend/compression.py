@@ -0,0 +1,163 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+#------------------------------------------------------------------------------
+
+#                      NEGOTIATED RESPONSE COMPRESSION
+
+#------------------------------------------------------------------------------
+
+# Content-Encodings we can produce, preferred first when the client accepts
+# several with the same quality
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Bodies smaller than this are sent as they are (headers would eat the gain)
+MIN_SIZE = 512
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+# Static payloads are compressed once at the best level, per-user bodies
+# (quiz results) with a fast level on every request
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+
+
+def compress(body, encoding, static=False):
+    """
+    Args:
+        body: Bytes to compress
+        encoding: 'br' or 'gzip'
+        static: Use the best (slowest) level, for bodies that are reused
+
+    Returns:
+        Compressed bytes
+    """
+    level = (STATIC_LEVELS if static else DYNAMIC_LEVELS)[encoding]
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def negotiate(accept_encoding):
+    """
+    Picks the Content-Encoding for a response.
+
+    Args:
+        accept_encoding: Accept-Encoding request header, or None
+
+    Returns:
+        'br', 'gzip' or None to send the body uncompressed
+    """
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    best = None
+    best_quality = 0
+    for encoding in ENCODINGS:
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionCache:
+    """
+    Compressed copies of static response bodies, keyed by their ETag, so
+    each one is compressed once (at the best level) and then served from
+    memory. Payloads known ahead of time (questions, result summaries) are
+    put in with precompress() when they are built; other bodies with an
+    ETag are added the first time they are requested. The least recently
+    used entries are dropped beyond max_entries.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def precompress(self, etag, body):
+        """
+        Compresses a static body with every available encoding.
+
+        Args:
+            etag: ETag of the body
+            body: Uncompressed bytes
+        """
+        if len(body) < MIN_SIZE:
+            return
+        for encoding in ENCODINGS:
+            self.get(etag, body, encoding)
+
+    def get(self, etag, body, encoding):
+        """
+        Args:
+            etag: ETag of the body
+            body: Uncompressed bytes (compressed if not cached yet)
+            encoding: 'br' or 'gzip'
+
+        Returns:
+            The compressed body
+        """
+        key = (etag, encoding)
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                return compressed
+
+        compressed = compress(body, encoding, static=True)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def compress_response(request, response, cache):
+    """
+    Compresses a response body if the client accepts it and it is worth it.
+    Bodies with an ETag are static and come from (or go to) the cache; their
+    ETag is made weak, since the bytes differ from the uncompressed body but
+    mean the same (weak comparison still matches it in If-None-Match).
+
+    Args:
+        request: ApiRequest with the client's Accept-Encoding
+        response: ApiResponse from a handler, changed in place
+        cache: CompressionCache for static bodies
+
+    Returns:
+        The response
+    """
+    headers = response.headers
+    content_type = headers.get('Content-Type', '')
+    if (response.status != 200 or 'Content-Encoding' in headers
+            or not content_type.startswith(COMPRESSIBLE_TYPES)):
+        return response
+    # The representation depends on Accept-Encoding even when not compressed
+    headers['Vary'] = f"{headers['Vary']}, Accept-Encoding" if 'Vary' in headers else 'Accept-Encoding'
+
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None or len(response.body) < MIN_SIZE:
+        return response
+
+    etag = headers.get('ETag')
+    if etag is not None:
+        response.body = cache.get(etag, response.body, encoding)
+        if not etag.startswith('W/'):
+            headers['ETag'] = 'W/' + etag
+    else:
+        response.body = compress(response.body, encoding)
+    headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,116 @@
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from collections import namedtuple
+
+from werkzeug.http import http_date
+from werkzeug.security import safe_join
+
+#------------------------------------------------------------------------------
+
+#                           IN-MEMORY IMAGE CACHE
+
+#------------------------------------------------------------------------------
+
+# Files bigger than this are left to send_from_directory
+MAX_CACHED_FILE_SIZE = 4 * 1024 * 1024
+
+# One cached file with its response headers precomputed
+CachedImage = namedtuple('CachedImage', ['data', 'mimetype', 'etag', 'last_modified', 'stamp'])
+
+
+def _stamp(stat):
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class ImageCache:
+    """
+    Holds the image files (originals and variants) in memory with their
+    ETag and Last-Modified values computed once, so serving an image needs
+    no filesystem lookup or file open.
+
+    Each entry is re-checked with a stat() at most every check_interval
+    seconds and reloaded if the file changed; deleted files are dropped.
+    """
+
+    def __init__(self, root='images', check_interval=2.0):
+        self.root = root
+        self.check_interval = check_interval
+        self._entries = {}
+        self._next_check = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path, full_path, stat):
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        entry = CachedImage(
+            data,
+            mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            hashlib.sha1(data).hexdigest()[:20],
+            http_date(stat.st_mtime),
+            _stamp(stat)
+        )
+        with self._lock:
+            self._entries[path] = entry
+            self._next_check[path] = time.monotonic() + self.check_interval
+        return entry
+
+    def load_all(self):
+        """
+        Loads every file under the image root into memory.
+
+        Returns:
+            Number of files cached
+        """
+        for directory, subdirs, files in os.walk(self.root):
+            for name in files:
+                full_path = os.path.join(directory, name)
+                path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                stat = os.stat(full_path)
+                if stat.st_size <= MAX_CACHED_FILE_SIZE and not name.endswith('.tmp'):
+                    self._load(path, full_path, stat)
+        return len(self._entries)
+
+    def get(self, path):
+        """
+        Returns a cached image, loading or refreshing it if needed.
+
+        Args:
+            path: Path relative to the image root, as used in the URL
+
+        Returns:
+            CachedImage, or None if the file doesn't exist or is too big to cache
+        """
+        entry = self._entries.get(path)
+        now = time.monotonic()
+        if entry is not None and now < self._next_check.get(path, 0):
+            return entry
+
+        full_path = safe_join(self.root, path)
+        if full_path is None:
+            return None
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            # File was deleted (or never existed)
+            with self._lock:
+                self._entries.pop(path, None)
+                self._next_check.pop(path, None)
+            return None
+
+        if entry is not None and entry.stamp == _stamp(stat):
+            self._next_check[path] = now + self.check_interval
+            return entry
+        if stat.st_size > MAX_CACHED_FILE_SIZE or not os.path.isfile(full_path):
+            return None
+        return self._load(path, full_path, stat)
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with the number of cached files and their total size
+        """
+        entries = list(self._entries.values())
+        return {'files': len(entries), 'bytes': sum(len(entry.data) for entry in entries)}
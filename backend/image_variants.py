@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import namedtuple
+
+#------------------------------------------------------------------------------
+
+#                          RESIZED IMAGE VARIANTS
+
+#------------------------------------------------------------------------------
+
+# Widths generated for every image (never larger than the original)
+VARIANT_WIDTHS = (256, 512, 1024)
+
+# Variants live next to the originals, under images/variants/<same subpath>
+VARIANT_DIR = 'variants'
+
+FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Originals seen by the build, in the variants directory: path relative to
+# the image root -> [mtime, width]. Widths an original is too narrow for are
+# never generated, this is what keeps them from looking stale on every run
+SOURCES_FILE = 'sources.json'
+
+VARIANT_NAME = re.compile(r'^(?P<stem>.+)-(?P<width>\d+)\.(?P<ext>jpg|webp)$')
+
+# One generated file: width in px, extension, path relative to the image root
+Variant = namedtuple('Variant', ['width', 'ext', 'path', 'mimetype'])
+
+
+def _pillow():
+    """
+    Imports Pillow when variants are first built rather than at startup
+    (it is slow to import and only the build thread needs it).
+
+    Returns:
+        The PIL.Image module, or None if Pillow isn't installed
+    """
+    try:
+        from PIL import Image
+    except ImportError:  # Pillow is optional, originals are served without it
+        return None
+    return Image
+
+
+def build_variants(image_root='images', widths=VARIANT_WIDTHS, quality=82):
+    """
+    Generates resized JPEG and WebP versions of every image under image_root.
+    Up-to-date variants are skipped, so this is cheap to run on every startup.
+    Files are written to a temp name and renamed, so several workers can
+    build at the same time.
+
+    Args:
+        image_root: Directory with the original images
+        widths: Target widths in pixels
+        quality: Encoder quality for JPEG and WebP
+
+    Returns:
+        Number of variant files written (0 if Pillow isn't installed)
+    """
+    pil_image = _pillow()
+    if pil_image is None:
+        return 0
+
+    written = 0
+    variant_root = os.path.join(image_root, VARIANT_DIR)
+    sources_path = os.path.join(variant_root, SOURCES_FILE)
+    sources = _read_sources(sources_path)
+    seen = dict(sources)
+    for directory, subdirs, files in os.walk(image_root):
+        if os.path.abspath(directory).startswith(os.path.abspath(variant_root)):
+            continue
+        for name in files:
+            stem, extension = os.path.splitext(name)
+            if extension.lower() not in SOURCE_EXTENSIONS:
+                continue
+            source = os.path.join(directory, name)
+            target_dir = os.path.join(variant_root, os.path.relpath(directory, image_root))
+            key = os.path.relpath(source, image_root).replace(os.sep, '/')
+            count, sources[key] = _build_image_variants(pil_image, source, stem, target_dir,
+                                                        widths, quality, sources.get(key))
+            written += count
+    if sources != seen:
+        os.makedirs(variant_root, exist_ok=True)
+        tmp_path = f'{sources_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(sources, f)
+        os.replace(tmp_path, sources_path)
+    return written
+
+
+def _read_sources(path):
+    try:
+        with open(path) as f:
+            sources = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return sources if isinstance(sources, dict) else {}
+
+
+def _build_image_variants(pil_image, source, stem, target_dir, widths, quality, known):
+    # Returns (files written, [mtime, width] of the source)
+    source_mtime = os.path.getmtime(source)
+    if known and known[0] == source_mtime:
+        # Never upscale, the original is the largest size there is
+        widths = [width for width in widths if width < known[1]]
+    targets = [
+        (width, ext, os.path.join(target_dir, f'{stem}-{width}.{ext}'))
+        for width in widths for ext in FORMATS
+    ]
+    stale = [t for t in targets
+             if not os.path.exists(t[2]) or os.path.getmtime(t[2]) < source_mtime]
+    if not stale:
+        return 0, known
+
+    os.makedirs(target_dir, exist_ok=True)
+    written = 0
+    with pil_image.open(source) as original:
+        original = original.convert('RGB')
+        for width, ext, target in stale:
+            if width >= original.width:
+                continue
+            height = round(original.height * width / original.width)
+            resized = original.resize((width, height), pil_image.LANCZOS)
+            tmp_path = f'{target}.{os.getpid()}.tmp'
+            resized.save(tmp_path, FORMATS[ext][0], quality=quality, optimize=ext == 'jpg')
+            os.replace(tmp_path, target)
+            written += 1
+    return written, [source_mtime, original.width]
+
+
+class VariantIndex:
+    """
+    Maps each original image path to its generated variants, and picks the
+    best one for a requested width and the formats the client accepts.
+    """
+
+    def __init__(self, image_root='images'):
+        self.image_root = image_root
+        self._variants = {}
+
+    def reload(self):
+        """
+        Scans the variants directory for generated files.
+        """
+        variants = {}
+        variant_root = os.path.join(self.image_root, VARIANT_DIR)
+        for directory, subdirs, files in os.walk(variant_root):
+            relative_dir = os.path.relpath(directory, variant_root)
+            for name in files:
+                match = VARIANT_NAME.match(name)
+                if not match:
+                    continue
+                path = os.path.join(directory, name)
+                # Keyed by the original's path without extension
+                original = os.path.normpath(os.path.join(relative_dir, match['stem']))
+                variants.setdefault(original.replace(os.sep, '/'), []).append(Variant(
+                    int(match['width']), match['ext'],
+                    os.path.relpath(path, self.image_root).replace(os.sep, '/'),
+                    FORMATS[match['ext']][1]
+                ))
+        for entries in variants.values():
+            entries.sort()
+        self._variants = variants
+
+    def choose(self, path, width, accept_webp):
+        """
+        Picks the smallest variant at least as wide as requested (or the
+        widest one available), preferring WebP when the client accepts it.
+
+        Args:
+            path: Original image path relative to the image root
+            width: Requested width in pixels
+            accept_webp: Whether the client's Accept header allows WebP
+
+        Returns:
+            A Variant, or None if the original should be served
+        """
+        entries = self._variants.get(os.path.splitext(path)[0])
+        if not entries:
+            return None
+        ext = 'webp' if accept_webp else 'jpg'
+        candidates = [v for v in entries if v.ext == ext]
+        if not candidates:
+            return None
+        for variant in candidates:
+            if variant.width >= width:
+                return variant
+        return candidates[-1]
+
+    def build_in_background(self, widths=VARIANT_WIDTHS):
+        """
+        Indexes the existing variants, then builds missing ones and reloads
+        the index, all in a daemon thread. Originals are served until the
+        variants are ready.
+        """
+        def run():
+            self.reload()
+            if build_variants(self.image_root, widths):
+                self.reload()
+
+        threading.Thread(target=run, name='image-variants', daemon=True).start()
+
+
+if __name__ == '__main__':
+    # Build step: python image_variants.py [image root]
+    root = sys.argv[1] if len(sys.argv) > 1 else 'images'
+    if _pillow() is None:
+        sys.exit('Pillow is required to build image variants (pip install Pillow)')
+    print(f'{build_variants(root)} variant files written to {os.path.join(root, VARIANT_DIR)}')
@@ -0,0 +1,180 @@
+import bisect
+import threading
+
+#------------------------------------------------------------------------------
+
+#                        IN-PROCESS METRICS (PROMETHEUS)
+
+#------------------------------------------------------------------------------
+
+# Request latency buckets in seconds, from sub-millisecond cached replies to
+# slow disk writes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """
+    Monotonically increasing value, optionally split by label values.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        """
+        Args:
+            amount: Amount to add
+            labels: Label values, in the order of the label names
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name + _format_labels(self.labels, key), value) for key, value in values]
+
+
+class Gauge:
+    """
+    Value read from a callback when the metrics are scraped, so keeping it
+    up to date costs nothing on the request path.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, callback):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+
+    def samples(self):
+        return [(self.name, self.callback())]
+
+
+class FunctionCounter(Gauge):
+    """
+    Counter whose total is kept by other code and read from a callback when
+    the metrics are scraped.
+    """
+
+    kind = 'counter'
+
+
+class Histogram:
+    """
+    Distribution of observed values (e.g. request durations) in fixed
+    buckets, optionally split by label values.
+
+    Each observation is one bisect plus three additions under a lock; the
+    cumulative bucket counts Prometheus expects are only built on scrape.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        """
+        Args:
+            value: Observed value (seconds for durations)
+            labels: Label values, in the order of the label names
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count)
+                      for key, (counts, total, count) in self._series.items()]
+        samples = []
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                samples.append((self.name + '_bucket' + _format_labels(self.labels, key, le),
+                                cumulative))
+            samples.append((self.name + '_sum' + _format_labels(self.labels, key), total))
+            samples.append((self.name + '_count' + _format_labels(self.labels, key), count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Holds this process's metrics and renders them in the Prometheus text
+    exposition format. With several gunicorn workers each worker reports
+    its own values (scrape them per worker, or sum in the query).
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, callback):
+        return self._register(Gauge(name, help_text, callback))
+
+    def function_counter(self, name, help_text, callback):
+        return self._register(FunctionCounter(name, help_text, callback))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """
+        Returns:
+            Encoded text exposition of every metric
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample, value in metric.samples():
+                lines.append(f'{sample} {_format_value(value)}')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
@@ -0,0 +1,119 @@
+import hashlib
+import json
+
+#------------------------------------------------------------------------------
+
+#                        PRE-SERIALIZED JSON PAYLOADS
+
+#------------------------------------------------------------------------------
+
+def encode_json(obj):
+    """
+    Encodes an object the same way Flask's jsonify does in production
+    (compact separators, sorted keys, ASCII-escaped), but returns raw bytes
+    so the result can be cached and spliced into larger responses.
+
+    Args:
+        obj: JSON-serializable object
+
+    Returns:
+        UTF-8 encoded JSON bytes
+    """
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def make_etag(body):
+    """
+    Builds a strong ETag value from the bytes of a response body.
+
+    Args:
+        body: Encoded response body
+
+    Returns:
+        Quoted ETag string (e.g. '"3f2a9c..."')
+    """
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+# Keys of questions.json that describe the quiz flow (compiled into the
+# QuestionIndex transitions and scoring flags) rather than the question
+FLOW_KEYS = ('next', 'scoring')
+
+
+def client_question(question):
+    """
+    Args:
+        question: Question dict from questions.json
+
+    Returns:
+        The question as clients are sent it, without the flow keys
+    """
+    client = {key: value for key, value in question.items() if key not in FLOW_KEYS}
+    if 'options' in question:
+        client['options'] = [
+            {key: value for key, value in option.items() if key not in FLOW_KEYS}
+            for option in question['options']
+        ]
+    return client
+
+
+class QuestionPayloads:
+    """
+    Encoded JSON fragments for every static piece of the quiz flow.
+
+    Built once per version of questions.json so request handlers only
+    concatenate bytes instead of re-serializing the same dicts.
+
+    Attributes:
+        questions: Tuple (per position) of the encoded question dict
+        question_etags: Tuple (per position) of ETags for those fragments
+        answers: Tuple (per position) of tuples (per option index) of
+                 (body, etag) pairs for {"god_response", "next_question"},
+                 or None where choosing that option completes the quiz
+        unmatched: Tuple (per position) of (body, etag) used when the choice
+                   text matches no option (empty god response), or None
+    """
+
+    __slots__ = ('questions', 'question_etags', 'answers', 'unmatched')
+
+    def __init__(self, index):
+        questions = tuple(encode_json(client_question(question)) for question in index.questions)
+
+        answers = []
+        unmatched = []
+        for step, options in enumerate(index.option_lists):
+            transitions = index.transitions[step]
+            answers.append(tuple(
+                self._answer_payload(option.response, questions, transitions[option.index])
+                for option in options
+            ))
+            unmatched.append(self._answer_payload('', questions, transitions[-1]))
+
+        self.questions = questions
+        self.question_etags = tuple(make_etag(body) for body in questions)
+        self.answers = tuple(answers)
+        self.unmatched = tuple(unmatched)
+
+    @staticmethod
+    def _answer_payload(god_response, questions, next_step):
+        if next_step >= len(questions):
+            # Completion responses depend on the user's scores
+            return None
+        body = (b'{"god_response":' + encode_json(god_response)
+                + b',"next_question":' + questions[next_step] + b'}')
+        return body, make_etag(body)
+
+    def answer(self, step, option):
+        """
+        Returns the pre-encoded reply for answering the question at a step.
+
+        Args:
+            step: Position of the answered question
+            option: Selected Option, or None if the choice matched nothing
+
+        Returns:
+            (body, etag) pair, or None if this answer completes the quiz
+        """
+        if option is None:
+            return self.unmatched[step]
+        return self.answers[step][option.index]
@@ -0,0 +1,43 @@
+import threading
+
+#------------------------------------------------------------------------------
+
+#                          PERIODIC BACKGROUND TASKS
+
+#------------------------------------------------------------------------------
+
+
+class PeriodicThread(threading.Thread):
+    """
+    Daemon thread that calls a function every interval seconds until stopped.
+
+    A call that raises is logged with its traceback and the thread carries
+    on with the next one, so a full disk or a locked database never silently
+    ends checkpoints, flushes or sweeps.
+    """
+
+    def __init__(self, name, interval, function, logger, event):
+        """
+        Args:
+            name: Thread name
+            interval: Seconds between calls (the first call is after one interval)
+            function: Called without arguments
+            logger: Logger failures go to (one of the quiz.* loggers)
+            event: Event name logged when a call fails
+        """
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.function = function
+        self.logger = logger
+        self.event = event
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.function()
+            except Exception:
+                self.logger.exception(self.event)
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,619 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from payload_cache import QuestionPayloads
+from periodic import PeriodicThread
+from quiz_session import ANSWER_MAX, TRAIT_SLOTS
+
+#------------------------------------------------------------------------------
+
+#                           COMPILED QUESTION INDEX
+
+#------------------------------------------------------------------------------
+
+# The quiz flow is a graph described in questions.json and compiled into a
+# transition table when the file is loaded:
+#
+#   question "next":  id of the question that follows it (default: the next
+#                     question in the file), or END to finish the quiz
+#   option "next":    branch to another question (or END) when this option
+#                     is chosen; skip rules are branches past the skipped
+#                     questions
+#   question "scoring": false for questions that don't count towards the
+#                     trait scores (the intros); restarting the quiz goes
+#                     straight to the first scoring question
+#
+# Transitions may only lead forward in the file, so every path through the
+# quiz ends and the answers are always given in file order.
+END = 'end'
+
+# A single answer option, resolved once at startup
+Option = namedtuple('Option', ['index', 'text', 'trait', 'response'])
+
+# Reload events go to the structured server log (see quiz_logging.py)
+LOG = logging.getLogger('quiz.questions')
+
+
+class QuestionSetError(ValueError):
+    """Raised when a questions file can't be used to run the quiz."""
+
+
+class QuestionIndex:
+    """
+    Read-only lookup tables compiled from the raw QUESTIONS list.
+
+    Everything the answer handler needs is resolved here once, so that
+    handling a request is a handful of tuple/dict lookups instead of
+    scanning the question and option lists.
+
+    Attributes:
+        questions: Tuple of the original question dicts, in quiz order
+        positions: Mapping of question id -> position in the quiz
+        options: Tuple (per position) of mappings option text -> Option
+        option_lists: Tuple (per position) of Options in their original order
+        transitions: Tuple (per position) of the step that follows each
+                     option index, then (last entry) the step that follows
+                     a choice matching no option; a value equal to
+                     len(questions) means the quiz is complete
+        next_steps: Tuple (per position) of the default following step
+        scoring: Tuple (per position) of flags telling if answers are scored
+        restart_step: Step a restarted quiz begins at (first scoring question)
+        branching: Whether any option leads somewhere other than its
+                   question's default next step
+    """
+
+    __slots__ = ('questions', 'positions', 'options', 'option_lists', 'transitions',
+                 'next_steps', 'scoring', 'restart_step', 'branching')
+
+    def __init__(self, questions):
+        positions = {}
+        options = []
+        option_lists = []
+        for position, question in enumerate(questions):
+            positions.setdefault(question.get('id', f'unknown-{position}'), position)
+
+            entries = tuple(
+                Option(i, option['text'], option.get('trait'), option.get('response', ''))
+                for i, option in enumerate(question.get('options', []))
+            )
+            option_lists.append(entries)
+
+            # First option wins if two options share the same text
+            by_text = {}
+            for entry in entries:
+                by_text.setdefault(entry.text, entry)
+            options.append(MappingProxyType(by_text))
+
+        def resolve(position, target):
+            if target == END:
+                return len(questions)
+            if target not in positions:
+                raise QuestionSetError(f'Question {position} leads to unknown question {target!r}')
+            if positions[target] <= position:
+                raise QuestionSetError(f'Question {position} leads backwards to {target!r}')
+            return positions[target]
+
+        next_steps = []
+        transitions = []
+        for position, question in enumerate(questions):
+            default = position + 1
+            if question.get('next') is not None:
+                default = resolve(position, question['next'])
+            next_steps.append(default)
+            transitions.append(tuple(
+                default if option.get('next') is None else resolve(position, option['next'])
+                for option in question.get('options', [])
+            ) + (default,))
+
+        scoring = tuple(question.get('scoring', True) is not False for question in questions)
+
+        # Follow the default path from the start to the first scoring question
+        restart_step = 0
+        while restart_step < len(questions) and not scoring[restart_step]:
+            restart_step = next_steps[restart_step]
+        if restart_step >= len(questions):
+            restart_step = 0
+
+        object.__setattr__(self, 'questions', tuple(questions))
+        object.__setattr__(self, 'positions', MappingProxyType(positions))
+        object.__setattr__(self, 'options', tuple(options))
+        object.__setattr__(self, 'option_lists', tuple(option_lists))
+        object.__setattr__(self, 'transitions', tuple(transitions))
+        object.__setattr__(self, 'next_steps', tuple(next_steps))
+        object.__setattr__(self, 'scoring', scoring)
+        object.__setattr__(self, 'restart_step', restart_step)
+        object.__setattr__(self, 'branching', any(
+            len(set(steps)) > 1 for steps in transitions
+        ))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('QuestionIndex is read-only')
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __getstate__(self):
+        # Mapping proxies can't be pickled (binary snapshots), plain dicts can
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state['positions'] = dict(self.positions)
+        state['options'] = tuple(dict(options) for options in self.options)
+        return state
+
+    def __setstate__(self, state):
+        state['positions'] = MappingProxyType(state['positions'])
+        state['options'] = tuple(MappingProxyType(options) for options in state['options'])
+        for name in self.__slots__:
+            object.__setattr__(self, name, state[name])
+
+    def find_option(self, step, choice):
+        """
+        Looks up the option a user picked for the question at a given step.
+
+        Args:
+            step: Position of the question in the quiz
+            choice: Option text sent by the client
+
+        Returns:
+            The matching Option, or None if the text matches no option (or
+            the client sent something other than text)
+        """
+        if not isinstance(choice, str):
+            return None
+        return self.options[step].get(choice)
+
+    def accepts_answers(self, answers):
+        """
+        Checks packed answer codes from outside the server (a client's quiz
+        token) against the questions, so they can be used as option indices.
+
+        Args:
+            answers: Packed answer codes (0 = no matching option, n = option n - 1)
+
+        Returns:
+            True if there is at most one code per question and every code is
+            0 or names one of the question's options
+        """
+        if len(answers) > len(self.option_lists):
+            return False
+        return all(code <= len(options) for code, options in zip(answers, self.option_lists))
+
+    def trait_answers(self, answers):
+        """
+        Compact form of trait_breakdown(): positions and option indices
+        instead of question and option texts.
+
+        Args:
+            answers: List (per step) of chosen option indices, None if unmatched
+
+        Returns:
+            Dictionary of trait -> list of [step, option index] pairs
+        """
+        breakdown = {trait: [] for trait in 'EISNTFJP'}
+        for step, answer in enumerate(answers):
+            if answer is None or step >= len(self.questions) or not self.scoring[step]:
+                continue
+            trait = self.option_lists[step][answer].trait
+            if trait:
+                breakdown[trait].append([step, answer])
+        return breakdown
+
+    def trait_breakdown(self, answers):
+        """
+        Rebuilds the per-trait list of answered questions from option indices,
+        in the same shape process_answer stores for in-memory sessions.
+
+        Args:
+            answers: List (per step) of chosen option indices, None if unmatched
+
+        Returns:
+            Dictionary of trait -> list of {question_id, question_text, choice}
+        """
+        breakdown = {'E': [], 'I': [], 'S': [], 'N': [], 'T': [], 'F': [], 'J': [], 'P': []}
+        for step, answer in enumerate(answers):
+            if answer is None or step >= len(self.questions) or not self.scoring[step]:
+                continue
+            option = self.option_lists[step][answer]
+            if option.trait:
+                question = self.questions[step]
+                breakdown[option.trait].append({
+                    'question_id': question.get('id', f'unknown-{step}'),
+                    'question_text': question['text'][:30] + "...",  # Truncate long questions
+                    'choice': option.text
+                })
+        return breakdown
+
+
+def validate_questions(questions):
+    """
+    Checks that a parsed questions file has everything the handlers rely
+    on, so a bad edit is rejected before it replaces the live questions.
+    Flow targets are checked when the QuestionIndex is compiled.
+
+    Args:
+        questions: Parsed content of questions.json
+
+    Raises:
+        QuestionSetError: Describing the first problem found
+    """
+    if not isinstance(questions, list) or not questions:
+        raise QuestionSetError('Expected a non-empty list of questions')
+    # Packed sessions store the step in one byte
+    if len(questions) > 255:
+        raise QuestionSetError('Too many questions')
+
+    seen_ids = set()
+    for position, question in enumerate(questions):
+        if not isinstance(question, dict):
+            raise QuestionSetError(f'Question {position} is not an object')
+        question_id = question.get('id')
+        if not isinstance(question_id, str) or question_id in seen_ids or question_id == END:
+            raise QuestionSetError(f'Question {position} has a missing, duplicate or reserved id')
+        seen_ids.add(question_id)
+        if not isinstance(question.get('text'), str):
+            raise QuestionSetError(f'Question {question_id} has no text')
+        if not isinstance(question.get('next', ''), str):
+            raise QuestionSetError(f'Question {question_id} has a non-text next')
+        if not isinstance(question.get('scoring', True), bool):
+            raise QuestionSetError(f'Question {question_id} has a non-boolean scoring flag')
+
+        options = question.get('options')
+        # Packed sessions store each answer in one nibble
+        if not isinstance(options, list) or not 0 < len(options) <= ANSWER_MAX:
+            raise QuestionSetError(f'Question {question_id} needs 1 to {ANSWER_MAX} options')
+        for option in options:
+            if not isinstance(option, dict) or not isinstance(option.get('text'), str):
+                raise QuestionSetError(f'Question {question_id} has an option without text')
+            if option.get('trait') is not None and option['trait'] not in TRAIT_SLOTS:
+                raise QuestionSetError(f'Question {question_id} has an unknown trait {option["trait"]!r}')
+            if not isinstance(option.get('response', ''), str):
+                raise QuestionSetError(f'Question {question_id} has a non-text response')
+            if not isinstance(option.get('next', ''), str):
+                raise QuestionSetError(f'Question {question_id} has an option with a non-text next')
+
+
+def question_version(content):
+    """
+    Args:
+        content: Raw bytes of a questions file
+
+    Returns:
+        32-bit version number derived from the content, identical in every
+        worker process that loads the same file (never 0, which marks
+        sessions that aren't pinned to a version)
+    """
+    return int.from_bytes(hashlib.blake2b(content, digest_size=4).digest(), 'big') or 1
+
+
+class QuestionSet:
+    """
+    One loaded version of questions.json: the raw questions, their compiled
+    index and the pre-encoded JSON payloads built from them.
+    """
+
+    __slots__ = ('questions', 'index', 'payloads', 'stamp', 'version')
+
+    def __init__(self, questions, stamp=None, version=0, index=None, payloads=None):
+        self.questions = questions
+        self.index = index if index is not None else QuestionIndex(questions)
+        self.payloads = payloads if payloads is not None else QuestionPayloads(self.index)
+        self.stamp = stamp
+        self.version = version
+
+
+#------------------------------------------------------------------------------
+
+#                         BINARY QUESTION SNAPSHOTS
+
+#------------------------------------------------------------------------------
+
+# A snapshot is a compiled QuestionSet (questions, index and encoded
+# payloads) pickled next to questions.json by `python question_index.py`,
+# so workers skip parsing, validating and compiling the file at startup.
+# It is only used while its version matches the file's content hash; a
+# stale or unreadable snapshot is ignored and the file compiled as usual.
+# Like questions.json itself it is trusted input (a pickle, never load one
+# from elsewhere).
+SNAPSHOT_MAGIC = b'QSNP'
+
+# Bumped whenever QuestionIndex or QuestionPayloads change shape or content
+SNAPSHOT_FORMAT = 3
+
+# Hash of the attribute names of every class a snapshot pickles, written
+# after the format byte. A snapshot from code whose classes have different
+# slots is rejected even if SNAPSHOT_FORMAT wasn't bumped, instead of
+# unpickling into objects with missing or stale attributes.
+SNAPSHOT_LAYOUT = hashlib.sha1(repr((
+    QuestionIndex.__slots__, QuestionPayloads.__slots__, Option._fields
+)).encode()).digest()[:4]
+
+
+def write_snapshot(question_set, path):
+    """
+    Writes a QuestionSet snapshot atomically (temp file + rename).
+
+    Args:
+        question_set: QuestionSet loaded from the questions file
+        path: Snapshot file path
+
+    Returns:
+        Size of the snapshot in bytes
+    """
+    data = (SNAPSHOT_MAGIC + bytes((SNAPSHOT_FORMAT,)) + SNAPSHOT_LAYOUT
+            + question_set.version.to_bytes(4, 'big')
+            + pickle.dumps((question_set.questions, question_set.index, question_set.payloads),
+                           pickle.HIGHEST_PROTOCOL))
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def read_snapshot(path, version, stamp=None):
+    """
+    Loads a QuestionSet from a snapshot if it was built from the same content.
+
+    Args:
+        path: Snapshot file path
+        version: question_version() of the current file content
+        stamp: File stamp to give the loaded QuestionSet
+
+    Returns:
+        QuestionSet, or None if there is no usable snapshot
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    layout = SNAPSHOT_MAGIC + bytes((SNAPSHOT_FORMAT,)) + SNAPSHOT_LAYOUT
+    if not data.startswith(layout):
+        LOG.warning('questions_snapshot_incompatible', extra={'fields': {'path': path}})
+        return None
+    header = layout + version.to_bytes(4, 'big')
+    if not data.startswith(header):
+        LOG.info('questions_snapshot_stale', extra={'fields': {'path': path}})
+        return None
+    try:
+        questions, index, payloads = pickle.loads(data[len(header):])
+    except Exception as e:
+        LOG.warning('questions_snapshot_rejected', extra={'fields': {
+            'path': path, 'error': str(e)
+        }})
+        return None
+    return QuestionSet(questions, stamp, version, index, payloads)
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class QuestionRegistry:
+    """
+    Versioned registry of the QuestionSets loaded from a questions file.
+
+    A background watcher stats the file every check_interval seconds; a
+    changed file is parsed, validated and compiled on the watcher thread
+    and then swapped in with a single reference assignment, so request
+    handlers never wait on disk or compilation. A file that doesn't
+    validate is logged and ignored, and the last good version stays live.
+
+    Sessions remember the version they started with and keep being served
+    from it (see get()) after newer versions go live. Replaced versions are
+    kept for retain seconds, the longest a session can stay idle, and at
+    most max_versions of them.
+
+    prepare, if given, is called with every newly loaded QuestionSet on the
+    watcher thread before it goes live (e.g. to precompress its payloads).
+
+    Nothing is read until the questions are first needed, so creating the
+    registry costs nothing at import time. A snapshot_path, if given, is
+    tried before compiling the file (see write_snapshot()).
+    """
+
+    def __init__(self, path, check_interval=2.0, retain=86400, max_versions=32, prepare=None,
+                 snapshot_path=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.retain = retain
+        self.max_versions = max_versions
+        self.prepare = prepare
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._rejected_stamp = None
+        # Loaded on first use
+        self._current = None
+        self._versions = {}
+        # version -> time it was replaced, oldest first
+        self._retired = {}
+
+    def _load(self):
+        stamp = _file_stamp(self.path)
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        version = question_version(content)
+        if self.snapshot_path:
+            question_set = read_snapshot(self.snapshot_path, version, stamp)
+            if question_set is not None:
+                return question_set
+        questions = json.loads(content)
+        validate_questions(questions)
+        return QuestionSet(questions, stamp, version)
+
+    def _load_first(self):
+        """
+        Loads the first version. Errors are raised (there is nothing to fall
+        back to), and the next call tries again.
+
+        Returns:
+            The live QuestionSet
+        """
+        with self._lock:
+            if self._current is None:
+                question_set = self._load()
+                self._versions = {question_set.version: question_set}
+                self._current = question_set
+            return self._current
+
+    def current(self):
+        """
+        Returns:
+            The QuestionSet for the latest valid version of the file
+        """
+        current = self._current
+        if current is None:
+            current = self._load_first()
+        return current
+
+    def get(self, version):
+        """
+        Looks up the QuestionSet a session was started with.
+
+        Args:
+            version: QuestionSet.version stored in the session
+
+        Returns:
+            That QuestionSet, or None if it was never loaded by this
+            process or has been dropped
+        """
+        if self._current is None:
+            self._load_first()
+        return self._versions.get(version)
+
+    def versions(self):
+        """
+        Returns:
+            Dictionary version -> seconds since it was replaced (None for
+            the live version)
+        """
+        current = self.current()
+        now = time.monotonic()
+        versions = {version: now - retired for version, retired in self._retired.items()}
+        versions[current.version] = None
+        return versions
+
+    def reload(self):
+        """
+        Loads the file if it changed since the live version was loaded.
+        Called by the watcher, and by handlers that meet a session pinned to
+        a version this process hasn't seen yet (another worker loaded it
+        first).
+
+        Returns:
+            True if a new version went live
+        """
+        if self._current is None:
+            self._load_first()
+            return True
+        with self._lock:
+            try:
+                stamp = _file_stamp(self.path)
+                if stamp in (self._current.stamp, self._rejected_stamp):
+                    return False
+                question_set = self._load()
+            except OSError:
+                # Missing file (e.g. mid-deploy), keep serving the last good version
+                return False
+            except (ValueError, KeyError, TypeError) as e:
+                # Invalid or half-written file, rejected once until it changes again
+                self._rejected_stamp = stamp
+                LOG.warning('questions_rejected', extra={'fields': {
+                    'path': self.path, 'error': str(e)
+                }})
+                return False
+
+            previous = self._current
+            if question_set.version == previous.version:
+                # Touched but unchanged
+                previous.stamp = question_set.stamp
+                return False
+
+            # A version that comes back (e.g. a reverted edit) is reused so
+            # sessions pinned to it see the same objects
+            known = self._versions.get(question_set.version)
+            if known is not None:
+                known.stamp = question_set.stamp
+                question_set = known
+            elif self.prepare is not None:
+                self.prepare(question_set)
+            self._retired.pop(question_set.version, None)
+            self._retired[previous.version] = time.monotonic()
+            versions = dict(self._versions)
+            versions[question_set.version] = question_set
+            self._versions = versions
+            self._current = question_set
+            self._expire()
+            LOG.info('questions_reloaded', extra={'fields': {
+                'path': self.path, 'version': f'{question_set.version:08x}',
+                'previous_version': f'{previous.version:08x}',
+                'questions': len(question_set.questions)
+            }})
+            return True
+
+    def _expire(self):
+        """Drops replaced versions past retain seconds or beyond max_versions."""
+        cutoff = time.monotonic() - self.retain
+        # Retirement times only grow, so the expired versions come first
+        expired = sum(1 for retired in self._retired.values() if retired < cutoff)
+        expired = max(expired, len(self._retired) - self.max_versions)
+        expired = list(self._retired)[:expired]
+        if not expired:
+            return
+        versions = dict(self._versions)
+        for version in expired:
+            self._retired.pop(version, None)
+            versions.pop(version, None)
+        self._versions = versions
+
+    def start_watching(self):
+        """
+        Starts the daemon thread that checks the file for changes every
+        check_interval seconds.
+        """
+        if self._watcher is not None:
+            return
+
+        def check():
+            self.reload()
+            with self._lock:
+                self._expire()
+
+        self._watcher = PeriodicThread('question-watcher', self.check_interval, check, LOG,
+                                       'questions_watcher_failed')
+        self._watcher.start()
+
+
+if __name__ == '__main__':
+    # Build step: python question_index.py [questions file] [--snapshot PATH]
+    import argparse
+
+    # Pickled classes must be referenced as question_index.*, not __main__.*
+    from question_index import QuestionRegistry, read_snapshot, write_snapshot
+
+    parser = argparse.ArgumentParser(
+        description='Validate a questions file and write its binary snapshot.')
+    parser.add_argument('questions', nargs='?', default='questions.json')
+    parser.add_argument('--snapshot', help='snapshot path (default: questions.snapshot next to the file)')
+    args = parser.parse_args()
+
+    snapshot_path = args.snapshot or f'{os.path.splitext(args.questions)[0]}.snapshot'
+    started = time.perf_counter()
+    question_set = QuestionRegistry(args.questions).current()
+    compiled = time.perf_counter()
+    size = write_snapshot(question_set, snapshot_path)
+    written = time.perf_counter()
+    read_snapshot(snapshot_path, question_set.version)
+    loaded = time.perf_counter()
+    print(f'{len(question_set.questions)} questions (version {question_set.version:08x}) '
+          f'compiled in {(compiled - started) * 1000:.2f} ms')
+    print(f'{size} bytes written to {snapshot_path}, '
+          f'loaded back in {(loaded - written) * 1000:.2f} ms')
@@ -0,0 +1,1438 @@
+import uuid
+import json
+import hashlib
+import mimetypes
+import os
+import secrets
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+from werkzeug.security import safe_join
+
+from answer_log import AnswerLog, AnswerStats
+from api_http import ApiResponse, json_bytes_response, json_response, make_conditional
+from compression import CompressionCache, compress_response
+from cors import CorsPreflight
+from image_cache import ImageCache
+from image_variants import VariantIndex
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from payload_cache import client_question, encode_json
+from question_index import QuestionRegistry
+from quiz_logging import configure_logging, dropped_records
+from quiz_session import QuizSession
+from rating_store import RatingStore
+from rollups import DEFAULT_WINDOWS, RESOLUTIONS, TimeRollups, parse_window
+from result_templates import ResultTemplate, ResultTemplates, mystery_result
+from session_store import SessionSweeper, create_session_store
+from session_token import QuizTokenCodec, TokenError
+
+#------------------------------------------------------------------------------
+
+#                             QUIZ API CONFIGURATION
+
+#------------------------------------------------------------------------------
+
+# The quiz API itself: state, helpers and route handlers. Handlers take an
+# ApiRequest and return an ApiResponse, and are served both by the Flask app
+# (app.py, WSGI/gunicorn) and by the asyncio server (asgi.py).
+
+# Signs stateless quiz tokens and Flask's session cookie. Set QUIZ_SECRET_KEY
+# to the same value on every worker; without it each process makes up its own
+# key, so tokens only work on the worker that issued them and don't survive a
+# restart (start() logs a warning)
+SECRET_KEY = os.environ.get('QUIZ_SECRET_KEY') or secrets.token_hex(32)
+SECRET_KEY_CONFIGURED = bool(os.environ.get('QUIZ_SECRET_KEY'))
+
+# When enabled, every quiz uses signed tokens instead of server-side sessions
+# (clients can also opt in per quiz by sending {"stateless": true} to start_quiz)
+STATELESS_SESSIONS = os.environ.get('QUIZ_STATELESS_SESSIONS') == '1'
+
+# Origins allowed to call the API from a browser (frontend and backend
+# live on different hosts)
+CORS_ORIGINS = ["https://isekaiquiz.com", "https://www.isekaiquiz.com"]
+CORS_METHODS = ["GET", "POST", "OPTIONS"]
+CORS_HEADERS = ["Content-Type", "Authorization"]
+
+# Seconds browsers may cache a preflight answer
+CORS_MAX_AGE = int(os.environ.get('QUIZ_CORS_MAX_AGE', 86400))
+
+# Preflight answers for the settings above, sent by both servers before routing
+PREFLIGHT = CorsPreflight(CORS_ORIGINS, CORS_METHODS, CORS_HEADERS, CORS_MAX_AGE)
+
+#------------------------------------------------------------------------------
+
+#                         DATA LOADING AND INITIALIZATION
+
+#------------------------------------------------------------------------------
+
+# gzip/brotli copies of static response bodies (by ETag), compressed once.
+# Responses are compressed in handle_request when the client accepts it.
+COMPRESSION_CACHE = CompressionCache()
+
+def precompress_questions(question_set):
+    """Compresses the pre-encoded answer replies of a question set ahead of use."""
+    for replies in question_set.payloads.answers + (question_set.payloads.unmatched,):
+        for reply in replies:
+            if reply is not None:
+                COMPRESSION_CACHE.precompress(reply[1], reply[0])
+
+# Load quiz questions from the JSON file and compile them into lookup tables
+# (question positions, option text -> trait/response, next-step table) plus
+# pre-encoded JSON payloads, on first use. A compiled snapshot made with
+# `python question_index.py` is loaded instead while it matches the file.
+# A watcher thread reloads the file when it changes; quizzes in progress
+# finish on the version they started with, which is kept as long as a
+# session can stay idle (QUIZ_SESSION_TTL).
+QUESTION_REGISTRY = QuestionRegistry(
+    'questions.json',
+    check_interval=float(os.environ.get('QUIZ_QUESTIONS_CHECK_INTERVAL', 2.0)),
+    retain=int(os.environ.get('QUIZ_SESSION_TTL', 86400)),
+    prepare=precompress_questions,
+    snapshot_path=os.environ.get('QUIZ_QUESTIONS_SNAPSHOT', 'questions.snapshot')
+)
+
+# Define personality types and their corresponding creature results
+RESULTS = {
+    'INTJ': {
+        'type': 'Mastermind', 
+        'creature': 'Lich', 
+        'description': 'Brilliant strategist with immense arcane knowledge. Immortal, calculating, and always three steps ahead.',
+        'image_path': '/images/creatures/lich.jpg'
+    },
+    'INTP': {
+        'type': 'Thinker', 
+        'creature': 'Wizard', 
+        'description': 'Curious, theoretical, and obsessed with understanding the underlying magic of the universe.',
+        'image_path': '/images/creatures/wizard.jpg'
+    },
+    'ENTJ': {
+        'type': 'Commander', 
+        'creature': 'Dragon', 
+        'description': 'Powerful, ambitious, and commanding respect from all who meet you. You collect both treasures and followers.',
+        'image_path': '/images/creatures/dragon.jpg'
+    },
+    'ENTP': {
+        'type': 'Debater', 
+        'creature': 'Chest Mimic', 
+        'description': 'Clever, witty, and full of surprises. You challenge assumptions and enjoy turning situations upside down.',
+        'image_path': '/images/creatures/chest-mimic.jpg'
+    },
+    'INFJ': {
+        'type': 'Advocate', 
+        'creature': 'Phoenix', 
+        'description': 'Rare and insightful, you rise from adversity and inspire others with your vision and resilience.',
+        'image_path': '/images/creatures/phoenix.jpg'
+    },
+    'INFP': {
+        'type': 'Mediator', 
+        'creature': 'Unicorn', 
+        'description': 'Pure of heart, idealistic, and magical. You bring healing and inspiration wherever you go.',
+        'image_path': '/images/creatures/unicorn.jpg'
+    },
+    'ENFJ': {
+        'type': 'Protagonist', 
+        'creature': 'Hero', 
+        'description': 'Born leader with charisma and a natural desire to champion others in their quests and dreams.',
+        'image_path': '/images/creatures/hero.jpg'
+    },
+    'ENFP': {
+        'type': 'Campaigner', 
+        'creature': 'Chimera', 
+        'description': 'Creative, enthusiastic, and multi-talented. Your diverse nature means you\'re never predictable.',
+        'image_path': '/images/creatures/chimera.jpg'
+    },
+    'ISTJ': {
+        'type': 'Logistician', 
+        'creature': 'Cerberus', 
+        'description': 'Loyal, reliable guardian with keen attention to detail and unwavering commitment to duty.',
+        'image_path': '/images/creatures/cerberus.jpg'
+    },
+    'ISFJ': {
+        'type': 'Defender', 
+        'creature': 'Treant', 
+        'description': 'Nurturing protector with deep roots and a strong sense of tradition and caring.',
+        'image_path': '/images/creatures/treant.jpg'
+    },
+    'ESTJ': {
+        'type': 'Executive', 
+        'creature': 'Minotaur', 
+        'description': 'Strong, decisive, and practical leader who establishes order through clear rules and structures.',
+        'image_path': '/images/creatures/minotaur.jpg'
+    },
+    'ESFJ': {
+        'type': 'Consul', 
+        'creature': 'Griffon', 
+        'description': 'Noble, vigilant protector who brings people together and maintains social harmony.',
+        'image_path': '/images/creatures/griffon.jpg'
+    },
+    'ISTP': {
+        'type': 'Virtuoso', 
+        'creature': 'Anaconda', 
+        'description': 'Adaptable, observant, and masterful at striking at just the right moment with precision.',
+        'image_path': '/images/creatures/anaconda.jpg'
+    },
+    'ISFP': {
+        'type': 'Adventurer', 
+        'creature': 'Elf', 
+        'description': 'Artistic, sensitive, and in tune with the natural world. You live life with quiet passion.',
+        'image_path': '/images/creatures/elf.jpg'
+    },
+    'ESTP': {
+        'type': 'Entrepreneur', 
+        'creature': 'Werewolf', 
+        'description': 'Bold, adaptable, and thriving on excitement. You transform to meet any challenge head-on.',
+        'image_path': '/images/creatures/werewolf.jpg'
+    },
+    'ESFP': {
+        'type': 'Entertainer', 
+        'creature': 'Slime', 
+        'description': 'Flexible, joyful, and surprisingly resilient. You bounce back from anything and bring smiles wherever you go.',
+        'image_path': '/images/creatures/slime.jpg'
+    }
+}
+
+# Public root URL used in result image links (e.g. https://api.isekaiquiz.com/).
+# When unset, links use the URL the request came in on.
+PUBLIC_BASE_URL = os.environ.get('QUIZ_PUBLIC_BASE_URL')
+
+# RESULTS compiled into ready-to-send payloads for one base URL when first
+# needed: PUBLIC_BASE_URL, or without one the URL of the first request that
+# needs a result. The Host header is client controlled, so results for any
+# other URL are built one type at a time and not kept (see result_template())
+RESULT_TEMPLATES = None
+RESULT_TEMPLATES_LOCK = threading.Lock()
+
+def precompress_results(templates):
+    """Compresses the shareable result summaries (/api/result/<type>) ahead of use."""
+    for template in templates.types.values():
+        COMPRESSION_CACHE.precompress(template.etag, template.summary_body)
+
+def precompress_static():
+    """
+    Compresses the payloads loaded at startup (question versions loaded
+    later are precompressed by the watcher before they go live). Brotli at
+    its best level takes a while, so this runs as part of the warm-up.
+    """
+    precompress_questions(QUESTION_REGISTRY.current())
+    if RESULT_TEMPLATES is not None:
+        precompress_results(RESULT_TEMPLATES)
+
+# Resized creature image variants (indexed and built in the background if
+# Pillow is installed; `python image_variants.py` builds them ahead of time)
+IMAGE_VARIANTS = VariantIndex('images')
+
+# Image files kept in memory, reloaded when they change on disk. Files are
+# loaded when first requested, or all at once by the warm-up
+IMAGE_CACHE = ImageCache('images')
+
+# Browser cache lifetime for image variants (revalidated with content-hash ETags)
+IMAGE_MAX_AGE = 86400
+
+# Store for active quiz sessions. Defaults to an in-process dict; set
+# QUIZ_SESSION_STORE=sqlite:/path/to/sessions.db to share sessions between
+# gunicorn workers. Sessions expire after QUIZ_SESSION_TTL seconds without
+# activity and at most QUIZ_MAX_SESSIONS are kept (least recently used go first)
+quiz_sessions = create_session_store(
+    os.environ.get('QUIZ_SESSION_STORE', 'memory'),
+    idle_ttl=int(os.environ.get('QUIZ_SESSION_TTL', 86400)),
+    max_sessions=int(os.environ.get('QUIZ_MAX_SESSIONS', 100000))
+)
+
+# Encoded /api/quiz_manifest payload for the current question set
+MANIFEST_CACHE = {}
+
+# Signs the compact quiz state for stateless sessions
+TOKEN_CODEC = QuizTokenCodec(SECRET_KEY)
+
+# Times a handler re-reads a session that another request changed first
+# before giving up with a 409
+SESSION_UPDATE_ATTEMPTS = 8
+
+# Static start of the "session replaced" response, keys in jsonify's sorted order
+SESSION_REPLACED_PREFIX = (
+    b'{"message":' + encode_json('Your session was reset due to inactivity. Starting a new quiz.')
+    + b',"question":'
+)
+
+#------------------------------------------------------------------------------
+
+#                           METRICS AND LOGGING
+
+#------------------------------------------------------------------------------
+
+# Structured JSON log lines, written to stdout by a background thread. Only
+# QUIZ_LOG_SAMPLE_RATE (0-1) of the per-quiz assessment events are kept
+LOG = configure_logging(float(os.environ.get('QUIZ_LOG_SAMPLE_RATE', 1.0)))
+
+# Served in Prometheus text format by /api/metrics (per worker process)
+METRICS = MetricsRegistry()
+REQUEST_SECONDS = METRICS.histogram(
+    'quiz_request_duration_seconds', 'Time spent in API route handlers',
+    ('route', 'method', 'status')
+)
+RATING_WRITE_SECONDS = METRICS.histogram(
+    'quiz_rating_write_duration_seconds', 'Time spent appending a vote to the rating log'
+)
+IMAGE_BYTES_SERVED = METRICS.counter(
+    'quiz_image_bytes_served_total', 'Image bytes sent to clients', ('kind',)
+)
+QUIZZES_COMPLETED = METRICS.counter(
+    'quiz_completed_total', 'Finished quizzes by personality type', ('personality_type',)
+)
+METRICS.gauge('quiz_sessions', 'Quiz sessions held by the session store',
+              lambda: len(quiz_sessions))
+METRICS.gauge('quiz_image_cache_bytes', 'Image bytes held in memory',
+              lambda: IMAGE_CACHE.stats()['bytes'])
+METRICS.gauge('quiz_question_versions', 'Versions of questions.json held for quizzes in progress',
+              lambda: len(QUESTION_REGISTRY.versions()))
+METRICS.function_counter('quiz_log_records_dropped_total',
+                         'Log records dropped because the log queue was full', dropped_records)
+
+#------------------------------------------------------------------------------
+
+#                              HELPER FUNCTIONS
+
+#------------------------------------------------------------------------------
+
+# Rating aggregate shared by all workers: votes are appended to ratings.log and
+# checkpointed back into ratings.json every RATINGS_CHECKPOINT_INTERVAL seconds
+# (the log is opened on first use; a missing or broken ratings.json is
+# rewritten by the first checkpoint)
+RATING_STORE = RatingStore('ratings.json', 'ratings.log')
+
+# Quiz events (started, answered, completed) for analytics. Buffered in memory
+# and appended to answers.log by a background thread, so handlers do no disk
+# I/O; rotated past ANSWER_LOG_MAX_BYTES. The aggregate read by the admin
+# dashboard is checkpointed to answer_stats.json
+ANSWER_LOG = AnswerLog(
+    'answers.log',
+    max_bytes=int(os.environ.get('ANSWER_LOG_MAX_BYTES', 64 * 1024 * 1024)),
+    backups=int(os.environ.get('ANSWER_LOG_BACKUPS', 5))
+)
+ANSWER_STATS = AnswerStats('answers.log', 'answer_stats.json', ANSWER_LOG.backups)
+
+# Completions and ratings per minute, hour and day for the admin dashboard's
+# activity charts. Counted in memory; every ROLLUP_CHECKPOINT_INTERVAL seconds
+# each worker merges its counts into rollups.json and reads back everyone's
+ROLLUPS = TimeRollups('rollups.json')
+
+def session_question_set(quiz_state):
+    """
+    Returns the questions a session is answering: the version of
+    questions.json it was started with, even if the file changed since.
+    
+    Args:
+        quiz_state: QuizSession being continued
+        
+    Returns:
+        The session's QuestionSet, or None if the session can't be
+        continued (its version is gone and it is past the end of the
+        current questions)
+    """
+    question_set = QUESTION_REGISTRY.get(quiz_state.version)
+    if question_set is None and quiz_state.version:
+        # Possibly started on a worker that picked up a new file first
+        QUESTION_REGISTRY.reload()
+        question_set = QUESTION_REGISTRY.get(quiz_state.version)
+    if question_set is None:
+        # Unpinned or expired version: carry on with the current questions
+        question_set = QUESTION_REGISTRY.current()
+        if quiz_state.step >= len(question_set.index):
+            return None
+        quiz_state.version = question_set.version
+    return question_set
+
+def advance_quiz(question_index, quiz_state, choice):
+    """
+    Records the user's choice for the current question, updates the trait
+    scores and moves the session to the next step.
+    
+    Args:
+        question_index: Compiled QuestionIndex for the session's questions
+        quiz_state: QuizSession being answered
+        choice: Text of the chosen option
+        
+    Returns:
+        The selected Option, or None if the choice matched no option
+    """
+    current_step = quiz_state.step
+    
+    # Look up the chosen option once (constant time, no scanning of the options)
+    selected_option = question_index.find_option(current_step, choice)
+    
+    # Store the option index and update scores for personality traits
+    # (only for scoring questions, the intros don't count)
+    quiz_state.record_answer(current_step, selected_option, question_index.scoring[current_step])
+    
+    # Move to the next step from the compiled flow graph (the last entry is
+    # for choices that match no option)
+    quiz_state.step = question_index.transitions[current_step][
+        selected_option.index if selected_option else -1
+    ]
+    return selected_option
+
+def apply_choices(question_index, quiz_state, choices, indices_only=False):
+    """
+    Answers several questions in a row, as if each choice was sent to
+    /api/answer in turn.
+    
+    Args:
+        question_index: Compiled QuestionIndex for the session's questions
+        quiz_state: QuizSession to advance
+        choices: List of option texts or option indices
+        indices_only: Reject option texts (used for submitted answer vectors)
+        
+    Returns:
+        List with the god's response to each choice
+        
+    Raises:
+        ValueError: If there are more choices than questions left, or a
+                    choice is not a valid option index
+    """
+    god_responses = []
+    for choice in choices:
+        step = quiz_state.step
+        if step >= len(question_index):
+            raise ValueError('More choices than remaining questions')
+        
+        # Option indices are resolved to their text, then handled like /api/answer
+        if isinstance(choice, int) and not isinstance(choice, bool):
+            options = question_index.option_lists[step]
+            if not 0 <= choice < len(options):
+                raise ValueError(f'Invalid option index {choice} for step {step}')
+            choice = options[choice].text
+        elif indices_only:
+            raise ValueError(f'Answer for step {step} must be an option index')
+        
+        selected_option = advance_quiz(question_index, quiz_state, choice)
+        god_responses.append(selected_option.response if selected_option else "")
+    return god_responses
+
+def log_answers(session_label, question_index, quiz_state, start_step):
+    """
+    Records the answers given from start_step up to the session's current
+    step in the answer event log (buffered, no disk I/O).
+    
+    Args:
+        session_label: Session ID, or a label for sessions without one
+        question_index: Compiled QuestionIndex for the session's questions
+        quiz_state: QuizSession after the answers were applied
+        start_step: Step the session was on before the answers
+    """
+    step = start_step
+    while step != quiz_state.step and step < len(question_index):
+        code = quiz_state.answers[step]
+        ANSWER_LOG.record_answer(session_label, step, code)
+        # Answer code 0 (no matching option) maps to the last transition
+        step = question_index.transitions[step][code - 1]
+
+def quiz_manifest_payload(question_set):
+    """
+    Encodes the full quiz (questions, navigation and results table) for
+    clients that run the quiz locally. Cached until questions.json changes.
+    
+    Args:
+        question_set: Current QuestionSet
+        
+    Returns:
+        (body, etag) pair
+    """
+    cached = MANIFEST_CACHE.get('manifest')
+    if cached is None or cached[0] is not question_set:
+        content = {
+            'questions': [client_question(question) for question in question_set.questions],
+            # Index of the question that follows each one (len(questions) = done),
+            # and per option index where that choice leads (branches and skips)
+            'next_steps': question_set.index.next_steps,
+            'transitions': [steps[:-1] for steps in question_set.index.transitions],
+            'first_question_step': question_set.index.restart_step,
+            'results': RESULTS
+        }
+        version = hashlib.sha1(encode_json(content)).hexdigest()[:16]
+        body = encode_json(dict(content, version=version))
+        cached = (question_set, body, f'"{version}"')
+        MANIFEST_CACHE['manifest'] = cached
+    return cached[1], cached[2]
+
+def calculate_personality_type(scores):
+    """
+    Calculates personality type based on scores for each trait dimension.
+    
+    Args:
+        scores: Dictionary containing scores for E, I, S, N, T, F, J, P
+        
+    Returns:
+        String containing 4-letter personality type (e.g., "INTJ")
+    """
+    personality_traits = []
+    
+    # E vs I (Extraversion vs Introversion)
+    e_score = scores['E']
+    i_score = scores['I']
+    if e_score > i_score:
+        personality_traits.append('E')  # Extraverted
+    else:
+        personality_traits.append('I')  # Introverted
+    
+    # S vs N (Sensing vs Intuition)
+    s_score = scores['S']
+    n_score = scores['N']
+    if s_score > n_score:
+        personality_traits.append('S')  # Sensing
+    else:
+        personality_traits.append('N')  # Intuitive
+    
+    # T vs F (Thinking vs Feeling)
+    t_score = scores['T']
+    f_score = scores['F']
+    if t_score > f_score:
+        personality_traits.append('T')  # Thinking
+    else:
+        personality_traits.append('F')  # Feeling
+    
+    # J vs P (Judging vs Perceiving)
+    j_score = scores['J']
+    p_score = scores['P']
+    if j_score > p_score:
+        personality_traits.append('J')  # Judging
+    else:
+        personality_traits.append('P')  # Perceiving
+    
+    # Return the 4-letter personality type
+    return ''.join(personality_traits)
+
+def result_template(req, personality_type):
+    """
+    Returns the compiled result payload for a personality type, for the
+    configured public base URL or the URL the request came in on.
+    
+    Args:
+        req: ApiRequest being handled
+        personality_type: 4-letter type, e.g. "INTJ"
+        
+    Returns:
+        ResultTemplate (a "Mystery Being" one for a type missing from RESULTS)
+    """
+    global RESULT_TEMPLATES
+    base_url = PUBLIC_BASE_URL or req.url_root
+    templates = RESULT_TEMPLATES
+    if templates is None:
+        with RESULT_TEMPLATES_LOCK:
+            if RESULT_TEMPLATES is None:
+                RESULT_TEMPLATES = ResultTemplates(RESULTS, base_url)
+                threading.Thread(target=precompress_results, args=(RESULT_TEMPLATES,),
+                                 daemon=True).start()
+            templates = RESULT_TEMPLATES
+    if templates.base_url == base_url:
+        return templates.get(personality_type)
+    # Another host: only the type being asked for
+    result = RESULTS.get(personality_type) or mystery_result(personality_type)
+    return ResultTemplate(personality_type, result, base_url)
+
+def build_quiz_result(req, session_label, quiz_state, question_index, record=True):
+    """
+    Calculates the personality type for a finished quiz and fills the
+    user's scores into the precompiled result for that type.
+    
+    Args:
+        req: ApiRequest that finished the quiz (for the image URLs)
+        session_label: Identifies the session in the server and answer logs
+        quiz_state: Finished QuizSession
+        question_index: Compiled QuestionIndex for the session's questions
+        record: Count and log the completion (False when repeating a
+                result that was already returned)
+        
+    Returns:
+        Encoded JSON result with the personality type, creature, image URLs,
+        trait comparisons and breakdown; with ?compact=1 only the type,
+        scores and [step, option index] pairs
+    """
+    
+    scores = quiz_state.score_dict()
+    
+    # Use the helper function to calculate personality type
+    personality_type = calculate_personality_type(scores)
+    
+    # Precompiled result, or a Mystery Being one if the type is not in RESULTS
+    template = result_template(req, personality_type)
+    
+    # Log the assessment as one structured (and optionally sampled) event
+    if record:
+        QUIZZES_COMPLETED.inc(labels=(personality_type,))
+        LOG.info('personality_assessment', extra={'sampled': True, 'fields': {
+            'session_id': session_label,
+            'personality_type': personality_type,
+            'type_name': template.summary['type_name'],
+            'creature': template.summary['creature'],
+            'scores': scores
+        }})
+        ANSWER_LOG.record_complete(session_label, personality_type, quiz_state.answers)
+        ROLLUPS.record_completion()
+    
+    # The per-trait breakdown is only materialized here, from the option indices
+    if req.args.get('compact') == '1':
+        return template.encode_compact(scores, question_index.trait_answers(quiz_state.answer_indices()))
+    return template.encode(scores, question_index.trait_breakdown(quiz_state.answer_indices()))
+
+def complete_quiz(req, session_label, god_response, quiz_state, question_index, record=True,
+                  **extra):
+    """
+    Builds the final result response once the last question is answered.
+    
+    Args:
+        req: ApiRequest that finished the quiz
+        session_label: Identifies the session in the server and answer logs
+        god_response: The god's reply to the last choice
+        quiz_state: Finished QuizSession
+        question_index: Compiled QuestionIndex for the session's questions
+        record: Count and log the completion (see build_quiz_result)
+        **extra: Additional top-level fields for the response (e.g. token),
+                 named so they sort after "result"
+        
+    Returns:
+        JSON response with quiz_complete and the result details
+    """
+    body = (b'{"god_response":' + encode_json(god_response)
+            + b',"quiz_complete":true,"result":'
+            + build_quiz_result(req, session_label, quiz_state, question_index, record))
+    for key in sorted(extra):
+        body += b',' + encode_json(key) + b':' + encode_json(extra[key])
+    return json_bytes_response(body + b'}')
+
+#------------------------------------------------------------------------------
+
+#                                ROUTE HANDLERS
+
+#------------------------------------------------------------------------------
+
+def serve_image(req, filename):
+    """
+    Takes image files directly from the images directory.
+    Allows frontend to access creature images.
+    
+    With a ?w=<width> parameter a resized variant is served instead (WebP if
+    the browser accepts it), falling back to the original if none exists.
+    
+    Args:
+        req: ApiRequest being handled
+        filename: Path to the image file
+        
+    Returns:
+        The requested image file
+    """
+    max_age = None
+    width = req.args.get('w', type=int)
+    if width:
+        accept_webp = 'image/webp' in req.headers.get('Accept', '')
+        variant = IMAGE_VARIANTS.choose(filename, width, accept_webp)
+        if variant is not None:
+            filename = variant.path
+            max_age = IMAGE_MAX_AGE
+    
+    # Served from memory with precomputed ETag/Last-Modified; handles
+    # If-None-Match/If-Modified-Since (304) and Range requests (206)
+    image = IMAGE_CACHE.get(filename)
+    if image is None:
+        return read_image_file(filename, max_age)
+    
+    headers = {
+        'ETag': f'"{image.etag}"',
+        'Last-Modified': image.last_modified
+    }
+    if max_age:
+        headers['Cache-Control'] = f'public, max-age={max_age}'
+        headers['Vary'] = 'Accept'
+    else:
+        headers['Cache-Control'] = 'no-cache'
+    response = make_conditional(
+        req, ApiResponse(image.data, headers=headers, mimetype=image.mimetype), accept_ranges=True
+    )
+    IMAGE_BYTES_SERVED.inc(len(response.body), ('variant' if max_age else 'original',))
+    return response
+
+def read_image_file(filename, max_age=None):
+    """
+    Reads an image the cache doesn't hold (e.g. too big) straight from disk.
+    
+    Args:
+        filename: Path relative to the images directory
+        max_age: Browser cache lifetime in seconds, or None to revalidate
+        
+    Returns:
+        ApiResponse with the file, or a 404 response
+    """
+    full_path = safe_join('images', filename)
+    if full_path is None or not os.path.isfile(full_path):
+        return json_response({'error': 'Not found'}, 404)
+    with open(full_path, 'rb') as f:
+        data = f.read()
+    cache_control = f'public, max-age={max_age}' if max_age else 'no-cache'
+    IMAGE_BYTES_SERVED.inc(len(data), ('uncached',))
+    return ApiResponse(data, headers={'Cache-Control': cache_control},
+                       mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+
+def start_quiz(req):
+    """
+    Initializes a new quiz session and returns the first question.
+    
+    Creates a new session with a unique ID.
+    
+    Returns:
+        JSON with session_id and first question
+    """
+    # Stateless mode: hand the whole quiz state to the client as a signed token
+    data = req.get_json() or {}
+    question_set = QUESTION_REGISTRY.current()
+    question_json = question_set.payloads.questions[0]
+    if data.get('stateless') or STATELESS_SESSIONS:
+        token = TOKEN_CODEC.encode(QuizSession(version=question_set.version))
+        ANSWER_LOG.record_start('stateless')
+        return json_bytes_response(
+            b'{"question":' + question_json + b',"token":"' + token.encode() + b'"}'
+        )
+    
+    # Generate a unique session ID
+    session_id = str(uuid.uuid4())
+    
+    # Initialize quiz state with default values, pinned to the current questions
+    quiz_sessions.save(session_id, QuizSession(version=question_set.version))
+    ANSWER_LOG.record_start(session_id)
+    
+    # Return the session ID and first question (spliced from the cached encoding)
+    return json_bytes_response(
+        b'{"question":' + question_json + b',"session_id":"' + session_id.encode() + b'"}'
+    )
+
+def process_answer(req):
+    """
+    Processes the user's answer to a question and returns the next question or final result.
+    
+    1. Stores the user's response
+    2. Updates personality trait scores based on the user's response
+    3. Returns the god's reply to the choice
+    4. Returns either the next question or the final quiz result
+    
+    If the session is invalid, it creates a new session and starts the quiz over.
+    
+    Clients can send the step (position) or question_id of the question
+    they are answering. A repeated answer for a question the session has
+    already moved past (a retry or double-click) then gets the original
+    reply again instead of answering the next question.
+    
+    Returns:
+        JSON with god_response and either next_question or quiz_complete with result
+    """
+    data = req.get_json() or {}
+    session_id = data.get('session_id')
+    choice = data.get('choice')
+    
+    # Stateless sessions carry their state in a signed token
+    if 'token' in data:
+        return process_token_answer(req, data['token'], choice)
+    
+    # Concurrent requests for the same session are resolved by re-reading
+    # the session whenever another request moved it first
+    for _ in range(SESSION_UPDATE_ATTEMPTS):
+        # Validate the session - if invalid, create a new one
+        stored_state = quiz_sessions.get(session_id) if session_id else None
+        quiz_state = stored_state.copy() if stored_state is not None else None
+        question_set = session_question_set(quiz_state) if quiz_state is not None else None
+        if question_set is None:
+            return replace_session()
+        question_index = question_set.index
+        
+        answer_step = requested_step(data, question_index)
+        if answer_step is not None and answer_step != quiz_state.step:
+            return repeated_answer(req, session_id, question_set, quiz_state, answer_step, choice)
+        if quiz_state.step >= len(question_index):
+            # Finished quizzes can only be restarted
+            return replace_session()
+        
+        current_step = quiz_state.step
+        selected_option = advance_quiz(question_index, quiz_state, choice)
+        if quiz_sessions.compare_and_set(session_id, stored_state.revision, quiz_state):
+            break
+    else:
+        return json_response({'error': 'Session is busy, please retry'}, 409)
+    
+    log_answers(session_id, question_index, quiz_state, current_step)
+    
+    # Check if we have more questions
+    if quiz_state.step < len(question_index):
+        # Return god's response and next question from the pre-encoded payloads
+        body, etag = question_set.payloads.answer(current_step, selected_option)
+        return json_bytes_response(body, etag)
+    else:
+        # Quiz complete, calculate final personality type and result
+        god_response = selected_option.response if selected_option else ""
+        return complete_quiz(req, session_id, god_response, quiz_state, question_index)
+
+def replace_session():
+    """
+    Starts a new session for a request whose session is invalid, expired or
+    finished, and returns the first question with the new session ID.
+    
+    Returns:
+        JSON with message, question, session_id and session_replaced
+    """
+    # Create a new session instead of returning an error
+    new_session_id = str(uuid.uuid4())
+    
+    # Initialize quiz state with default values
+    question_set = QUESTION_REGISTRY.current()
+    quiz_sessions.save(new_session_id, QuizSession(version=question_set.version))
+    ANSWER_LOG.record_start(new_session_id)
+    
+    # Return the first question with the new session ID
+    question_json = question_set.payloads.questions[0]
+    return json_bytes_response(
+        SESSION_REPLACED_PREFIX + question_json
+        + b',"session_id":"' + new_session_id.encode() + b'","session_replaced":true}'
+    )
+
+def requested_step(data, question_index):
+    """
+    Returns:
+        The step an answer is meant for, from the request's step or
+        question_id field, or None if the request doesn't say
+    """
+    step = data.get('step')
+    if isinstance(step, int) and not isinstance(step, bool):
+        return step
+    question_id = data.get('question_id')
+    if isinstance(question_id, str):
+        return question_index.positions.get(question_id)
+    return None
+
+def repeated_answer(req, session_id, question_set, quiz_state, step, choice):
+    """
+    Answers a request for a step other than the session's current one. A
+    repeat of the answer already recorded for that step gets the same
+    reply as the first time, with nothing changed or logged again.
+    
+    Args:
+        req: ApiRequest being handled
+        session_id: Session ID
+        question_set: QuestionSet the session is pinned to
+        quiz_state: Copy of the stored QuizSession
+        step: Step the client says it is answering
+        choice: Text of the chosen option
+        
+    Returns:
+        The original reply, or 409 with the session's current step if the
+        step wasn't answered yet or was answered with another choice
+    """
+    question_index = question_set.index
+    if 0 <= step < min(quiz_state.step, len(quiz_state.answers)):
+        selected_option = question_index.find_option(step, choice)
+        code = selected_option.index + 1 if selected_option else 0
+        if quiz_state.answers[step] == code:
+            if question_index.transitions[step][code - 1] < len(question_index):
+                body, etag = question_set.payloads.answer(step, selected_option)
+                return json_bytes_response(body, etag)
+            god_response = selected_option.response if selected_option else ""
+            return complete_quiz(req, session_id, god_response, quiz_state, question_index,
+                                 record=False)
+    return json_response({'error': 'Question was already answered or not reached yet',
+                          'step': quiz_state.step}, 409)
+
+def process_token_answer(req, token, choice):
+    """
+    Stateless version of process_answer: the quiz state comes from the signed
+    token and an updated token is returned with the reply, so the server keeps
+    nothing between requests.
+    
+    Args:
+        req: ApiRequest being handled
+        token: Signed token issued by start_quiz, restart or a previous answer
+        choice: Text of the chosen option
+        
+    Returns:
+        JSON with god_response, token and either next_question or the result
+    """
+    try:
+        quiz_state = TOKEN_CODEC.decode(token)
+        question_set = session_question_set(quiz_state)
+        if question_set is None or quiz_state.step >= len(question_set.index):
+            raise TokenError('Quiz already complete')
+        if not question_set.index.accepts_answers(quiz_state.answers):
+            raise TokenError('Answer out of range')
+    except TokenError:
+        # Invalid or finished token, start the quiz over like an expired session
+        question_set = QUESTION_REGISTRY.current()
+        new_token = TOKEN_CODEC.encode(QuizSession(version=question_set.version))
+        ANSWER_LOG.record_start('stateless')
+        return json_bytes_response(
+            SESSION_REPLACED_PREFIX + question_set.payloads.questions[0]
+            + b',"session_replaced":true,"token":"' + new_token.encode() + b'"}'
+        )
+    
+    question_index = question_set.index
+    current_step = quiz_state.step
+    selected_option = advance_quiz(question_index, quiz_state, choice)
+    new_token = TOKEN_CODEC.encode(quiz_state)
+    log_answers('stateless', question_index, quiz_state, current_step)
+    
+    if quiz_state.step < len(question_index):
+        # Splice the token into the pre-encoded reply (keys stay in sorted order)
+        body, _ = question_set.payloads.answer(current_step, selected_option)
+        return json_bytes_response(body[:-1] + b',"token":"' + new_token.encode() + b'"}')
+    
+    god_response = selected_option.response if selected_option else ""
+    return complete_quiz(req, 'stateless', god_response, quiz_state, question_index,
+                         token=new_token)
+
+def process_answer_batch(req):
+    """
+    Processes several answers in one request, for clients that already have
+    the questions and don't need a round trip per question.
+    
+    Request JSON:
+        choices: List of chosen options, each either the option text or its
+                 index in the question's options list
+        session_id: Optional session to continue; without it a new quiz is
+                    started at start_step (default 0, use the manifest's
+                    first_question_step to skip the intros)
+    
+    Returns:
+        JSON with god_responses (one per choice) and either quiz_complete with
+        the result, or next_question and the session_id to continue with.
+        A session that is already finished is replaced, as in /api/answer.
+    """
+    data = req.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get('choices'), list):
+        return json_response({'error': 'Request must be JSON with a list of choices'}, 400)
+    if not data['choices']:
+        return json_response({'error': 'No choices given'}, 400)
+    
+    # Continue an existing session on its own questions, or start a new one.
+    # Work on a copy so a rejected batch leaves the stored session untouched.
+    session_id = data.get('session_id')
+    stored_state = quiz_sessions.get(session_id) if session_id else None
+    if stored_state is not None:
+        quiz_state = stored_state.copy()
+        question_set = session_question_set(quiz_state)
+        if question_set is None:
+            stored_state = None
+    if stored_state is None:
+        question_set = QUESTION_REGISTRY.current()
+        start_step = data.get('start_step', 0)
+        if (not isinstance(start_step, int) or isinstance(start_step, bool)
+                or not 0 <= start_step < len(question_set.index)):
+            return json_response({'error': 'Invalid start_step'}, 400)
+        session_id = str(uuid.uuid4())
+        quiz_state = QuizSession(step=start_step, version=question_set.version)
+    question_index = question_set.index
+    first_step = quiz_state.step
+    if first_step >= len(question_index):
+        # Finished quizzes can only be restarted (and are never completed twice)
+        return replace_session()
+    
+    try:
+        god_responses = apply_choices(question_index, quiz_state, data['choices'])
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    
+    if stored_state is None:
+        quiz_sessions.save(session_id, quiz_state)
+        ANSWER_LOG.record_start(session_id)
+    elif not quiz_sessions.compare_and_set(session_id, stored_state.revision, quiz_state):
+        # Another request answered in the meantime; the batch was meant for
+        # the questions the client saw, so it has to resync
+        return json_response({'error': 'Session changed while answering, please retry'}, 409)
+    log_answers(session_id, question_index, quiz_state, first_step)
+    
+    if quiz_state.step < len(question_index):
+        return json_response({
+            'god_responses': god_responses,
+            'next_question': client_question(question_set.questions[quiz_state.step]),
+            'session_id': session_id
+        })
+    
+    result = build_quiz_result(req, session_id, quiz_state, question_index)
+    return json_bytes_response(
+        b'{"god_responses":' + encode_json(god_responses)
+        + b',"quiz_complete":true,"result":' + result + b'}'
+    )
+
+def quiz_manifest(req):
+    """
+    Returns the whole quiz in one cacheable response: every question, the
+    next-step table, the personality results table and a version hash.
+    Clients can run the quiz locally and submit the answers to /api/result.
+    
+    Returns:
+        JSON manifest, or 304 if the client's copy (ETag) is current
+    """
+    body, etag = quiz_manifest_payload(QUESTION_REGISTRY.current())
+    response = json_bytes_response(body, etag)
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return make_conditional(req, response)
+
+def compute_result(req):
+    """
+    Validates a complete answer vector from a client that ran the quiz
+    locally (client-side scoring mode) and computes the result on the server.
+    
+    Request JSON:
+        answers: Option index chosen for each question, in the order they
+                 were shown (following transitions from the manifest)
+        start_step: Where the answers start (default 0, or the manifest's
+                    first_question_step to skip the intros)
+        version: Optional manifest version the answers were given against
+    
+    Returns:
+        JSON with quiz_complete and the result, or an error if the vector
+        doesn't match the current questions
+    """
+    data = req.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get('answers'), list):
+        return json_response({'error': 'Request must be JSON with a list of answers'}, 400)
+    
+    question_set = QUESTION_REGISTRY.current()
+    question_index = question_set.index
+    
+    # Answers given against an older version of the questions can't be trusted
+    version = data.get('version')
+    if version is not None:
+        _, etag = quiz_manifest_payload(question_set)
+        if etag != f'"{version}"':
+            return json_response({'error': 'Quiz version changed, please reload the quiz'}, 409)
+    
+    start_step = data.get('start_step', 0)
+    if (not isinstance(start_step, int) or isinstance(start_step, bool)
+            or not 0 <= start_step < len(question_index)):
+        return json_response({'error': 'Invalid start_step'}, 400)
+    
+    quiz_state = QuizSession(step=start_step, version=question_set.version)
+    try:
+        apply_choices(question_index, quiz_state, data['answers'], indices_only=True)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    if quiz_state.step < len(question_index):
+        return json_response({'error': 'Not every question was answered'}, 400)
+    
+    ANSWER_LOG.record_start('client-scored')
+    log_answers('client-scored', question_index, quiz_state, start_step)
+    result = build_quiz_result(req, 'client-scored', quiz_state, question_index)
+    return json_bytes_response(b'{"quiz_complete":true,"result":' + result + b'}')
+
+def shared_result(req, personality_type):
+    """
+    Shareable result page data for a personality type (creature, description
+    and image URLs, no per-user scores), served from the precompiled results.
+    
+    Args:
+        req: ApiRequest being handled
+        personality_type: 4-letter type, e.g. "INTJ" (case-insensitive)
+        
+    Returns:
+        JSON result summary, 304 if the client's copy is current, or 404
+        for an unknown type
+    """
+    personality_type = personality_type.upper()
+    if personality_type not in RESULTS:
+        return json_response({'error': 'Unknown personality type'}, 404)
+    template = result_template(req, personality_type)
+    response = json_bytes_response(template.summary_body, template.etag)
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return make_conditional(req, response)
+
+def restart_quiz(req):
+    """
+    Restarts the quiz, either with the existing session ID or by creating a new one.
+    This allows users to retake the quiz without losing their progress.
+    
+    If the provided session ID is invalid, a new session is created instead of returning an error.
+    
+    Returns:
+        JSON with the first scoring question (q1, after the intros) and potentially a new session_id
+    """
+    data = req.get_json() or {}
+    question_set = QUESTION_REGISTRY.current()
+    restart_step = question_set.index.restart_step
+    
+    # Stateless sessions just get a fresh token positioned on q1
+    if 'token' in data:
+        question_json = question_set.payloads.questions[restart_step]
+        token = TOKEN_CODEC.encode(QuizSession(step=restart_step, version=question_set.version))
+        ANSWER_LOG.record_start('stateless')
+        return json_bytes_response(
+            b'{"question":' + question_json + b',"token":"' + token.encode() + b'"}'
+        )
+    
+    session_id = data.get('session_id')
+    create_new_session = False
+    
+    # Check if we need to create a new session
+    if session_id not in quiz_sessions:
+        # Instead of returning an error, create a new session
+        session_id = str(uuid.uuid4())
+        create_new_session = True
+    
+    # Reset or initialize quiz state but skip the non-scoring intros
+    quiz_sessions.save(session_id, QuizSession(step=restart_step, version=question_set.version))
+    ANSWER_LOG.record_start(session_id)
+    
+    payloads = question_set.payloads
+    question_json = payloads.questions[restart_step]
+    
+    # If we created a new session, include the session_id in the response
+    if create_new_session:
+        return json_bytes_response(
+            b'{"question":' + question_json + b',"session_id":"' + session_id.encode() + b'"}'
+        )
+    else:
+        # Otherwise, just return the question, which is fully static
+        return json_bytes_response(b'{"question":' + question_json + b'}',
+                                   payloads.question_etags[restart_step])
+
+def submit_rating(req):
+    """
+    Records only aggregate rating statistics
+    
+    Returns:
+        JSON with success message and updated statistics
+    """
+    try:
+        # Check if request has JSON data
+        if not req.is_json:
+            return json_response({'error': 'Request must be JSON'}, 400)
+            
+        data = req.get_json() or {}
+        rating = data.get('rating')
+            
+        if not rating:
+            return json_response({'error': 'Missing rating'}, 400)
+            
+        if not isinstance(rating, int) or rating < 1 or rating > 5:
+            return json_response({'error': 'Rating must be an integer from 1-5'}, 400)
+        
+        # Append the vote to the shared log and get the updated aggregate
+        # (individual ratings are not stored, only the rating value)
+        started = time.perf_counter()
+        try:
+            current_stats = RATING_STORE.add(rating)
+        except OSError:
+            return json_response({'error': 'Failed to save rating statistics'}, 500)
+        RATING_WRITE_SECONDS.observe(time.perf_counter() - started)
+        ROLLUPS.record_rating(rating)
+        
+        return json_response({
+            "success": True,
+            "message": "Rating recorded anonymously",
+            "stats": current_stats
+        })
+        
+    except Exception as e:
+        error_msg = f"Error processing rating: {str(e)}"
+        return json_response({'error': error_msg}, 500)
+
+def get_ratings(req):
+    """
+    Retrieves the current rating statistics.
+    Used by the admin dashboard to display user feedback data.
+    
+    Returns:
+        JSON with rating statistics (average, count, distribution)
+    """
+    # Aggregate is kept in memory and pre-encoded, and only re-encoded when a
+    # vote arrives from any worker. Unchanged stats are answered with a 304.
+    body, etag = RATING_STORE.stats_payload()
+    response = json_bytes_response(body, etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return make_conditional(req, response)
+
+def debug_ratings_file(req):
+    """
+    Debug endpoint to check ratings file path and permissions.
+    This helps troubleshoot issues with the ratings storage.
+    
+    Returns:
+        JSON with detailed information about the ratings file and filesystem
+    """
+    try:
+        # Get current working directory
+        cwd = os.getcwd()
+        
+        # Check if ratings.json exists
+        ratings_path = os.path.join(cwd, 'ratings.json')
+        file_exists = os.path.isfile(ratings_path)
+        
+        # Check permissions if file exists
+        if file_exists:
+            readable = os.access(ratings_path, os.R_OK)
+            writable = os.access(ratings_path, os.W_OK)
+            
+            # Try to read the file
+            file_contents = None
+            try:
+                with open(ratings_path, 'r') as f:
+                    file_contents = json.load(f)
+            except Exception as e:
+                file_contents = f"Error reading file: {str(e)}"
+                
+            dir_writable = True
+            file_created = True
+        else:
+            readable = False
+            writable = False
+            file_contents = None
+            
+            # Check if directory is writable
+            dir_writable = os.access(cwd, os.W_OK)
+            
+            # Try to create the file
+            try:
+                with open(ratings_path, 'w') as f:
+                    json.dump({"ratings": [], "stats": {"avg": 0, "count": 0}}, f)
+                file_created = os.path.isfile(ratings_path)
+            except Exception as e:
+                file_created = False
+        
+        # Return debug info
+        return json_response({
+            'cwd': cwd,
+            'ratings_path': ratings_path,
+            'file_exists': file_exists,
+            'readable': readable,
+            'writable': writable,
+            'dir_writable': dir_writable if not file_exists else True,
+            'file_created': file_created if not file_exists else True,
+            'file_contents': file_contents
+        })
+        
+    except Exception as e:
+        return json_response({
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }, 500)
+
+def debug_sessions(req):
+    """
+    Debug endpoint reporting the session store size and eviction counters.
+    Used to size workers (memory per worker vs. concurrent sessions).
+    
+    Returns:
+        JSON with size, max_sessions, idle_ttl, evicted_expired and evicted_lru
+    """
+    return json_response(quiz_sessions.stats())
+
+def answer_stats(req):
+    """
+    Quiz analytics for the admin dashboard, aggregated from the answer event
+    log of every worker: quizzes started and completed, result type counts,
+    and per question the number of answers (completion funnel) and the
+    option distribution.
+    
+    Returns:
+        JSON with starts, completions, completion_rate, types and questions
+    """
+    question_ids = [question.get('id') for question in QUESTION_REGISTRY.current().questions]
+    response = json_response(ANSWER_STATS.snapshot(question_ids))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def analytics(req):
+    """
+    Quiz completions and ratings over time for the admin dashboard, read
+    from the in-memory rollups (no log scan, no disk read).
+    
+    Query parameters:
+        resolution: 'minute', 'hour' or 'day' (default 'hour')
+        window: How far back to go, e.g. '90m', '24h', '30d' or seconds
+                (default 1 hour, 24 hours or 30 days by resolution; at most
+                what the resolution keeps)
+    
+    Returns:
+        JSON with the bucket series (see TimeRollups.series), or a 400 error
+    """
+    resolution = req.args.get('resolution', 'hour')
+    if resolution not in RESOLUTIONS:
+        return json_response({'error': f'resolution must be one of {", ".join(RESOLUTIONS)}'}, 400)
+    
+    window = req.args.get('window')
+    if window is None:
+        window = DEFAULT_WINDOWS[resolution]
+    else:
+        try:
+            window = parse_window(window)
+        except ValueError as e:
+            return json_response({'error': str(e)}, 400)
+    
+    response = json_response(ROLLUPS.series(resolution, window))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def metrics(req):
+    """
+    Prometheus scrape endpoint: request latency histograms per route, rating
+    write latency, image bytes served, completed quizzes, dropped log records
+    and store sizes for this worker process.
+    
+    Returns:
+        Metrics in the Prometheus text exposition format
+    """
+    return ApiResponse(METRICS.render(), mimetype=METRICS_CONTENT_TYPE)
+
+#------------------------------------------------------------------------------
+
+#                              SESSION CLEANUP
+
+#------------------------------------------------------------------------------
+
+# Sweep expired sessions in the background every QUIZ_SESSION_SWEEP_INTERVAL seconds
+# (started by start())
+session_sweeper = SessionSweeper(quiz_sessions, int(os.environ.get('QUIZ_SESSION_SWEEP_INTERVAL', 60)))
+
+#------------------------------------------------------------------------------
+
+#                                 ROUTE TABLE
+
+#------------------------------------------------------------------------------
+
+# One API route: URL rule (Flask syntax), methods, handler, and whether the
+# handler can do blocking I/O (the asyncio server runs those in a worker thread
+# so file and database access never stalls the event loop). That includes
+# state loaded on first use or reloaded when it changes on disk: questions
+# (QUESTION_REGISTRY, also reloaded for sessions pinned to a newer version),
+# images (IMAGE_CACHE stats and reads files) and rollups, including the
+# metrics gauges that report on them
+Route = namedtuple('Route', ['rule', 'methods', 'handler', 'blocking'])
+
+ROUTES = (
+    Route('/images/<path:filename>', ('GET',), serve_image, True),
+    Route('/api/start_quiz', ('POST',), start_quiz, True),
+    Route('/api/answer', ('POST',), process_answer, True),
+    Route('/api/answers/batch', ('POST',), process_answer_batch, True),
+    Route('/api/quiz_manifest', ('GET',), quiz_manifest, True),
+    Route('/api/result', ('POST',), compute_result, True),
+    Route('/api/result/<personality_type>', ('GET',), shared_result, True),
+    Route('/api/restart', ('POST',), restart_quiz, True),
+    Route('/api/submit_rating', ('POST',), submit_rating, True),
+    Route('/api/ratings', ('GET',), get_ratings, True),
+    Route('/api/answer_stats', ('GET',), answer_stats, True),
+    Route('/api/analytics', ('GET',), analytics, True),
+    Route('/api/debug/ratings', ('GET',), debug_ratings_file, True),
+    Route('/api/debug/sessions', ('GET',), debug_sessions, True),
+    Route('/api/metrics', ('GET',), metrics, True),
+)
+
+def handle_request(route, req, params):
+    """
+    Runs a route's handler, compresses the response if the client accepts
+    it, and records the duration in the request histogram.
+    
+    Args:
+        route: Route being served
+        req: ApiRequest
+        params: URL parameters matched from the route's rule
+        
+    Returns:
+        The handler's ApiResponse
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = compress_response(req, route.handler(req, **params), COMPRESSION_CACHE)
+        status = response.status
+        return response
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                (route.rule, req.method, str(status)))
+
+#------------------------------------------------------------------------------
+
+#                             APPLICATION STARTUP
+
+#------------------------------------------------------------------------------
+
+# Importing this module only sets things up: the questions, the rating and
+# answer aggregates, the result payloads and the images are loaded when
+# first needed. How a server warms them up (QUIZ_WARM_UP):
+#   background  load them in a thread while requests are already accepted
+#   eager       load them before start() returns (a broken questions.json
+#               stops the worker from booting)
+#   lazy        only when a request needs them
+WARM_UP = os.environ.get('QUIZ_WARM_UP', 'background')
+WARM_UP_MODES = ('background', 'eager', 'lazy')
+
+STARTED = threading.Event()
+STARTUP_LOCK = threading.Lock()
+
+def warm_up():
+    """
+    Loads everything that is otherwise loaded on first use (the payload
+    precompression is left to precompress_static()).
+    
+    Returns:
+        Dictionary of step -> seconds it took
+    """
+    def public_result_templates():
+        global RESULT_TEMPLATES
+        with RESULT_TEMPLATES_LOCK:
+            if PUBLIC_BASE_URL and RESULT_TEMPLATES is None:
+                RESULT_TEMPLATES = ResultTemplates(RESULTS, PUBLIC_BASE_URL)
+    
+    steps = (
+        ('questions', QUESTION_REGISTRY.current),
+        ('ratings', RATING_STORE.stats),
+        ('answer_stats', ANSWER_STATS.snapshot),
+        ('rollups', ROLLUPS.load),
+        ('result_templates', public_result_templates),
+        ('images', IMAGE_CACHE.load_all),
+    )
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        step()
+        timings[name] = round(time.perf_counter() - started, 4)
+    LOG.info('warm_up_complete', extra={'fields': timings})
+    return timings
+
+def start(warm_up_mode=WARM_UP):
+    """
+    Starts the background threads (question watcher, answer log flushing,
+    rating, answer stats and rollup checkpoints, session sweeper, image variant
+    build) and warms up the data loaded on first use. Called by the app
+    factories in app.py and asgi.py; only the first call in a process does
+    anything.
+    
+    Args:
+        warm_up_mode: 'background', 'eager' or 'lazy' (see WARM_UP)
+    """
+    if warm_up_mode not in WARM_UP_MODES:
+        raise ValueError(f'Unknown warm-up mode {warm_up_mode!r}, expected one of {WARM_UP_MODES}')
+    with STARTUP_LOCK:
+        if STARTED.is_set():
+            return
+        STARTED.set()
+    
+    if not SECRET_KEY_CONFIGURED:
+        LOG.warning('secret_key_not_configured', extra={'fields': {
+            'message': 'QUIZ_SECRET_KEY is not set, using a random key for this process: '
+                       'stateless quiz tokens are only accepted by the worker that issued them'
+        }})
+    
+    if warm_up_mode == 'eager':
+        warm_up()
+        threading.Thread(target=precompress_static, name='precompress', daemon=True).start()
+    elif warm_up_mode == 'background':
+        def run():
+            try:
+                warm_up()
+                precompress_static()
+            except Exception:
+                # Whatever failed is loaded again when a request needs it
+                LOG.exception('warm_up_failed')
+        threading.Thread(target=run, name='warm-up', daemon=True).start()
+    
+    QUESTION_REGISTRY.start_watching()
+    ANSWER_LOG.start_flushing()
+    RATING_STORE.start_checkpointing(int(os.environ.get('RATINGS_CHECKPOINT_INTERVAL', 30)))
+    ANSWER_STATS.start_checkpointing(int(os.environ.get('ANSWER_STATS_CHECKPOINT_INTERVAL', 60)))
+    ROLLUPS.start_checkpointing(int(os.environ.get('ROLLUP_CHECKPOINT_INTERVAL', 30)))
+    session_sweeper.start()
+    IMAGE_VARIANTS.build_in_background()
@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+#------------------------------------------------------------------------------
+
+#                      STRUCTURED, BUFFERED SERVER LOGGING
+
+#------------------------------------------------------------------------------
+
+LOGGER_NAME = 'quiz'
+
+# Records waiting to be written; beyond this they are dropped (and counted,
+# see dropped_records()) rather than making request threads wait for a slow stdout
+QUEUE_CAPACITY = 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line: time, level, event name
+    (the log message) plus the record's `fields` dictionary.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records logged with sampled=True (high
+    volume events such as completed quizzes); other records always pass.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or not getattr(record, 'sampled', False):
+            return True
+        return random.random() < self.rate
+
+
+class BufferedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a background writer thread through a bounded queue.
+    Formatting and writing happen on that thread, so logging costs a
+    request thread only a queue put; when the queue is full the record
+    is dropped instead of blocking.
+    """
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatted by the listener's handler, not on the request thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def dropped_records():
+    """
+    Returns:
+        Number of records the 'quiz' logger dropped because its queue was full
+    """
+    return sum(getattr(handler, 'dropped', 0)
+               for handler in logging.getLogger(LOGGER_NAME).handlers)
+
+
+def configure_logging(sample_rate=1.0, stream=None):
+    """
+    Sets up the 'quiz' logger: JSON lines written to stdout (or the given
+    stream) by a background thread, with sampling of high volume events.
+    Safe to call more than once; later calls return the same logger.
+
+    Args:
+        sample_rate: Fraction (0-1) of sampled events to keep
+        stream: Output stream, defaults to sys.stdout
+
+    Returns:
+        The configured logging.Logger
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if logger.handlers:
+        return logger
+
+    records = queue.Queue(QUEUE_CAPACITY)
+    handler = BufferedQueueHandler(records)
+    handler.addFilter(SampleFilter(sample_rate))
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(records, output)
+    listener.start()
+    # Write out whatever is still queued when the process exits
+    atexit.register(listener.stop)
+
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,169 @@
+import time
+from array import array
+
+#------------------------------------------------------------------------------
+
+#                          COMPACT QUIZ SESSION STATE
+
+#------------------------------------------------------------------------------
+
+# Order of the trait scores in QuizSession.scores and in packed sessions
+TRAITS = 'EISNTFJP'
+TRAIT_SLOTS = {trait: i for i, trait in enumerate(TRAITS)}
+
+# Version 2 added the question set version; version 1 sessions and tokens
+# still unpack (unpinned, version 0)
+PACK_VERSION = 2
+QUESTION_VERSION_BYTES = 4
+
+# Packed scores take 6 bits per trait (max 63 answers per trait)
+SCORE_BITS = 6
+SCORE_MAX = (1 << SCORE_BITS) - 1
+SCORE_BYTES = len(TRAITS) * SCORE_BITS // 8
+
+# Packed answers take one nibble each (0 = no matching option, n = option n - 1)
+ANSWER_MAX = 15
+
+
+class PackError(ValueError):
+    """Raised when packed session bytes are malformed or out of range."""
+
+
+class QuizSession:
+    """
+    State of one quiz in progress, kept as small as possible since hundreds
+    of thousands of these can be alive at once.
+
+    The per-trait breakdown of answered questions is not stored; it is
+    rebuilt from the answer indices with QuestionIndex.trait_breakdown()
+    when the final result is built.
+
+    Attributes:
+        step: Index of the question the user is on
+        scores: array('H') with one counter per trait, in TRAITS order
+        answers: bytearray with one byte per step: 0 if the step wasn't
+                 answered with a known option, otherwise option index + 1
+        last_active: Unix timestamp of the last request for this session
+        version: QuestionSet.version the quiz was started with (0 if
+                 unknown), so it finishes on the same questions after
+                 questions.json is edited
+        revision: Store revision the session was read at, set by the
+                  session store on every write and not packed (see
+                  SessionStore.compare_and_set())
+    """
+
+    __slots__ = ('step', 'scores', 'answers', 'last_active', 'version', 'revision')
+
+    def __init__(self, step=0, version=0):
+        self.step = step
+        self.version = version
+        self.scores = array('H', bytes(2 * len(TRAITS)))
+        self.answers = bytearray()
+        self.last_active = time.time()
+        self.revision = 0
+
+    def record_answer(self, step, option, scoring):
+        """
+        Stores the option chosen for a step and updates the trait scores.
+
+        Args:
+            step: Index of the answered question
+            option: Option from the QuestionIndex, or None if nothing matched
+            scoring: Whether the question counts towards the trait scores
+        """
+        answers = self.answers
+        if len(answers) <= step:
+            answers.extend(bytes(step + 1 - len(answers)))
+        answers[step] = 0 if option is None else option.index + 1
+        if scoring and option is not None and option.trait:
+            self.scores[TRAIT_SLOTS[option.trait]] += 1
+
+    def copy(self):
+        """
+        Returns:
+            Independent copy of the session, to change without touching a
+            session another request may be reading
+        """
+        session = QuizSession(self.step, self.version)
+        session.scores = array('H', self.scores)
+        session.answers = bytearray(self.answers)
+        session.last_active = self.last_active
+        session.revision = self.revision
+        return session
+
+    def score_dict(self):
+        """
+        Returns:
+            Dictionary of trait letter -> score
+        """
+        return dict(zip(TRAITS, self.scores))
+
+    def answer_indices(self):
+        """
+        Returns:
+            List (per step) of chosen option indices, None where unanswered
+        """
+        return [value - 1 if value else None for value in self.answers]
+
+    def to_bytes(self):
+        """
+        Packs the session: format version (1 byte), step (1 byte), question
+        set version (4 bytes), 8 trait scores (6 bits each), number of
+        answers (1 byte), then one nibble per answer.
+
+        Returns:
+            Packed bytes
+        """
+        if not 0 <= self.step <= 255 or len(self.answers) > 255:
+            raise PackError('Quiz too long to pack')
+
+        packed_scores = 0
+        for score in self.scores:
+            if score > SCORE_MAX:
+                raise PackError('Score out of range')
+            packed_scores = (packed_scores << SCORE_BITS) | score
+
+        nibbles = bytearray((len(self.answers) + 1) // 2)
+        for i, value in enumerate(self.answers):
+            if value > ANSWER_MAX:
+                raise PackError('Option index out of range')
+            nibbles[i // 2] |= value << (4 if i % 2 == 0 else 0)
+
+        return (bytes((PACK_VERSION, self.step))
+                + self.version.to_bytes(QUESTION_VERSION_BYTES, 'big')
+                + packed_scores.to_bytes(SCORE_BYTES, 'big')
+                + bytes((len(self.answers),))
+                + bytes(nibbles))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Reverses to_bytes().
+
+        Args:
+            data: Packed bytes
+
+        Returns:
+            New QuizSession
+        """
+        if not data or data[0] not in (1, PACK_VERSION):
+            raise PackError('Unsupported session format')
+        version_bytes = QUESTION_VERSION_BYTES if data[0] == PACK_VERSION else 0
+        header = 2 + version_bytes + SCORE_BYTES
+        if len(data) <= header:
+            raise PackError('Unsupported session format')
+
+        session = cls(data[1], int.from_bytes(data[2:2 + version_bytes], 'big'))
+        packed_scores = int.from_bytes(data[2 + version_bytes:header], 'big')
+        for i in range(len(TRAITS)):
+            shift = (len(TRAITS) - 1 - i) * SCORE_BITS
+            session.scores[i] = (packed_scores >> shift) & SCORE_MAX
+
+        count = data[header]
+        nibbles = data[header + 1:]
+        if len(nibbles) != (count + 1) // 2:
+            raise PackError('Truncated session')
+        session.answers = bytearray(
+            (nibbles[i // 2] >> (4 if i % 2 == 0 else 0)) & 0x0F for i in range(count)
+        )
+        return session
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, single worker only
+    fcntl = None
+
+from payload_cache import encode_json, make_etag
+from periodic import PeriodicThread
+
+#------------------------------------------------------------------------------
+
+#                          APPEND-ONLY RATING STORE
+
+#------------------------------------------------------------------------------
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+# Checkpoint errors go to the structured server log (see quiz_logging.py)
+LOG = logging.getLogger('quiz.ratings')
+
+
+class RatingStore:
+    """
+    Aggregates quiz ratings from every worker process without losing votes.
+
+    Each vote is appended to a log file as a single byte (the rating value)
+    while holding an exclusive lock on the log, so concurrent workers never
+    overwrite each other. Every process keeps the vote counts in memory and
+    catches up by reading only the bytes appended since its last read.
+
+    The aggregate is checkpointed periodically to ratings.json (same format
+    as before, plus the log offset it covers), so startup only has to read
+    the part of the log written after the last checkpoint. Nothing is read
+    until the store is first used; a missing or unreadable ratings.json is
+    rewritten by the first checkpoint.
+    """
+
+    def __init__(self, stats_path='ratings.json', log_path='ratings.log'):
+        self.stats_path = stats_path
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        # Opened on first use (see _open)
+        self._fd = None
+        self._counts = None
+        self._offset = 0
+        self._checkpointed_offset = None
+        self._checkpointer = None
+        # (log offset, encoded stats, ETag) for the last stats served
+        self._payload = None
+
+    def _open(self):
+        """Opens the log and loads the aggregate, on first use (lock held)."""
+        if self._fd is not None:
+            return
+        fd = os.open(self.log_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._counts, self._offset, valid = self._load_checkpoint(fd)
+        # An invalid checkpoint is replaced the next time one is written
+        self._checkpointed_offset = self._offset if valid else None
+        self._fd = fd
+        self._catch_up()
+
+    def _load_checkpoint(self, fd):
+        counts = dict.fromkeys(RATING_VALUES, 0)
+        valid = True
+        try:
+            with open(self.stats_path, 'r') as f:
+                data = json.load(f)
+            distribution = data.get('stats', {}).get('distribution', {})
+            for value in RATING_VALUES:
+                counts[value] = int(distribution.get(str(value), 0))
+            offset = int(data.get('log_offset', 0))
+        except (FileNotFoundError, json.JSONDecodeError, ValueError, AttributeError):
+            counts = dict.fromkeys(RATING_VALUES, 0)
+            offset = 0
+            valid = False
+        # Never trust an offset past the end of the log (e.g. log was deleted)
+        return counts, min(offset, os.fstat(fd).st_size), valid
+
+    def _lock_log(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def _unlock_log(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        """Reads votes appended by any process since the last read."""
+        size = os.fstat(self._fd).st_size
+        if size <= self._offset:
+            return
+        data = os.pread(self._fd, size - self._offset, self._offset)
+        counts = self._counts
+        for value in RATING_VALUES:
+            counts[value] += data.count(value)
+        self._offset += len(data)
+
+    def _stats(self):
+        counts = self._counts
+        count = sum(counts.values())
+        total = sum(value * n for value, n in counts.items())
+        return {
+            "avg": round(total / count, 2) if count else 0,
+            "count": count,
+            "distribution": {str(value): counts[value] for value in RATING_VALUES}
+        }
+
+    def add(self, rating):
+        """
+        Records one vote.
+
+        Args:
+            rating: Integer from 1 to 5
+
+        Returns:
+            Updated statistics (avg, count, distribution)
+        """
+        if rating not in RATING_VALUES:
+            raise ValueError('Rating must be an integer from 1-5')
+        with self._lock:
+            self._open()
+            self._lock_log()
+            try:
+                os.write(self._fd, bytes((rating,)))
+                self._catch_up()
+            finally:
+                self._unlock_log()
+            return self._stats()
+
+    def stats(self):
+        """
+        Returns:
+            Current statistics including votes from other processes
+        """
+        with self._lock:
+            self._open()
+            self._catch_up()
+            return self._stats()
+
+    def stats_payload(self):
+        """
+        Current statistics as pre-encoded JSON with an ETag.
+
+        The encoding is cached and only rebuilt when the log grows (a vote
+        from any worker), so unchanged stats cost a single fstat call.
+
+        Returns:
+            (body, etag) pair
+        """
+        with self._lock:
+            self._open()
+            self._catch_up()
+            if self._payload is None or self._payload[0] != self._offset:
+                body = encode_json(self._stats())
+                self._payload = (self._offset, body, make_etag(body))
+            return self._payload[1], self._payload[2]
+
+    def checkpoint(self):
+        """
+        Writes the current aggregate to ratings.json if it changed, atomically
+        (temp file + rename), so a crash never leaves a half-written file.
+        """
+        with self._lock:
+            self._open()
+            self._catch_up()
+            if self._offset == self._checkpointed_offset and os.path.exists(self.stats_path):
+                return
+            data = {"ratings": [], "stats": self._stats(), "log_offset": self._offset}
+            offset = self._offset
+
+        tmp_path = f'{self.stats_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.stats_path)
+        self._checkpointed_offset = offset
+
+    def start_checkpointing(self, interval=30):
+        """
+        Starts a daemon thread that checkpoints every interval seconds. A
+        failed checkpoint is logged and retried by the next one, counts are
+        kept in memory meanwhile.
+        """
+        if self._checkpointer is not None:
+            return
+        self._checkpointer = PeriodicThread('rating-checkpoint', interval, self.checkpoint, LOG,
+                                            'ratings_checkpoint_failed')
+        self._checkpointer.start()
@@ -0,0 +1,146 @@
+from image_variants import VARIANT_WIDTHS
+from payload_cache import encode_json, make_etag
+
+#------------------------------------------------------------------------------
+
+#                       PRECOMPILED QUIZ RESULT PAYLOADS
+
+#------------------------------------------------------------------------------
+
+# Trait dimensions in personality type letter order:
+# (comparison key, first trait name, first trait, second trait name, second trait)
+DIMENSIONS = (
+    ('E_vs_I', 'Extraversion', 'E', 'Introversion', 'I'),
+    ('S_vs_N', 'Sensing', 'S', 'Intuition', 'N'),
+    ('T_vs_F', 'Thinking', 'T', 'Feeling', 'F'),
+    ('J_vs_P', 'Judging', 'J', 'Perceiving', 'P'),
+)
+
+
+def mystery_result(personality_type):
+    """Fallback result for a type missing from the results table."""
+    return {
+        'type': 'Unknown',
+        'creature': 'Mystery Being',
+        'description': f'A mysterious creature beyond classification. Your personality type was {personality_type} but it could not be matched.',
+        'image_path': '/images/creatures/mystery-being.jpg'
+    }
+
+
+class ResultTemplate:
+    """
+    The result for one personality type, encoded ahead of time for one
+    public base URL. Only the user's scores and trait breakdown are filled
+    in when a quiz completes.
+
+    Attributes:
+        personality_type: 4-letter type, e.g. "INTJ"
+        summary: Shareable result without per-user data (type, creature,
+                 description and image URLs)
+        summary_body: summary encoded as JSON
+        etag: ETag of summary_body
+    """
+
+    __slots__ = ('personality_type', 'summary', 'summary_body', 'etag',
+                 '_prefix', '_comparisons', '_comparison_traits', '_suffix', '_compact_prefix')
+
+    def __init__(self, personality_type, result, base_url):
+        image_url = base_url.rstrip('/') + result['image_path']
+        summary = {
+            'personality_type': personality_type,
+            'type_name': result['type'],
+            'creature': result['creature'],
+            'image_url': image_url,
+            'image_variants': {str(width): f'{image_url}?w={width}' for width in VARIANT_WIDTHS},
+            'description': result['description']
+        }
+        self.personality_type = personality_type
+        self.summary = summary
+        self.summary_body = encode_json(summary)
+        self.etag = make_etag(self.summary_body)
+
+        # The full result in sorted key order: creature, description,
+        # image_url, image_variants, personality_type, [scores,
+        # trait_comparisons, trait_questions], type_name
+        self._prefix = (
+            b'{"creature":' + encode_json(summary['creature'])
+            + b',"description":' + encode_json(summary['description'])
+            + b',"image_url":' + encode_json(image_url)
+            + b',"image_variants":' + encode_json(summary['image_variants'])
+            + b',"personality_type":' + encode_json(personality_type)
+            + b',"scores":'
+        )
+        self._suffix = b',"type_name":' + encode_json(summary['type_name']) + b'}'
+        self._compact_prefix = b'{"personality_type":' + encode_json(personality_type) + b',"scores":'
+
+        # Comparison texts with %d where the two scores go
+        comparisons = {
+            key: f'{first_name} (%d) vs {second_name} (%d): {letter}'
+            for (key, first_name, first, second_name, second), letter
+            in zip(DIMENSIONS, personality_type)
+        }
+        self._comparisons = encode_json(comparisons)
+        self._comparison_traits = tuple(
+            trait
+            for key, first_name, first, second_name, second in sorted(DIMENSIONS)
+            for trait in (first, second)
+        )
+
+    def encode(self, scores, trait_questions):
+        """
+        Builds the encoded result for one finished quiz.
+
+        Args:
+            scores: Dictionary containing scores for E, I, S, N, T, F, J, P
+            trait_questions: Which questions contributed to which traits
+
+        Returns:
+            Encoded JSON result object
+        """
+        comparisons = self._comparisons % tuple(scores[trait] for trait in self._comparison_traits)
+        return (self._prefix + encode_json(scores)
+                + b',"trait_comparisons":' + comparisons
+                + b',"trait_questions":' + encode_json(trait_questions)
+                + self._suffix)
+
+    def encode_compact(self, scores, trait_answers):
+        """
+        Builds the compact result for one finished quiz: type code, scores
+        and [step, option index] pairs instead of texts. The type details
+        come from summary_body (/api/result/<type>, cacheable) and the texts
+        from the questions the client was shown.
+
+        Args:
+            scores: Dictionary containing scores for E, I, S, N, T, F, J, P
+            trait_answers: Output of QuestionIndex.trait_answers()
+
+        Returns:
+            Encoded JSON result object
+        """
+        return (self._compact_prefix + encode_json(scores)
+                + b',"trait_questions":' + encode_json(trait_answers) + b'}')
+
+
+class ResultTemplates:
+    """
+    ResultTemplate for every type in the results table, for one base URL.
+    """
+
+    def __init__(self, results, base_url):
+        self.base_url = base_url
+        self.types = {
+            personality_type: ResultTemplate(personality_type, result, base_url)
+            for personality_type, result in results.items()
+        }
+
+    def get(self, personality_type):
+        """
+        Returns:
+            The type's ResultTemplate, or a "Mystery Being" one for a type
+            missing from the results table
+        """
+        template = self.types.get(personality_type)
+        if template is None:
+            template = ResultTemplate(personality_type, mystery_result(personality_type),
+                                      self.base_url)
+        return template
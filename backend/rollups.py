@@ -0,0 +1,347 @@
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, single worker only
+    fcntl = None
+
+from periodic import PeriodicThread
+
+#------------------------------------------------------------------------------
+
+#                         TIME-BUCKETED ROLLUPS
+
+#------------------------------------------------------------------------------
+
+# Counters kept per time bucket: finished quizzes, then votes per rating value
+FIELDS = ('completions', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+COMPLETIONS = 0
+
+# Checkpoint errors go to the structured server log (see quiz_logging.py)
+LOG = logging.getLogger('quiz.rollups')
+
+# Resolution -> (bucket width in seconds, number of buckets kept)
+RESOLUTIONS = {
+    'minute': (60, 24 * 60),    # last 24 hours
+    'hour': (3600, 30 * 24),    # last 30 days
+    'day': (86400, 366),        # last year
+}
+
+# Window used when a query doesn't give one
+DEFAULT_WINDOWS = {'minute': 3600, 'hour': 86400, 'day': 30 * 86400}
+
+WINDOW = re.compile(r'^(\d+)([smhd]?)$')
+WINDOW_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_window(text):
+    """
+    Args:
+        text: Duration such as '90m', '24h', '30d' or a number of seconds
+
+    Returns:
+        Seconds
+
+    Raises:
+        ValueError: If the duration can't be parsed or is zero
+    """
+    match = WINDOW.match(text.strip())
+    if match is None or int(match[1]) == 0:
+        raise ValueError(f'Invalid window {text!r}, expected e.g. 90m, 24h or 30d')
+    return int(match[1]) * WINDOW_UNITS[match[2]]
+
+
+class Ring:
+    """
+    A fixed number of consecutive time buckets in one flat integer array.
+    Bucket n (time // width) lives in slot n % slots as its number followed
+    by its counters, so a slot still holding an older bucket is simply
+    overwritten when time moves on and nothing ever needs to be shifted.
+    """
+
+    __slots__ = ('width', 'slots', 'data')
+
+    STRIDE = 1 + len(FIELDS)
+
+    def __init__(self, width, slots):
+        self.width = width
+        self.slots = slots
+        self.data = array('q', ([-1] + [0] * len(FIELDS)) * slots)
+
+    def add(self, bucket, counts):
+        """
+        Adds counters to a bucket. Buckets older than the one held in their
+        slot (beyond the ring's span) are dropped.
+
+        Args:
+            bucket: Bucket number
+            counts: Sequence of amounts, one per field in FIELDS
+        """
+        data = self.data
+        base = (bucket % self.slots) * self.STRIDE
+        if data[base] != bucket:
+            if data[base] > bucket:
+                return
+            data[base] = bucket
+            for offset in range(1, self.STRIDE):
+                data[base + offset] = 0
+        for offset, amount in enumerate(counts, 1):
+            data[base + offset] += amount
+
+    def increment(self, bucket, field):
+        """Adds one to a single counter of a bucket (see add())."""
+        data = self.data
+        base = (bucket % self.slots) * self.STRIDE
+        if data[base] != bucket:
+            if data[base] > bucket:
+                return
+            data[base] = bucket
+            for offset in range(1, self.STRIDE):
+                data[base + offset] = 0
+        data[base + 1 + field] += 1
+
+    def get(self, bucket):
+        """
+        Returns:
+            The bucket's counters, or None if it is empty or out of the ring
+        """
+        base = (bucket % self.slots) * self.STRIDE
+        if self.data[base] != bucket:
+            return None
+        return self.data[base + 1:base + self.STRIDE]
+
+    def rows(self):
+        """
+        Returns:
+            List of [bucket, counters...] for every bucket held, oldest first
+        """
+        data = self.data
+        rows = [data[base:base + self.STRIDE].tolist()
+                for base in range(0, len(data), self.STRIDE) if data[base] >= 0]
+        rows.sort()
+        return rows
+
+
+class TimeRollups:
+    """
+    Quiz completions and ratings counted per minute, hour and day, so the
+    admin dashboard can chart recent traffic without scanning the logs.
+
+    Events are counted in memory (one ring of buckets per resolution) and
+    queried from there, so neither recording nor querying touches the disk.
+    Every checkpoint merges the counts this process recorded since the
+    previous one into the rollups file under an exclusive lock and reloads
+    the merged result, so each worker also sees the other workers' counts,
+    at most one checkpoint interval late. The file is read on first use.
+    """
+
+    def __init__(self, path='rollups.json', resolutions=RESOLUTIONS):
+        self.path = path
+        self.resolutions = resolutions
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._rings = None
+        # Counts recorded since the last checkpoint: minute bucket -> counters
+        self._pending = {}
+        self._checkpointer = None
+
+    def _empty_rings(self):
+        return {name: Ring(width, slots) for name, (width, slots) in self.resolutions.items()}
+
+    def _read_file(self):
+        """
+        Returns:
+            Rings loaded from the rollups file (empty ones if it is missing,
+            unreadable or was written with other fields)
+        """
+        rings = self._empty_rings()
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('fields') != list(FIELDS):
+                return rings
+            for name, ring in rings.items():
+                saved = data['resolutions'].get(name)
+                # Skip resolutions whose bucket width changed
+                if not saved or saved.get('seconds') != ring.width:
+                    continue
+                for row in saved['buckets']:
+                    ring.add(int(row[0]), [int(n) for n in row[1:]])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError,
+                AttributeError, IndexError):
+            return self._empty_rings()
+        return rings
+
+    def _open(self):
+        """Loads the rollups file, on first use (lock held)."""
+        if self._rings is None:
+            self._rings = self._read_file()
+
+    def load(self):
+        """Reads the rollups file now instead of on first use."""
+        with self._lock:
+            self._open()
+
+    def _apply(self, rings, minute, counts):
+        seconds = minute * 60
+        for ring in rings.values():
+            ring.add(seconds // ring.width, counts)
+
+    def _record(self, field, now):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._open()
+            for ring in self._rings.values():
+                ring.increment(int(now // ring.width), field)
+            minute = int(now // 60)
+            counts = self._pending.get(minute)
+            if counts is None:
+                counts = self._pending[minute] = [0] * len(FIELDS)
+            counts[field] += 1
+
+    def record_completion(self, now=None):
+        """Counts a finished quiz."""
+        self._record(COMPLETIONS, now)
+
+    def record_rating(self, rating, now=None):
+        """Counts a vote (1-5)."""
+        self._record(COMPLETIONS + rating, now)
+
+    def series(self, resolution, window, now=None):
+        """
+        Counts per bucket for the most recent window, oldest bucket first.
+        The window is rounded up to whole buckets, and cut to the buckets
+        kept for the resolution.
+
+        Args:
+            resolution: 'minute', 'hour' or 'day'
+            window: Seconds to cover, up to now
+            now: Current time (defaults to time.time())
+
+        Returns:
+            Dictionary with resolution, bucket_seconds, start and end (epoch
+            seconds), completions, ratings, rating_avg (None for buckets
+            without votes), distribution (rating -> counts) and totals
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._open()
+            ring = self._rings[resolution]
+            buckets = min(max(-(-window // ring.width), 1), ring.slots)
+            last = int(now // ring.width)
+            first = last - buckets + 1
+            rows = [ring.get(bucket) for bucket in range(first, last + 1)]
+
+        empty = [0] * len(FIELDS)
+        columns = list(zip(*(row if row is not None else empty for row in rows)))
+        completions = list(columns[COMPLETIONS])
+        distribution = {str(value): list(columns[COMPLETIONS + value]) for value in range(1, 6)}
+        ratings = [sum(votes) for votes in zip(*distribution.values())]
+        rating_avg = [
+            round(sum(int(value) * votes[i] for value, votes in distribution.items()) / count, 2)
+            if count else None
+            for i, count in enumerate(ratings)
+        ]
+        total_ratings = sum(ratings)
+        total_score = sum(int(value) * sum(votes) for value, votes in distribution.items())
+        return {
+            'resolution': resolution,
+            'bucket_seconds': ring.width,
+            'start': first * ring.width,
+            'end': (last + 1) * ring.width,
+            'completions': completions,
+            'ratings': ratings,
+            'rating_avg': rating_avg,
+            'distribution': distribution,
+            'totals': {
+                'completions': sum(completions),
+                'ratings': total_ratings,
+                'rating_avg': round(total_score / total_ratings, 2) if total_ratings else 0
+            }
+        }
+
+    def _lock_file(self):
+        """Opens and locks the lock file next to the rollups file."""
+        fd = os.open(f'{self.path}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _unlock_file(self, fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def checkpoint(self):
+        """
+        Merges the counts recorded since the last checkpoint into the
+        rollups file (written atomically, temp file + rename) and reloads
+        the totals of every process from it.
+        """
+        with self._lock:
+            self._open()
+            pending, self._pending = self._pending, {}
+
+        with self._file_lock:
+            try:
+                fd = self._lock_file()
+                try:
+                    rings = self._read_file()
+                    for minute, counts in pending.items():
+                        self._apply(rings, minute, counts)
+                    if pending or not os.path.exists(self.path):
+                        data = {
+                            'fields': list(FIELDS),
+                            'resolutions': {
+                                name: {'seconds': ring.width, 'buckets': ring.rows()}
+                                for name, ring in rings.items()
+                            }
+                        }
+                        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+                        with open(tmp_path, 'w') as f:
+                            json.dump(data, f, separators=(',', ':'))
+                        os.replace(tmp_path, self.path)
+                finally:
+                    self._unlock_file(fd)
+            except OSError:
+                # Keep the counts for the next checkpoint
+                with self._lock:
+                    for minute, counts in pending.items():
+                        merged = self._pending.setdefault(minute, [0] * len(FIELDS))
+                        for field, amount in enumerate(counts):
+                            merged[field] += amount
+                raise
+
+            with self._lock:
+                # Counts recorded while the file was merged aren't in it yet
+                for minute, counts in self._pending.items():
+                    self._apply(rings, minute, counts)
+                self._rings = rings
+
+    def start_checkpointing(self, interval=30):
+        """
+        Starts a daemon thread that checkpoints every interval seconds, and
+        checkpoints once more at interpreter exit. A failed checkpoint is
+        logged and retried by the next one, counts are kept in memory
+        meanwhile.
+        """
+        if self._checkpointer is not None:
+            return
+
+        def final_checkpoint():
+            try:
+                self.checkpoint()
+            except OSError:
+                pass
+
+        self._checkpointer = PeriodicThread('rollup-checkpoint', interval, self.checkpoint, LOG,
+                                            'rollups_checkpoint_failed')
+        self._checkpointer.start()
+        atexit.register(final_checkpoint)
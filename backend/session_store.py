@@ -0,0 +1,359 @@
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from periodic import PeriodicThread
+from quiz_session import QuizSession
+
+#------------------------------------------------------------------------------
+
+#                              QUIZ SESSION STORES
+
+#------------------------------------------------------------------------------
+
+# Sweeper errors go to the structured server log (see quiz_logging.py)
+LOG = logging.getLogger('quiz.sessions')
+
+# Number of locks MemorySessionStore spreads sessions over, so writes to
+# different sessions rarely wait on each other
+LOCK_STRIPES = 64
+
+
+class SessionStore:
+    """
+    Interface for storing QuizSession objects by session ID.
+
+    Stores that keep sessions in process memory may return the live object
+    from get(), shared stores return a copy, so handlers never change the
+    object they got. To answer a question a handler changes a copy and
+    writes it back with compare_and_set(), which only succeeds if nobody
+    wrote the session in the meantime (double-clicked submits, restarts,
+    threaded workers). save() overwrites unconditionally and is meant for
+    new or reset sessions.
+
+    Every write gives the session a new revision, which only ever goes
+    up, and get() returns it in QuizSession.revision. Comparing revisions
+    rather than steps means a session that was restarted and answered back
+    to the same step still counts as changed.
+
+    Sessions expire after idle_ttl seconds without activity (a get or a
+    save), and at most max_sessions are kept; beyond that the least
+    recently used ones are evicted first.
+    """
+
+    def __init__(self, idle_ttl=86400, max_sessions=100000):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.evicted_expired = 0
+        self.evicted_lru = 0
+
+    def get(self, session_id):
+        """
+        Args:
+            session_id: Session ID issued by start_quiz/restart
+
+        Returns:
+            The QuizSession, or None if the session doesn't exist
+            or has expired
+        """
+        raise NotImplementedError
+
+    def save(self, session_id, state):
+        """
+        Creates or replaces a session, whatever its revision, and marks it
+        as active.
+
+        Args:
+            session_id: Session ID
+            state: QuizSession
+        """
+        raise NotImplementedError
+
+    def compare_and_set(self, session_id, expected_revision, state):
+        """
+        Replaces a session only if it still exists and is on
+        expected_revision, i.e. no other request wrote it since it was read.
+
+        Args:
+            session_id: Session ID
+            expected_revision: QuizSession.revision of the session when it
+                               was read
+            state: Updated QuizSession
+
+        Returns:
+            True if the session was replaced, False if it changed or is gone
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """
+        Removes a session if it exists.
+
+        Args:
+            session_id: Session ID
+        """
+        raise NotImplementedError
+
+    def evict_expired(self, now=None):
+        """
+        Removes every session that has been idle for longer than idle_ttl,
+        and the least recently used sessions above max_sessions.
+
+        Args:
+            now: Current unix timestamp (defaults to time.time())
+
+        Returns:
+            Number of sessions removed
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with the current size, limits and eviction counters
+        """
+        return {
+            'size': len(self),
+            'max_sessions': self.max_sessions,
+            'idle_ttl': self.idle_ttl,
+            'evicted_expired': self.evicted_expired,
+            'evicted_lru': self.evicted_lru,
+        }
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __contains__(self, session_id):
+        return session_id is not None and self.get(session_id) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Keeps sessions in an OrderedDict in the current process.
+
+    Entries are kept in order of last activity (touched entries move to the
+    end), so both expiry and LRU eviction only ever pop from the front:
+    O(1) per evicted session, without scanning live ones.
+
+    Writes to a session (save and compare_and_set) hold one of
+    LOCK_STRIPES locks, not one lock for the whole store, so a restart
+    can't land between the read and the write of a compare_and_set().
+    Revisions come from one counter for the whole store, so they are
+    never reused, not even for a deleted session.
+
+    Fastest option, but only usable with a single worker process since
+    sessions are not visible to other workers.
+    """
+
+    def __init__(self, idle_ttl=86400, max_sessions=100000):
+        super().__init__(idle_ttl, max_sessions)
+        # session_id -> QuizSession, oldest activity first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stripes = tuple(threading.Lock() for _ in range(LOCK_STRIPES))
+        self._revisions = itertools.count(1)
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return None
+            if now - state.last_active > self.idle_ttl:
+                del self._sessions[session_id]
+                self.evicted_expired += 1
+                return None
+            state.last_active = now
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def save(self, session_id, state):
+        with self._stripes[hash(session_id) % LOCK_STRIPES]:
+            self._store(session_id, state)
+
+    def compare_and_set(self, session_id, expected_revision, state):
+        with self._stripes[hash(session_id) % LOCK_STRIPES]:
+            current = self.get(session_id)
+            if current is None or current.revision != expected_revision:
+                return False
+            self._store(session_id, state)
+            return True
+
+    def _store(self, session_id, state):
+        # Callers hold the session's stripe lock
+        state.revision = next(self._revisions)
+        state.last_active = time.time()
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id] = state
+                self._sessions.move_to_end(session_id)
+            else:
+                self._sessions[session_id] = state
+                # Hard cap: drop the least recently used sessions
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_lru += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_expired(self, now=None):
+        cutoff = (now or time.time()) - self.idle_ttl
+        removed = 0
+        with self._lock:
+            while self._sessions:
+                session_id, state = next(iter(self._sessions.items()))
+                if state.last_active >= cutoff:
+                    break
+                del self._sessions[session_id]
+                removed += 1
+            self.evicted_expired += removed
+        return removed
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Keeps sessions in a SQLite database in WAL mode, shared by every worker
+    process on the machine (e.g. gunicorn -w 4).
+
+    Each thread gets its own connection. WAL lets readers run alongside the
+    single writer, and writes are tiny single-row upserts of the packed
+    session (about 20 bytes) and its revision, so compare_and_set() is a
+    single conditional UPDATE. Expiry and the
+    size cap are enforced by evict_expired() using an index on last activity;
+    eviction counters only cover evictions done by this process.
+    """
+
+    def __init__(self, path, idle_ttl=86400, max_sessions=100000):
+        super().__init__(idle_ttl, max_sessions)
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS quiz_sessions ('
+            ' session_id TEXT PRIMARY KEY,'
+            ' state BLOB NOT NULL,'
+            ' last_active REAL NOT NULL,'
+            ' revision INTEGER NOT NULL DEFAULT 1)'
+        )
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(quiz_sessions)')]
+        if 'revision' not in columns:
+            # Databases created before revisions were stored
+            connection.execute(
+                'ALTER TABLE quiz_sessions ADD COLUMN revision INTEGER NOT NULL DEFAULT 1'
+            )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS quiz_sessions_last_active ON quiz_sessions (last_active)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode, every statement is its own short transaction
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, session_id):
+        row = self._connection().execute(
+            'SELECT state, last_active, revision FROM quiz_sessions'
+            ' WHERE session_id = ? AND last_active >= ?',
+            (session_id, time.time() - self.idle_ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        state = QuizSession.from_bytes(row[0])
+        state.last_active = row[1]
+        state.revision = row[2]
+        return state
+
+    def save(self, session_id, state):
+        # Replacing a row keeps counting up from its revision. Only a
+        # deleted (expired) session starts over, and session IDs are
+        # never issued twice.
+        self._connection().execute(
+            'INSERT INTO quiz_sessions (session_id, state, last_active) VALUES (?, ?, ?)'
+            ' ON CONFLICT (session_id) DO UPDATE SET state = excluded.state,'
+            ' last_active = excluded.last_active, revision = revision + 1',
+            (session_id, state.to_bytes(), time.time())
+        )
+
+    def compare_and_set(self, session_id, expected_revision, state):
+        # One conditional UPDATE, atomic across worker processes too
+        now = time.time()
+        replaced = self._connection().execute(
+            'UPDATE quiz_sessions SET state = ?, last_active = ?, revision = revision + 1'
+            ' WHERE session_id = ? AND revision = ? AND last_active >= ?',
+            (state.to_bytes(), now, session_id, expected_revision, now - self.idle_ttl)
+        ).rowcount == 1
+        if replaced:
+            state.revision = expected_revision + 1
+        return replaced
+
+    def delete(self, session_id):
+        self._connection().execute('DELETE FROM quiz_sessions WHERE session_id = ?', (session_id,))
+
+    def evict_expired(self, now=None):
+        connection = self._connection()
+        cutoff = (now or time.time()) - self.idle_ttl
+        expired = connection.execute(
+            'DELETE FROM quiz_sessions WHERE last_active < ?', (cutoff,)
+        ).rowcount
+        overflow = len(self) - self.max_sessions
+        lru = 0
+        if overflow > 0:
+            lru = connection.execute(
+                'DELETE FROM quiz_sessions WHERE session_id IN ('
+                ' SELECT session_id FROM quiz_sessions ORDER BY last_active LIMIT ?)',
+                (overflow,)
+            ).rowcount
+        self.evicted_expired += expired
+        self.evicted_lru += lru
+        return expired + lru
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM quiz_sessions').fetchone()[0]
+
+
+class SessionSweeper(PeriodicThread):
+    """
+    Background daemon thread that periodically evicts expired sessions,
+    so memory is reclaimed even for sessions that are never touched again.
+    """
+
+    def __init__(self, store, interval=60):
+        super().__init__('session-sweeper', interval, store.evict_expired, LOG,
+                         'session_sweep_failed')
+        self.store = store
+
+
+def create_session_store(spec, idle_ttl=86400, max_sessions=100000):
+    """
+    Creates a session store from a short spec string, as used by the
+    QUIZ_SESSION_STORE environment variable.
+
+    Args:
+        spec: 'memory' or 'sqlite:<path to database file>'
+        idle_ttl: Seconds of inactivity after which a session expires
+        max_sessions: Maximum number of sessions kept
+
+    Returns:
+        A SessionStore instance
+    """
+    if not spec or spec == 'memory':
+        return MemorySessionStore(idle_ttl, max_sessions)
+    if spec.startswith('sqlite:'):
+        path = spec[len('sqlite:'):] or 'sessions.db'
+        return SQLiteSessionStore(os.path.expanduser(path), idle_ttl, max_sessions)
+    raise ValueError(f'Unknown session store: {spec!r}')
@@ -0,0 +1,61 @@
+from itsdangerous import BadSignature, Signer
+from itsdangerous.encoding import base64_decode, base64_encode
+
+from quiz_session import QuizSession
+
+#------------------------------------------------------------------------------
+
+#                        STATELESS SIGNED QUIZ TOKENS
+
+#------------------------------------------------------------------------------
+
+class TokenError(ValueError):
+    """Raised when a quiz token is tampered with, malformed or out of range."""
+
+
+class QuizTokenCodec:
+    """
+    Signs and verifies quiz tokens with the application's secret key, so the
+    whole quiz state can travel with the client instead of living on the server.
+
+    The token payload is the packed QuizSession (step, bit-packed trait
+    scores and one nibble per chosen option index).
+    """
+
+    def __init__(self, secret_key):
+        self._signer = Signer(secret_key, salt='reincarnation-quiz-token')
+
+    def encode(self, session):
+        """
+        Args:
+            session: QuizSession to hand to the client
+
+        Returns:
+            URL-safe signed token string
+        """
+        try:
+            packed = session.to_bytes()
+        except ValueError as e:
+            raise TokenError(str(e)) from e
+        return self._signer.sign(base64_encode(packed)).decode('ascii')
+
+    def decode(self, token):
+        """
+        Verifies and unpacks a token.
+
+        Args:
+            token: Token string sent back by the client
+
+        Returns:
+            The QuizSession stored in the token
+
+        Raises:
+            TokenError: If the signature is invalid or the token is malformed
+        """
+        if not isinstance(token, str):
+            raise TokenError('Token must be a string')
+        try:
+            payload = self._signer.unsign(token)
+            return QuizSession.from_bytes(base64_decode(payload))
+        except (BadSignature, ValueError) as e:
+            raise TokenError(str(e)) from e
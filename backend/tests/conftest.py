@@ -0,0 +1,104 @@
+"""
+Shared fixtures: both servers (the Flask app and the ASGI app) built from the
+same quiz API in a scratch workspace, behind one small client interface, so
+every test runs against both.
+"""
+import asyncio
+import json
+import os
+import sys
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.common import scratch_workspace  # noqa: E402
+
+# The app reads and writes its data files relative to the working directory
+WORKSPACE = scratch_workspace()
+os.chdir(WORKSPACE)
+os.environ.setdefault('QUIZ_WARM_UP', 'lazy')
+os.environ.setdefault('QUIZ_LOG_SAMPLE_RATE', '0')
+
+
+class Reply(namedtuple('Reply', ['status', 'headers', 'body'])):
+    """A response from either server, headers with lower-case names."""
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class FlaskClient:
+    """Calls the Flask app through its test client."""
+
+    def __init__(self):
+        import app
+        self._client = app.create_app('lazy').test_client()
+
+    def request(self, method, path, payload=None, headers=None):
+        response = self._client.open(path, method=method, json=payload, headers=headers or {})
+        return Reply(response.status_code,
+                     {name.lower(): value for name, value in response.headers.items()},
+                     response.get_data())
+
+
+class AsgiClient:
+    """Calls the ASGI app directly with a single-message request body."""
+
+    def __init__(self):
+        import asgi
+        self._app = asgi.create_app('lazy')
+
+    def request(self, method, path, payload=None, headers=None):
+        # Same host as Flask's test client, so absolute URLs match
+        headers = dict({'host': 'localhost'},
+                       **{name.lower(): value for name, value in (headers or {}).items()})
+        body = b''
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers.setdefault('content-type', 'application/json')
+        url = urlsplit(path)
+        scope = {
+            'type': 'http', 'method': method, 'path': url.path, 'root_path': '',
+            'query_string': url.query.encode(), 'scheme': 'http', 'server': ('localhost', 80),
+            'headers': [(name.encode('latin-1'), value.encode('latin-1'))
+                        for name, value in headers.items()],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(self._app(scope, receive, send))
+        start = messages[0]
+        return Reply(start['status'],
+                     {name.decode('latin-1'): value.decode('latin-1')
+                      for name, value in start['headers']},
+                     b''.join(message.get('body', b'') for message in messages[1:]))
+
+
+CLIENTS = {'flask': FlaskClient, 'asgi': AsgiClient}
+
+
+@pytest.fixture(scope='session')
+def clients():
+    """Both clients, by server name."""
+    return {name: make() for name, make in CLIENTS.items()}
+
+
+@pytest.fixture(params=sorted(CLIENTS))
+def client(request, clients):
+    return clients[request.param]
+
+
+def pytest_sessionfinish(session):
+    # pytest goes back to the directory it was started from before this hook,
+    # and the app's exit handlers (log flush, checkpoints) write to the
+    # working directory
+    os.chdir(WORKSPACE)
@@ -0,0 +1,166 @@
+"""
+Quiz flows run against both the Flask app and the ASGI app (see the client
+fixture): start, answer every question, get the result and rate it.
+"""
+
+
+def play(client, pick=0):
+    """
+    Answers every question of a new server-side session with option `pick`
+    (or the last option, for questions with fewer).
+
+    Returns:
+        (number of answers, final reply JSON)
+    """
+    reply = client.request('POST', '/api/start_quiz')
+    assert reply.status == 200
+    data = reply.json()
+    session_id, question = data['session_id'], data['question']
+    answers = 0
+    while True:
+        option = question['options'][min(pick, len(question['options']) - 1)]
+        reply = client.request('POST', '/api/answer',
+                               {'session_id': session_id, 'choice': option['text']})
+        assert reply.status == 200
+        data = reply.json()
+        answers += 1
+        if data.get('quiz_complete'):
+            return answers, data
+        question = data['next_question']
+
+
+def test_session_flow_and_rating(client):
+    answers, data = play(client)
+    result = data['result']
+    assert answers > 1
+    assert len(result['personality_type']) == 4
+    assert set(result['scores']) == set('EISNTFJP')
+
+    before = client.request('GET', '/api/ratings').json()['count']
+    reply = client.request('POST', '/api/submit_rating', {'rating': 4})
+    assert reply.status == 200
+    assert reply.json()['success'] is True
+    assert client.request('GET', '/api/ratings').json()['count'] == before + 1
+
+
+def test_different_answers_give_different_results(client):
+    _, first = play(client, pick=0)
+    _, second = play(client, pick=1)
+    assert first['result']['personality_type'] != second['result']['personality_type']
+
+
+def test_flask_and_asgi_return_the_same_result(clients):
+    results = [play(client, pick=1)[1]['result'] for client in clients.values()]
+    assert results[0] == results[1]
+
+
+def test_stateless_token_flow(client):
+    data = client.request('POST', '/api/start_quiz', {'stateless': True}).json()
+    token, question = data['token'], data['question']
+    while True:
+        data = client.request('POST', '/api/answer',
+                              {'token': token, 'choice': question['options'][0]['text']}).json()
+        assert not data.get('session_replaced')
+        if data.get('quiz_complete'):
+            break
+        token, question = data['token'], data['next_question']
+    assert len(data['result']['personality_type']) == 4
+
+
+def test_batch_and_client_scored_results_match_answer_flow(client):
+    answers, data = play(client, pick=0)
+    expected = data['result']['personality_type']
+
+    batch = client.request('POST', '/api/answers/batch', {'choices': [0] * answers})
+    assert batch.status == 200
+    assert batch.json()['result']['personality_type'] == expected
+
+    scored = client.request('POST', '/api/result', {'answers': [0] * answers})
+    assert scored.status == 200
+    assert scored.json()['result']['personality_type'] == expected
+
+    shared = client.request('GET', f'/api/result/{expected}')
+    assert shared.status == 200
+    assert shared.json()['personality_type'] == expected
+
+
+def test_restart_returns_first_scoring_question(client):
+    _, data = play(client)
+    session_id = client.request('POST', '/api/start_quiz').json()['session_id']
+    reply = client.request('POST', '/api/restart', {'session_id': session_id})
+    assert reply.status == 200
+    assert 'question' in reply.json()
+
+
+def test_invalid_requests(client):
+    assert client.request('POST', '/api/submit_rating', {'rating': 9}).status == 400
+    assert client.request('POST', '/api/result', {'answers': [0], 'start_step': True}).status == 400
+    assert client.request('POST', '/api/answers/batch',
+                          {'choices': [0], 'start_step': True}).status == 400
+    assert client.request('GET', '/api/analytics?resolution=week').status == 400
+    assert client.request('GET', '/api/no_such_route').status == 404
+
+
+def test_answer_that_is_not_text_matches_no_option(client):
+    session_id = client.request('POST', '/api/start_quiz').json()['session_id']
+    for choice in (['x'], {'text': 'x'}, None):
+        reply = client.request('POST', '/api/answer', {'session_id': session_id, 'choice': choice})
+        assert reply.status == 200
+        assert reply.json()['god_response'] == ''
+
+
+def test_cors_preflight(client):
+    reply = client.request('OPTIONS', '/api/answer', headers={
+        'Origin': 'https://isekaiquiz.com',
+        'Access-Control-Request-Method': 'POST',
+    })
+    assert reply.status == 204
+    assert reply.headers['access-control-allow-origin'] == 'https://isekaiquiz.com'
+
+
+def test_debug_ratings_reports_json(client):
+    reply = client.request('GET', '/api/debug/ratings')
+    assert reply.status == 200
+    assert reply.headers['content-type'].startswith('application/json')
+
+
+def test_questions_sent_without_flow_keys(client):
+    question = client.request('POST', '/api/start_quiz').json()['question']
+    questions = client.request('GET', '/api/quiz_manifest').json()['questions']
+    for sent in [question] + questions:
+        assert not {'next', 'scoring'} & set(sent)
+        assert not any({'next', 'scoring'} & set(option) for option in sent.get('options', ()))
+
+
+def completions(client):
+    text = client.request('GET', '/api/metrics').body.decode()
+    return sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+               if line.startswith('quiz_completed_total'))
+
+
+def test_batch_on_finished_session_does_not_complete_it_again(client):
+    answers, _ = play(client, pick=0)
+    before = completions(client)
+
+    assert client.request('POST', '/api/answers/batch', {'choices': []}).status == 400
+    session_id = client.request('POST', '/api/answers/batch', {'choices': [0]}).json()['session_id']
+    finished = client.request('POST', '/api/answers/batch',
+                              {'session_id': session_id, 'choices': [0] * (answers - 1)})
+    assert finished.json()['quiz_complete']
+
+    for choices in ([], [0]):
+        reply = client.request('POST', '/api/answers/batch',
+                               {'session_id': session_id, 'choices': choices})
+        assert reply.status == 400 or reply.json()['session_replaced']
+    assert completions(client) == before + 1
+
+
+def test_results_for_other_hosts_are_not_cached(client):
+    import quiz_api
+    play(client)
+    cached = quiz_api.RESULT_TEMPLATES
+    for host in ('a.example', 'b.example'):
+        reply = client.request('GET', '/api/result/INTJ', headers={'Host': host})
+        assert reply.json()['image_url'].startswith(f'http://{host}/')
+    assert quiz_api.RESULT_TEMPLATES is cached
+    assert client.request('GET', '/api/result/XXXX', headers={'Host': 'a.example'}).status == 404
@@ -0,0 +1,31 @@
+"""
+Variant builds settle: once an image's variants are built, or it is too
+narrow for any of them, later builds don't decode it again.
+"""
+import os
+
+import pytest
+
+import image_variants
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def test_narrow_image_is_not_rebuilt_on_every_run(tmp_path, monkeypatch):
+    creatures = tmp_path / 'creatures'
+    creatures.mkdir()
+    Image.new('RGB', (150, 100)).save(creatures / 'narrow.jpg')
+    Image.new('RGB', (300, 200)).save(creatures / 'wide.jpg')
+
+    assert image_variants.build_variants(str(tmp_path)) == len(image_variants.FORMATS)
+
+    opened = []
+    open_image = Image.open
+    monkeypatch.setattr(Image, 'open', lambda *args: opened.append(args[0]) or open_image(*args))
+    assert image_variants.build_variants(str(tmp_path)) == 0
+    assert opened == []
+
+    # A changed original is rebuilt
+    os.utime(creatures / 'narrow.jpg', (1, 1))
+    image_variants.build_variants(str(tmp_path))
+    assert [os.path.basename(path) for path in opened] == ['narrow.jpg']
@@ -0,0 +1,32 @@
+"""
+Background checkpoint, flush and sweep threads keep running after a failed
+call, and log the failure instead of dropping it.
+"""
+import logging
+import threading
+
+from periodic import PeriodicThread
+
+
+def test_failures_are_logged_and_the_thread_keeps_going(caplog):
+    calls = []
+    done = threading.Event()
+
+    def checkpoint():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError('disk full')
+        done.set()
+
+    thread = PeriodicThread('test-checkpoint', 0.01, checkpoint, logging.getLogger('quiz.test'),
+                            'test_checkpoint_failed')
+    with caplog.at_level(logging.ERROR, logger='quiz.test'):
+        thread.start()
+        assert done.wait(5)
+        thread.stop()
+        thread.join(5)
+
+    assert not thread.is_alive()
+    [record] = caplog.records
+    assert record.getMessage() == 'test_checkpoint_failed'
+    assert 'disk full' in str(record.exc_info[1])
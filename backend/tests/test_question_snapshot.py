@@ -0,0 +1,23 @@
+"""
+Binary question snapshots are only loaded when they were written from the
+same questions and by code with the same pickled class layout.
+"""
+import question_index
+from question_index import QuestionRegistry, read_snapshot, write_snapshot
+
+
+def test_snapshot_round_trip_and_rejections(tmp_path, monkeypatch):
+    question_set = QuestionRegistry('questions.json').current()
+    path = str(tmp_path / 'questions.snapshot')
+    write_snapshot(question_set, path)
+
+    loaded = read_snapshot(path, question_set.version)
+    assert loaded.payloads.questions == question_set.payloads.questions
+    assert loaded.index.transitions == question_set.index.transitions
+
+    # Edited questions
+    assert read_snapshot(path, question_set.version + 1) is None
+
+    # Written by code whose pickled classes had other slots
+    monkeypatch.setattr(question_index, 'SNAPSHOT_LAYOUT', b'\0\0\0\0')
+    assert read_snapshot(path, question_set.version) is None
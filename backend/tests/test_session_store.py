@@ -0,0 +1,83 @@
+"""
+Session store writes racing each other: a restart landing while an answer
+for the same session is being applied must never be overwritten by it.
+"""
+import threading
+
+import pytest
+
+from quiz_session import QuizSession
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+
+
+def answered(state, step):
+    """Copy of a session with one more answer, as process_answer writes it."""
+    state = state.copy()
+    state.record_answer(step, None, False)
+    state.step = step + 1
+    return state
+
+
+def test_restarted_session_back_on_the_same_step_counts_as_changed(store):
+    store.save('s', QuizSession(step=2))
+    stale = store.get('s').copy()
+
+    # Restart, then answer back to the step the stale read saw
+    store.save('s', QuizSession(step=1))
+    assert store.compare_and_set('s', store.get('s').revision, answered(store.get('s'), 1))
+    assert store.get('s').step == stale.step
+
+    assert not store.compare_and_set('s', stale.revision, answered(stale, 2))
+    assert store.get('s').answers == bytearray(2)
+
+
+class PausingStore(MemorySessionStore):
+    """Pauses compare_and_set() between its read and its write."""
+
+    def __init__(self):
+        super().__init__()
+        self.read_done = threading.Event()
+        self.restart_done = threading.Event()
+        self._answering = threading.local()
+
+    def compare_and_set(self, session_id, expected_revision, state):
+        self._answering.active = True
+        try:
+            return super().compare_and_set(session_id, expected_revision, state)
+        finally:
+            self._answering.active = False
+
+    def get(self, session_id):
+        state = super().get(session_id)
+        if getattr(self._answering, 'active', False):
+            self.read_done.set()
+            # A restart that doesn't wait for the session's lock lands here
+            self.restart_done.wait(0.2)
+        return state
+
+
+def test_restart_during_answer_is_not_overwritten():
+    store = PausingStore()
+    store.save('s', QuizSession(step=3))
+    read = store.get('s')
+
+    def restart():
+        store.read_done.wait(5)
+        store.save('s', QuizSession(step=1))
+        store.restart_done.set()
+
+    thread = threading.Thread(target=restart)
+    thread.start()
+    assert store.compare_and_set('s', read.revision, answered(read, 3))
+    thread.join()
+
+    # The restart waited for the answer and came after it
+    state = store.get('s')
+    assert (state.step, bytes(state.answers)) == (1, b'')
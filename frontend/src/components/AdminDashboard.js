@@ -4,9 +4,22 @@ import "./AdminDashboard.css";
 
 const ADMIN_PASSWORD = "MBTI";
 
+// Activity chart resolutions and the window shown for each
+const ACTIVITY_WINDOWS = { minute: "60m", hour: "24h", day: "30d" };
+
+// Label of a bucket starting at the given epoch second
+const bucketLabel = (seconds, resolution) => {
+  const date = new Date(seconds * 1000);
+  if (resolution === "day") return date.toLocaleDateString();
+  return date.toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" });
+};
+
 const AdminDashboard = () => {
   // State variables
   const [stats, setStats] = useState(null);
+  const [answerStats, setAnswerStats] = useState(null);
+  const [activity, setActivity] = useState(null);
+  const [resolution, setResolution] = useState("hour");
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [authenticated, setAuthenticated] = useState(false);
@@ -34,6 +47,13 @@ const AdminDashboard = () => {
       // Call bridge service to get ratings data
       const data = await bridge.getRatings();
       setStats(data);
+      // Quiz analytics are optional, the ratings still show without them
+      try {
+        setAnswerStats(await bridge.getAnswerStats());
+      } catch (err) {
+        setAnswerStats(null);
+      }
+      await fetchActivity(resolution);
       setLoading(false);
       setError(null);
     } catch (err) {
@@ -42,6 +62,23 @@ const AdminDashboard = () => {
     }
   };
 
+  // Function to fetch completions and ratings over time (optional as well)
+  const fetchActivity = async (selected) => {
+    try {
+      setActivity(
+        await bridge.getAnalytics(selected, ACTIVITY_WINDOWS[selected])
+      );
+    } catch (err) {
+      setActivity(null);
+    }
+  };
+
+  // Function to switch the activity chart resolution
+  const handleResolution = (e) => {
+    setResolution(e.target.value);
+    fetchActivity(e.target.value);
+  };
+
   // Function for admin login
   const handleLogin = (e) => {
     e.preventDefault();
@@ -103,6 +140,9 @@ const AdminDashboard = () => {
   if (!stats)
     return <div className="no-data">No ratings data available yet.</div>;
 
+  // Activity bars are scaled to the busiest bucket
+  const busiest = activity ? Math.max(...activity.completions, 1) : 1;
+
   // Main dashboard view when authenticated and data is loaded
   return (
     <div className="admin-dashboard">
@@ -184,6 +224,132 @@ const AdminDashboard = () => {
           </div>
         </div>
       )}
+
+      {/* Completions and ratings over time, newest bucket first */}
+      {activity && (
+        <div className="rating-distribution">
+          <h2>
+            Activity ({activity.totals.completions} quizzes completed,{" "}
+            {activity.totals.ratings} ratings)
+          </h2>
+          <select value={resolution} onChange={handleResolution}>
+            <option value="minute">Last hour, per minute</option>
+            <option value="hour">Last 24 hours, per hour</option>
+            <option value="day">Last 30 days, per day</option>
+          </select>
+          <div className="distribution-bars">
+            {activity.completions
+              .map((completions, i) => ({
+                start: activity.start + i * activity.bucket_seconds,
+                completions,
+                ratings: activity.ratings[i],
+                average: activity.rating_avg[i],
+              }))
+              .reverse()
+              .map((bucket) => {
+                const percentage = Math.round(
+                  (bucket.completions / busiest) * 100
+                );
+
+                return (
+                  <div key={bucket.start} className="rating-bar-container">
+                    <div className="rating-label">
+                      {bucketLabel(bucket.start, activity.resolution)}
+                    </div>
+                    <div className="bar-and-count">
+                      <div className="rating-bar">
+                        <div
+                          className="rating-bar-fill"
+                          style={{ width: `${percentage}%` }}
+                        ></div>
+                      </div>
+                      <div className="rating-count">
+                        {bucket.completions}{" "}
+                        <span className="percentage">
+                          ({bucket.ratings} rated
+                          {bucket.average !== null && `, ${bucket.average} ★`})
+                        </span>
+                      </div>
+                    </div>
+                  </div>
+                );
+              })}
+          </div>
+        </div>
+      )}
+
+      {/* Result type distribution from the answer event log */}
+      {answerStats && answerStats.completions > 0 && (
+        <div className="rating-distribution">
+          <h2>
+            Result Types ({answerStats.completions} of {answerStats.starts}{" "}
+            quizzes completed)
+          </h2>
+          <div className="distribution-bars">
+            {Object.entries(answerStats.types)
+              .sort((a, b) => b[1] - a[1])
+              .map(([type, count]) => {
+                const percentage = Math.round(
+                  (count / answerStats.completions) * 100
+                );
+
+                return (
+                  <div key={type} className="rating-bar-container">
+                    <div className="rating-label">{type}</div>
+                    <div className="bar-and-count">
+                      <div className="rating-bar">
+                        <div
+                          className="rating-bar-fill"
+                          style={{ width: `${percentage}%` }}
+                        ></div>
+                      </div>
+                      <div className="rating-count">
+                        {count}{" "}
+                        <span className="percentage">({percentage}%)</span>
+                      </div>
+                    </div>
+                  </div>
+                );
+              })}
+          </div>
+        </div>
+      )}
+
+      {/* Completion funnel: how many quizzes answered each question */}
+      {answerStats && answerStats.starts > 0 && (
+        <div className="rating-distribution">
+          <h2>Completion Funnel</h2>
+          <div className="distribution-bars">
+            {answerStats.questions
+              .filter((question) => question.answered > 0)
+              .map((question) => {
+                const percentage = Math.round(
+                  (question.answered / answerStats.starts) * 100
+                );
+
+                return (
+                  <div key={question.step} className="rating-bar-container">
+                    <div className="rating-label">
+                      {question.id || question.step}
+                    </div>
+                    <div className="bar-and-count">
+                      <div className="rating-bar">
+                        <div
+                          className="rating-bar-fill"
+                          style={{ width: `${Math.min(percentage, 100)}%` }}
+                        ></div>
+                      </div>
+                      <div className="rating-count">
+                        {question.answered}{" "}
+                        <span className="percentage">({percentage}%)</span>
+                      </div>
+                    </div>
+                  </div>
+                );
+              })}
+          </div>
+        </div>
+      )}
     </div>
   );
 };
@@ -155,7 +155,7 @@ const ReincarnationQuiz = () => {
 
     try {
       // Send user choice and waits for response
-      const data = await bridge.submitAnswer(sessionId, choice);
+      const data = await bridge.submitAnswer(sessionId, choice, currentQuestion.id);
 
       // Check if the server replaced our session (session expired)
       if (data.session_replaced) {
@@ -225,6 +225,26 @@ const ReincarnationQuiz = () => {
       console.error("Error submitting answer:", error);
       setIsLoading(false);
 
+      // Session still busy after every retry: the session is fine, so keep
+      // the quiz where it is and offer the current question again
+      if (error.response && error.response.status === 409) {
+        setMessages([
+          ...newMessages,
+          {
+            sender: "god",
+            text: "Hold on, the cosmic switchboard is busy. Could you answer that one again?",
+            id: `god-busy-${currentQuestion.id}`,
+          },
+        ]);
+
+        setTimeout(() => {
+          setShowOptions(true);
+          smoothScrollToBottom();
+        }, 2000);
+
+        return;
+      }
+
       // Handle errors gracefully - show error message to user
       const errorMessages = [
         ...newMessages,
@@ -2,20 +2,78 @@ import axios from "axios";
 
 const API_URL = "https://gabriellehandoyo.pythonanywhere.com/api";
 
+// Times an answer is sent again after a 409 (another request for the same
+// session was applied at the same moment), waiting a little longer each time
+const BUSY_RETRIES = 3;
+const BUSY_RETRY_DELAY = 300;
+
 const quizService = {
   startQuiz: async () => {
     const response = await axios.post(`${API_URL}/start_quiz`);
     return response.data;
   },
 
-  submitAnswer: async (sessionId, choice) => {
-    const response = await axios.post(`${API_URL}/answer`, {
+  // questionId makes retries safe: a repeated answer to the same question
+  // gets the original reply instead of answering the next one. On a 409 the
+  // answer is sent again and the server re-reads the session, so a request
+  // that got there first doesn't lose this answer
+  submitAnswer: async (sessionId, choice, questionId) => {
+    for (let attempt = 0; ; attempt++) {
+      try {
+        const response = await axios.post(`${API_URL}/answer`, {
+          session_id: sessionId,
+          choice: choice,
+          question_id: questionId,
+        });
+        return response.data;
+      } catch (error) {
+        if (
+          !error.response ||
+          error.response.status !== 409 ||
+          attempt >= BUSY_RETRIES
+        ) {
+          throw error;
+        }
+        await new Promise((resolve) =>
+          setTimeout(resolve, BUSY_RETRY_DELAY * (attempt + 1))
+        );
+      }
+    }
+  },
+
+  // Submit several answers at once (option texts or option indices). A 409
+  // means the session moved on while the batch was sent, so the caller has
+  // to resync instead of resending
+  submitAnswers: async (sessionId, choices) => {
+    const response = await axios.post(`${API_URL}/answers/batch`, {
       session_id: sessionId,
-      choice: choice,
+      choices: choices,
+    });
+    return response.data;
+  },
+
+  // Get every question and the results table at once (client-side mode)
+  getQuizManifest: async () => {
+    const response = await axios.get(`${API_URL}/quiz_manifest`);
+    return response.data;
+  },
+
+  // Score a quiz that was run client-side from the manifest
+  submitResult: async (answers, version, startStep = 0) => {
+    const response = await axios.post(`${API_URL}/result`, {
+      answers: answers,
+      version: version,
+      start_step: startStep,
     });
     return response.data;
   },
 
+  // Shareable result for a personality type (no per-user scores)
+  getSharedResult: async (personalityType) => {
+    const response = await axios.get(`${API_URL}/result/${personalityType}`);
+    return response.data;
+  },
+
   restartQuiz: async (sessionId) => {
     const response = await axios.post(`${API_URL}/restart`, {
       session_id: sessionId,
@@ -65,6 +123,21 @@ const quizService = {
     }
   },
 
+  // Quiz analytics: result types, completion funnel and option choices
+  getAnswerStats: async () => {
+    const response = await axios.get(`${API_URL}/answer_stats`);
+    return response.data;
+  },
+
+  // Completions and ratings per time bucket (resolution: minute, hour or day;
+  // window: e.g. "90m", "24h", "30d", optional)
+  getAnalytics: async (resolution, window) => {
+    const response = await axios.get(`${API_URL}/analytics`, {
+      params: { resolution, window },
+    });
+    return response.data;
+  },
+
   // Debug endpoint to check ratings file status
   debugRatings: async () => {
     try {